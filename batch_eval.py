@@ -0,0 +1,229 @@
+import argparse
+import time
+from datetime import datetime
+from os.path import abspath
+
+import numpy as np
+from candle_store import ensure_store
+from kernel import fill_bars, run_imbalance, store_arrays
+from run_setup import BROKER
+from sweep import GRID, param_grid, write_csv
+
+# Много наборов параметров ImbalanceStrategy за один проход по барам.
+# Общие для всех наборов величины find_bear_imbalance считаются один раз,
+# состояние каждого набора (позиция, entry_price, итоги сделок) хранится в
+# массивах длины N, так что память растёт с числом наборов, а не с N x бары.
+# Исполнение такое же, как в kernel.run_imbalance (и в Cerebro).
+# python batch_eval.py --imbalance 0.1 0.2 0.3 --profit 0.3 0.5 --top 20
+
+# Состояния набора
+FLAT, ENTERING, SHORT, EXITING = 0, 1, 2, 3
+
+DEFAULT_GRID = {
+    "imbalance": [round(0.1 * k, 1) for k in range(1, 11)],
+    "profit": [round(0.1 * k, 1) for k in range(1, 11)],
+    "stop_loss": [1.0, 1.5, 2.0, 3.0, 4.0],
+    "take_profit": [0.5, 1.0, 1.5, 2.0, 3.0],
+}
+
+
+def shared_gaps(high, low, close):
+    """Величины условий find_bear_imbalance на каждом баре, общие для всех наборов
+
+    Возвращает (condition_0, profit_gap, imbalance_gap); параметры
+    сравниваются с ними уже по наборам.
+    """
+    n = len(close)
+    condition_0 = np.zeros(n, dtype=bool)
+    profit_gap = np.full(n, -np.inf)
+    imbalance_gap = np.full(n, -np.inf)
+    if n >= 4:
+        third_imb_kline = low[:-3]
+        second_imb_kline = low[1:-2]
+        first_imb_kline = high[2:-1]
+        current_kline = close[3:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            condition_0[3:] = second_imb_kline < third_imb_kline
+            profit_gap[3:] = (first_imb_kline - current_kline) / first_imb_kline
+            imbalance_gap[3:] = (third_imb_kline - first_imb_kline) / third_imb_kline
+    return condition_0, np.nan_to_num(profit_gap, nan=-np.inf), np.nan_to_num(imbalance_gap, nan=-np.inf)
+
+
+def run_batch(open_, high, low, close, datetime=None, imbalance=(0.7,), profit=(0.7,),
+              stop_loss=(2.0,), take_profit=(1.5,),
+              cash=BROKER["cash"], stake=BROKER["stake"], commission=BROKER["commission"]):
+    """ImbalanceStrategy для N наборов параметров (массивы длины N) за один проход
+
+    Возвращает словарь массивов длины N: value, trades, won, lost,
+    gross_profit, gross_loss, best, worst.
+    """
+    imbalance, profit, stop_loss, take_profit = np.broadcast_arrays(
+        *(np.asarray(values, dtype=np.float64) for values in (imbalance, profit, stop_loss, take_profit)))
+    size = len(imbalance)
+    n = len(close)
+    fills = fill_bars(datetime, n)
+    condition_0, profit_gap, imbalance_gap = shared_gaps(high, low, close)
+    profit_level = profit / 100  # Те же выражения, что в find_bear_imbalance
+    imbalance_level = imbalance / 100
+    stop_ratio = 1 + stop_loss / 100
+    target_ratio = 1 - take_profit / 100
+
+    state = np.full(size, FLAT, dtype=np.int8)
+    fill_at = np.full(size, n, dtype=np.int64)
+    money = np.full(size, float(cash))
+    entry_price = np.zeros(size)
+    entry_comm = np.zeros(size)
+    stop = np.full(size, np.inf)
+    target = np.full(size, -np.inf)
+    trades = np.zeros(size, dtype=np.int64)
+    won = np.zeros(size, dtype=np.int64)
+    gross_profit = np.zeros(size)
+    gross_loss = np.zeros(size)
+    best = np.full(size, -np.inf)
+    worst = np.full(size, np.inf)
+
+    def bounds():
+        """Пороги для быстрого пропуска баров, где ни у одного набора ничего не меняется"""
+        flat = state == FLAT
+        short = state == SHORT
+        pending = fill_at[fill_at < n]
+        return (int(pending.min()) if len(pending) else n,
+                stop[short].min() if short.any() else np.inf,
+                target[short].max() if short.any() else -np.inf,
+                profit_level[flat].min() if flat.any() else np.inf,
+                imbalance_level[flat].min() if flat.any() else np.inf)
+
+    next_fill, stop_min, target_max, profit_min, imbalance_min = bounds()
+    for bar in range(n):
+        changed = False
+        if bar == next_fill:  # Исполнение ордеров по open
+            price = open_[bar]
+            due = fill_at == bar
+            fill_at[due] = n
+
+            opening = due & (state == ENTERING)
+            if opening.any():
+                # Денег не хватило по цене исполнения: ордер обнуляется (Book.can_open)
+                rejected = opening & ((money + stake * price) - stake * price * commission < 0.0)
+                state[rejected] = FLAT
+                opening &= ~rejected
+                # Шорт: деньги за проданное приходят сразу, минус комиссия
+                comm = stake * price * commission
+                money[opening] += stake * price
+                money[opening] -= comm
+                entry_price[opening] = price
+                entry_comm[opening] = comm
+                stop[opening] = price * stop_ratio[opening]
+                target[opening] = price * target_ratio[opening]
+                state[opening] = SHORT
+
+            closing = due & (state == EXITING)
+            if closing.any():
+                comm = stake * price * commission
+                pnlcomm = -stake * (price - entry_price[closing]) - entry_comm[closing] - comm
+                money[closing] -= stake * price
+                money[closing] -= comm
+                trades[closing] += 1
+                won[closing] += pnlcomm > 0
+                gross_profit[closing] += np.where(pnlcomm > 0, pnlcomm, 0.0)
+                gross_loss[closing] += np.where(pnlcomm > 0, 0.0, pnlcomm)
+                best[closing] = np.maximum(best[closing], pnlcomm)
+                worst[closing] = np.minimum(worst[closing], pnlcomm)
+                stop[closing], target[closing] = np.inf, -np.inf
+                state[closing] = FLAT
+            # Новые позиции проверяются на выход и новые FLAT на вход уже на этом баре
+            next_fill, stop_min, target_max, profit_min, imbalance_min = bounds()
+
+        # Выход: close за уровнем stop_loss или take_profit
+        price = close[bar]
+        if price >= stop_min or price <= target_max:
+            hit = (state == SHORT) & ((price >= stop) | (price <= target))
+            if hit.any():
+                state[hit] = EXITING
+                fill_at[hit] = fills[bar]
+                changed = True
+
+        # Вход: find_bear_imbalance у наборов без позиции
+        if condition_0[bar] and profit_gap[bar] > profit_min and imbalance_gap[bar] > imbalance_min:
+            signal = (state == FLAT) & (profit_gap[bar] > profit_level) & (imbalance_gap[bar] > imbalance_level)
+            signal &= (money + stake * price) - stake * price * commission >= 0.0  # Иначе Margin
+            if signal.any():
+                state[signal] = ENTERING
+                fill_at[signal] = fills[bar]
+                changed = True
+
+        if changed:
+            next_fill, stop_min, target_max, profit_min, imbalance_min = bounds()
+
+    in_short = (state == SHORT) | (state == EXITING)
+    last = close[-1] if n else 0.0
+    return {
+        "value": np.where(in_short, money - stake * last, money),
+        "trades": trades,
+        "won": won,
+        "lost": trades - won,
+        "gross_profit": gross_profit,
+        "gross_loss": gross_loss,
+        "best": np.where(trades > 0, best, 0.0),
+        "worst": np.where(trades > 0, worst, 0.0),
+    }
+
+
+def grid_arrays(grid):
+    """Сетка {"имя": [значения]} -> столбцы параметров всех комбинаций"""
+    points = param_grid(grid)
+    return {name: np.array([point[name] for point in points]) for name in grid}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перебор параметров ImbalanceStrategy за один проход")
+    parser.add_argument("--data", default="./data/BTCUSDT_15.csv", help="CSV из TickerGrub или .bin")
+    parser.add_argument("--fromdate", default="2022-01-01")
+    parser.add_argument("--todate", default="2025-10-01")
+    parser.add_argument("--top", type=int, default=20, help="Сколько лучших наборов показать")
+    parser.add_argument("--out", default=None, help="Сохранить все результаты в CSV")
+    parser.add_argument("--validate", type=int, default=0, metavar="K",
+                        help="Сверить K случайных наборов с kernel.run_imbalance")
+    for name, values in DEFAULT_GRID.items():
+        parser.add_argument("--" + name.replace("_", "-"), dest=name, type=float, nargs="+", default=values)
+    args = parser.parse_args()
+
+    arrays = store_arrays(ensure_store(abspath(args.data)),
+                          datetime.fromisoformat(args.fromdate), datetime.fromisoformat(args.todate))
+    params = grid_arrays({name: getattr(args, name) for name in GRID})
+
+    started = time.perf_counter()
+    results = run_batch(*arrays, **params)
+    elapsed = time.perf_counter() - started
+    size = len(results["value"])
+
+    order = np.argsort(-results["value"], kind="stable")[:args.top]
+    print(f"{'imbalance':>9} {'profit':>7} {'SL':>5} {'TP':>5} | {'Капитал':>10} {'Сделок':>6} "
+          f"{'Приб.':>5} {'Убыт.':>5} {'PF':>6}")
+    for j in order:
+        loss = -results["gross_loss"][j]
+        pf = f"{results['gross_profit'][j] / loss:.2f}" if loss else "N/A"
+        print(f"{params['imbalance'][j]:>9} {params['profit'][j]:>7} {params['stop_loss'][j]:>5} "
+              f"{params['take_profit'][j]:>5} | {results['value'][j]:>10.2f} {results['trades'][j]:>6} "
+              f"{results['won'][j]:>5} {results['lost'][j]:>5} {pf:>6}")
+    print(f"\n⚡ {size} наборов за {elapsed:.2f} c ({len(arrays[0])} баров)")
+
+    if args.out:
+        rows = [dict({name: params[name][j].item() for name in params},
+                     **{name: column[j].item() for name, column in results.items()}) for j in range(size)]
+        write_csv(rows, args.out)
+        print(f"✅ Результаты сохранены в {args.out}")
+
+    if args.validate:
+        picks = np.random.default_rng(0).choice(size, min(args.validate, size), replace=False)
+        bad = 0
+        for j in picks:
+            single = run_imbalance(*arrays, **{name: params[name][j].item() for name in params})
+            if single["value"] != results["value"][j] or len(single["trades"]) != results["trades"][j]:
+                bad += 1
+                print(f"❌ Набор {j}: ядро {single['value']:.6f}, один проход {results['value'][j]:.6f}")
+        print(f"{'✅' if not bad else '❌'} Сверено с kernel.run_imbalance: {len(picks) - bad} из {len(picks)}")
+
+
+if __name__ == "__main__":
+    main()
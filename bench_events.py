@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from os.path import abspath, exists
+
+from backtrader import Cerebro
+from store_feed import open_feed
+from events import DEBUG, INFO, EventRecorder, FileSink, console_recorder, quiet, silent_recorder
+from strategy_imbalance import ImbalanceStrategy, MyCSVData
+from run_setup import setup_broker
+
+# Сколько стоит журнал событий ImbalanceStrategy в разных режимах.
+# "console" - то же, что старые print (вывод уходит в /dev/null).
+# Каждый режим запускается REPEATS раз, берётся лучшее время.
+# python bench_events.py [data/BTCUSDT_15.csv]
+
+REPEATS = 3
+
+
+def run(csv_path, recorder, debug):
+    cerebro = Cerebro()
+    cerebro.adddata(open_feed(csv_path, MyCSVData,
+                              fromdate=datetime(2022, 1, 1), todate=datetime(2025, 10, 1)))
+    cerebro.addstrategy(ImbalanceStrategy, imbalance=0.5, profit=0.5,
+                        debug=debug, vectorized=True, recorder=recorder)
+    setup_broker(cerebro)
+
+    with quiet():
+        started = time.perf_counter()
+        with recorder:  # Последняя пачка FileSink пишется и файл закрывается внутри замера
+            cerebro.run()
+        return time.perf_counter() - started
+
+
+def main():
+    csv_path = abspath(sys.argv[1] if len(sys.argv) > 1 else "./data/BTCUSDT_15.csv")
+    if not exists(csv_path):
+        print(f"⚠️ Нет файла {csv_path}, сначала скачайте его через TickerGrub")
+        return
+
+    log_path = os.path.join(tempfile.gettempdir(), "imbalance_events.log")
+    modes = [
+        ("console, debug", lambda: console_recorder(debug=True), True),
+        ("console", lambda: console_recorder(debug=False), False),
+        ("file, debug", lambda: EventRecorder(level=DEBUG, capacity=0, sinks=[FileSink(log_path)]), True),
+        ("ring buffer", lambda: EventRecorder(level=INFO, capacity=4096), False),
+        ("off", silent_recorder, False),
+    ]
+
+    run(csv_path, silent_recorder(), False)  # Прогрев: кэш ОС, импорты
+    print(f"{'Журнал':<16}{'Время, c':>10}")
+    for name, make, debug in modes:
+        best = min(run(csv_path, make(), debug) for _ in range(REPEATS))
+        print(f"{name:<16}{best:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+from os.path import abspath, exists
+
+import numpy as np
+
+# Пиковая память бэктеста на длинной минутной истории: обычный запуск
+# Cerebro() против low_memory_cerebro() (low_memory.py). Каждый прогон -
+# отдельный процесс; пик берётся из VmHWM: ru_maxrss в Linux переживает
+# exec и показал бы память родителя.
+# python bench_memory.py --make 4   # сгенерировать 4 года минуток
+# python bench_memory.py --data data/BTCUSDT_1.csv
+
+STRATEGIES = ("imbalance", "candles")
+
+
+def make_minutes(csv_path, years, seed=0, price=40000.0, minutes=1, start="2022-01-01", bars=None):
+    """Синтетические свечи по minutes минут в формате TickerGrub (случайное блуждание)
+
+    Длина - years лет или ровно bars свечей.
+    """
+    bars = bars or int(years * 365 * 1440 / minutes)
+    rng = np.random.default_rng(seed)
+    scale = np.sqrt(minutes)  # Волатильность растёт как корень из длины свечи
+    close = price * np.exp(np.cumsum(rng.normal(0, 0.0008 * scale, bars)))
+    open_ = np.concatenate(([price], close[:-1]))
+    wick = np.abs(rng.normal(0, 0.0005 * scale, (2, bars)))
+    high = np.maximum(open_, close) * (1 + wick[0])
+    low = np.minimum(open_, close) * (1 - wick[1])
+    volume = np.round(rng.exponential(5.0, bars), 4)
+    first = np.datetime64(start, "s")
+
+    with open(csv_path, "w", encoding="utf-8") as file:
+        file.write("datetime,open,high,low,close,volume\n")
+        for lo in range(0, bars, 100000):  # Строки дат - по куску, 10M строк сразу не помещаются
+            hi = min(lo + 100000, bars)
+            times = first + (np.arange(lo, hi) * minutes * 60).astype("timedelta64[s]")
+            dates = np.char.replace(np.datetime_as_string(times), "T", " ").tolist()
+            file.write("".join(
+                f"{d},{o:.2f},{h:.2f},{l:.2f},{c:.2f},{v}\n" for d, o, h, l, c, v in zip(
+                    dates, open_[lo:hi].tolist(), high[lo:hi].tolist(), low[lo:hi].tolist(),
+                    close[lo:hi].tolist(), volume[lo:hi].tolist())))
+    return bars
+
+
+def peak_rss_mb():
+    """Пиковая память этого процесса (после exec), МБ"""
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    from profiling import peak_rss_mb as maxrss_mb  # Не Linux
+    return maxrss_mb()
+
+
+def child(strategy, mode, csv_path):
+    """Один бэктест, печатает JSON с пиковой памятью и итогами"""
+    from backtrader import Cerebro
+    from store_feed import open_feed
+    from events import quiet, silent_recorder
+    from low_memory import low_memory_cerebro
+    from main import CandlesOnly
+    from strategy_imbalance import ImbalanceStrategy, MyCSVData
+    from streaming_stats import StreamingStats
+    from run_setup import setup_broker
+
+    rss_import = peak_rss_mb()
+    cerebro = low_memory_cerebro() if mode == "low-memory" else Cerebro()
+    cerebro.adddata(open_feed(csv_path, MyCSVData))
+    if strategy == "imbalance":  # Пороги под минутки: 0.5% за 4 минуты почти не бывает
+        cerebro.addstrategy(ImbalanceStrategy, imbalance=0.1, profit=0.1, vectorized=True,
+                            debug=False, recorder=silent_recorder())
+    else:
+        cerebro.addstrategy(CandlesOnly, debug=False, recorder=silent_recorder())
+    setup_broker(cerebro)
+    cerebro.addanalyzer(StreamingStats, _name="stats")
+
+    started = time.perf_counter()
+    with quiet():  # Итоги stop() стратегий не нужны
+        strat = cerebro.run()[0]
+    stats = strat.analyzers.stats.get_analysis()
+    print(json.dumps({
+        "strategy": strategy,
+        "mode": mode,
+        "bars": len(strat),
+        "seconds": time.perf_counter() - started,
+        "rss_mb": peak_rss_mb(),
+        "rss_import_mb": rss_import,
+        "value": stats.value,
+        "trades": stats.trades,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пиковая память бэктеста: обычный режим и low_memory_cerebro")
+    parser.add_argument("--data", default="./data/BTCUSDT_1.csv", help="CSV из TickerGrub")
+    parser.add_argument("--make", type=float, default=0, metavar="YEARS",
+                        help="Сначала сгенерировать столько лет минуток в --data")
+    parser.add_argument("--strategies", nargs="+", default=STRATEGIES, choices=STRATEGIES)
+    args = parser.parse_args()
+
+    csv_path = abspath(args.data)
+    if args.make:
+        print(f"Генерация {csv_path}: {make_minutes(csv_path, args.make)} минутных свечей")
+    if not exists(csv_path):
+        print(f"⚠️ Нет файла {csv_path}: скачайте минутки через TickerGrub или запустите с --make")
+        return
+
+    from candle_store import ensure_store
+    ensure_store(csv_path)
+
+    results = []
+    for strategy in args.strategies:
+        for mode in ("default", "low-memory"):
+            out = subprocess.run([sys.executable, __file__, "--child", strategy, mode, csv_path],
+                                 check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(out.splitlines()[-1]))
+
+    print(f"\n{'Стратегия':<11}{'Режим':<12}{'Баров':>10}{'Время, c':>10}{'RSS, МБ':>9}"
+          f"{'Импорт, МБ':>12}{'Капитал':>12}{'Сделок':>8}")
+    for res in results:
+        print(f"{res['strategy']:<11}{res['mode']:<12}{res['bars']:>10}{res['seconds']:>10.1f}"
+              f"{res['rss_mb']:>9.1f}{res['rss_import_mb']:>12.1f}{res['value']:>12.2f}{res['trades']:>8}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(*sys.argv[2:5])
+    else:
+        main()
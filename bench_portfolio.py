@@ -0,0 +1,74 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+from os.path import abspath, dirname, exists, join
+
+from backtrader import Cerebro
+from bench_memory import make_minutes
+from portfolio import PortfolioCerebro, open_stores, run_portfolio
+from run_setup import STRATEGIES
+
+# Пропускная способность: N пар одним портфелем (portfolio.py) против N
+# отдельных прогонов. Пары - синтетические 15-минутные свечи, начала
+# сдвинуты на неделю, чтобы общая шкала не совпадала ни с одним фидом.
+# Цена ~100, капитала с запасом: ордера не отклоняются, и итоги каждой
+# пары в портфеле обязаны совпасть с её отдельным прогоном.
+# python bench_portfolio.py --symbols 20 --years 1
+
+
+def make_symbols(folder, symbols, years):
+    """CSV синтетических пар в folder (уже созданные не пересоздаются)"""
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for number in range(symbols):
+        path = join(folder, f"SYN{number:03d}USDT_15.csv")
+        if not exists(path):
+            make_minutes(path, years, seed=number, price=100.0 + number, minutes=15,
+                         start=f"2022-01-{1 + number % 28:02d}")
+        paths.append(path)
+    open_stores(paths)  # .bin готовы до замеров
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Портфель в одном Cerebro против отдельных прогонов")
+    parser.add_argument("--symbols", type=int, default=20, help="Сколько пар")
+    parser.add_argument("--years", type=float, default=1, help="Лет 15-минутных свечей на пару")
+    parser.add_argument("--dir", default="./data/bench_portfolio", help="Куда писать синтетические CSV")
+    parser.add_argument("--strategy", choices=list(STRATEGIES), default="imbalance")
+    args = parser.parse_args()
+
+    paths = make_symbols(abspath(args.dir), args.symbols, args.years)
+    params = {"imbalance": 0.3, "profit": 0.3} if args.strategy == "imbalance" else {}
+
+    rows = []
+    started = time.perf_counter()
+    script = join(dirname(abspath(__file__)), "portfolio.py")
+    for path in paths:  # Как раньше: процесс, Cerebro и брокер на каждую пару
+        subprocess.run([sys.executable, script, path, "--strategy", args.strategy,
+                        *(f"--param={name}={value}" for name, value in params.items())],
+                       check=True, stdout=subprocess.DEVNULL)
+    rows.append(("процесс на пару", time.perf_counter() - started))
+
+    started = time.perf_counter()
+    single = [run_portfolio([path], args.strategy, params)["feeds"][0] for path in paths]
+    rows.append(("Cerebro на пару", time.perf_counter() - started))
+
+    for name, cerebro_class in (("портфель, Cerebro", Cerebro), ("портфель, SharedClock", PortfolioCerebro)):
+        started = time.perf_counter()
+        report = run_portfolio(paths, args.strategy, params, cerebro_class=cerebro_class)
+        rows.append((name, time.perf_counter() - started))
+        if report["feeds"] != single:
+            print(f"⚠️ {name}: итоги пар не совпали с отдельными прогонами")
+
+    bars = report["bars"]
+    print(f"\n{args.symbols} пар, {bars} баров, {report['steps']} шагов общей шкалы ({args.strategy})")
+    print(f"{'Режим':<24}{'Время, c':>10}{'Баров/с':>10}{'Ускорение':>11}")
+    for name, seconds in rows:
+        print(f"{name:<24}{seconds:>10.1f}{bars / seconds:>10.0f}{rows[0][1] / seconds:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
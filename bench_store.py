@@ -0,0 +1,74 @@
+import json
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from os.path import abspath, exists
+
+# Сравнение загрузки свечей: MyCSVData (strptime на каждую строку)
+# против StoreData (бинарный файл из candle_store.py).
+# Каждый вариант меряется в отдельном процессе, чтобы RSS не смешивался.
+# python bench_store.py [data/BTCUSDT_15.csv]
+
+FROMDATE = datetime(2022, 1, 1)
+TODATE = datetime(2025, 10, 1)
+
+
+def child(kind, csv_path):
+    """Загрузка одного фида, печатает JSON с временем и пиковым RSS"""
+    from backtrader import Cerebro
+    from candle_store import store_path_for
+    from store_feed import StoreData
+    from strategy_imbalance import MyCSVData
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if kind == "csv":
+        data = MyCSVData(dataname=csv_path, fromdate=FROMDATE, todate=TODATE)
+    else:
+        data = StoreData(dataname=store_path_for(csv_path), fromdate=FROMDATE, todate=TODATE)
+    cerebro = Cerebro()
+    cerebro.adddata(data)
+    data._start()
+    data.preload()
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        "kind": kind,
+        "bars": data.buflen(),
+        "seconds": elapsed,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "rss_import_mb": rss_before / 1024,
+    }))
+
+
+def main():
+    from candle_store import ensure_store
+
+    csv_path = abspath(sys.argv[1] if len(sys.argv) > 1 else "./data/BTCUSDT_15.csv")
+    if not exists(csv_path):
+        print(f"⚠️ Нет файла {csv_path}, сначала скачайте его через TickerGrub")
+        return
+
+    started = time.perf_counter()
+    store = ensure_store(csv_path)
+    print(f"Подготовка {store.path}: {time.perf_counter() - started:.2f} c")
+
+    results = {}
+    for kind in ("csv", "store"):
+        out = subprocess.run([sys.executable, __file__, "--child", kind, csv_path],
+                             check=True, capture_output=True, text=True).stdout
+        results[kind] = json.loads(out.splitlines()[-1])
+
+    print(f"\n{'Источник':<10}{'Баров':>10}{'Время, c':>12}{'RSS, МБ':>10}")
+    for kind, res in results.items():
+        print(f"{kind:<10}{res['bars']:>10}{res['seconds']:>12.3f}{res['rss_mb']:>10.1f}")
+    print(f"\nУскорение загрузки: x{results['csv']['seconds'] / results['store']['seconds']:.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,372 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from os.path import abspath, exists, join
+
+from bench_memory import make_minutes, peak_rss_mb
+
+# Набор бенчмарков на синтетических свечах: ускорила или замедлила правка
+# загрузку CSV, стратегии, анализаторы и запись CSV в TickerGrub. Свечи
+# генерируются детерминированно (make_minutes, seed от таймфрейма), так
+# что замеры повторяемы без настоящих CSV. Каждый замер - отдельный
+# процесс: пиковая память (VmHWM) и время запуска не смешиваются.
+# Итоги дописываются строкой JSON в историю; с медианой прошлых запусков
+# на той же машине сравниваются баров/с, память и время запуска, при
+# регрессии больше порога код выхода 1.
+# Бюджет холодного старта проверяется в каждом запуске: импорт скриптов
+# сверх неизбежного (Backtrader или NumPy) не дольше --max-import и
+# без тяжёлых модулей, которые им не нужны до запуска бэктеста.
+# python bench_suite.py --sizes 10k 100k --intervals 1 15 60
+# python bench_suite.py --sizes 10M --cases load imbalance --max-slowdown 5
+
+CASES = ("load", "imbalance", "candles", "analyzers", "grub")
+INTERVALS = ("1", "15", "60")
+HISTORY = "./data/bench_history.jsonl"
+SEEDS = {"1": 1, "15": 15, "60": 60}
+# Пороги ImbalanceStrategy по таймфрейму: на минутках 0.5% за 4 свечи почти не бывает
+IMBALANCE_PARAMS = {"1": {"imbalance": 0.1, "profit": 0.1}, "15": {"imbalance": 0.5, "profit": 0.5},
+                    "60": {"imbalance": 0.5, "profit": 0.5}}
+# Модуль -> (что импортируется заранее, без чего импорт должен обходиться).
+# Backtrader у стратегий и NumPy у ядра неизбежны, бюджет - на остальное
+IMPORT_BUDGETS = {
+    "strategy_imbalance": ("backtrader", ("numpy", "matplotlib", "pandas", "pybit")),
+    "main": ("backtrader", ("numpy", "matplotlib", "pandas", "pybit")),
+    "sweep": ("numpy", ("backtrader", "matplotlib", "pandas", "pybit")),
+    "kernel": ("numpy", ("backtrader", "matplotlib", "pandas", "pybit")),
+    "batch_eval": ("numpy", ("backtrader", "matplotlib", "pandas", "pybit")),
+    "data.TickerGrub": ("numpy", ("backtrader", "matplotlib", "pandas", "pybit")),
+}
+IMPORT_BUDGET_S = 0.05  # На момент бюджета ~0.01 c; NumPy в strategy_imbalance стоил ~0.1 c
+IMPORT_REPEATS = 5
+IMPORT_CHILD = """
+import importlib, json, sys, time
+importlib.import_module({preload!r})
+started = time.perf_counter()
+importlib.import_module({module!r})
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "heavy": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+# Метрика -> (больше - лучше?, порог по умолчанию, %)
+METRICS = {
+    "bars_per_sec": (True, 10.0),
+    "rss_mb": (False, 10.0),
+    "startup_s": (False, 20.0),
+}
+
+
+def parse_size(text):
+    """10k -> 10000, 1M -> 1000000"""
+    units = {"k": 1000, "m": 1000000}
+    unit = units.get(text[-1].lower())
+    return int(float(text[:-1]) * unit) if unit else int(text)
+
+
+def synthetic_csv(folder, interval, bars):
+    """CSV синтетических свечей (уже созданный не пересоздаётся) и рядом .bin"""
+    from candle_store import ensure_store
+
+    os.makedirs(folder, exist_ok=True)
+    path = join(folder, f"SYN_{interval}_{bars}.csv")
+    if not exists(path):
+        make_minutes(path, 0, seed=SEEDS[interval], minutes=int(interval), bars=bars)
+    ensure_store(path)
+    return path
+
+
+def run_load(csv_path, interval, bars):
+    """MyCSVData: разбор CSV построчно, как в main.py без .bin"""
+    from backtrader import Cerebro
+    from strategy_imbalance import MyCSVData
+
+    data = MyCSVData(dataname=csv_path)
+    cerebro = Cerebro()
+    cerebro.adddata(data)
+    started = time.perf_counter()
+    data._start()
+    data.preload()
+    return {"bars": data.buflen(), "seconds": time.perf_counter() - started}
+
+
+def backtest(cerebro, csv_path, interval):
+    """Бэктест на .bin рядом с csv_path: время только cerebro.run()
+
+    Таймфрейм фида - минутный: с дневным по умолчанию у всех свечей суток
+    одно время, и рыночные ордера ждут следующих суток.
+    """
+    from backtrader import TimeFrame
+    from candle_store import store_path_for
+    from events import quiet
+    from store_feed import StoreData
+    from streaming_stats import StreamingStats
+    from run_setup import setup_broker
+
+    cerebro.adddata(StoreData(dataname=store_path_for(csv_path), timeframe=TimeFrame.Minutes,
+                              compression=int(interval)))
+    setup_broker(cerebro)
+    cerebro.addanalyzer(StreamingStats, _name="stats")
+
+    started = time.perf_counter()
+    with quiet():  # Итоги stop() стратегий не нужны
+        strat = cerebro.run()[0]
+    stats = strat.analyzers.stats.get_analysis()
+    return {"bars": len(strat), "seconds": time.perf_counter() - started,
+            "value": stats.value, "trades": stats.trades}
+
+
+def run_imbalance(csv_path, interval, bars):
+    from backtrader import Cerebro
+    from events import silent_recorder
+    from strategy_imbalance import ImbalanceStrategy
+
+    cerebro = Cerebro()
+    cerebro.addstrategy(ImbalanceStrategy, vectorized=True, debug=False, recorder=silent_recorder(),
+                        **IMBALANCE_PARAMS[interval])
+    return backtest(cerebro, csv_path, interval)
+
+
+def run_candles(csv_path, interval, bars):
+    from backtrader import Cerebro
+    from events import silent_recorder
+    from main import CandlesOnly
+
+    cerebro = Cerebro()
+    cerebro.addstrategy(CandlesOnly, debug=False, recorder=silent_recorder())
+    return backtest(cerebro, csv_path, interval)
+
+
+def run_analyzers(csv_path, interval, bars):
+    """Анализаторы без логики стратегии: сделка каждые hold баров, без наблюдателей"""
+    from backtrader import Cerebro, Strategy
+
+    class Churn(Strategy):
+        params = (("hold", 5),)
+
+        def next(self):
+            if len(self) % self.p.hold == 0:
+                if self.position:
+                    self.close()
+                else:
+                    self.buy()
+
+    cerebro = Cerebro(stdstats=False)
+    cerebro.addstrategy(Churn)
+    return backtest(cerebro, csv_path, interval)
+
+
+def run_grub(csv_path, interval, bars):
+    """Скачивание TickerGrub с офлайн-биржей: окна, запись CSV и индекс"""
+    import tempfile
+    from data import TickerGrub
+    from data.bybit_fake import FakeHTTP
+    from events import quiet
+
+    step = TickerGrub.INTERVAL_SECONDS[interval]
+    start = int(TickerGrub.HISTORY_START.timestamp())
+    client = FakeHTTP(step * 1000)
+    folder = tempfile.mkdtemp(prefix="bench_grub_")
+    cwd = os.getcwd()
+    os.chdir(folder)  # start_grub пишет {ticker}_{interval}.csv в текущую папку
+    started = time.perf_counter()
+    try:
+        with quiet():
+            written = TickerGrub.start_grub(client, "SYNUSDT", interval, rate=0,
+                                            end_time=start + bars * step - 1)
+    finally:
+        os.chdir(cwd)
+    seconds = time.perf_counter() - started
+    for name in os.listdir(folder):
+        os.remove(join(folder, name))
+    os.rmdir(folder)
+    return {"bars": written, "seconds": seconds}
+
+
+RUNNERS = {
+    "load": run_load,
+    "imbalance": run_imbalance,
+    "candles": run_candles,
+    "analyzers": run_analyzers,
+    "grub": run_grub,
+}
+
+
+def child(case, interval, csv_path, bars):
+    """Один замер, печатает JSON"""
+    result = RUNNERS[case](csv_path, interval, int(bars))
+    result["rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+
+
+def measure(case, interval, csv_path, bars):
+    """Замер в отдельном процессе; startup_s - всё, кроме самого замера
+
+    (запуск Python, импорты, настройка Cerebro).
+    """
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, abspath(__file__), "--child", case, interval, csv_path, str(bars)],
+                         check=True, capture_output=True, text=True).stdout
+    wall = time.perf_counter() - started
+    result = json.loads(out.splitlines()[-1])
+    result["startup_s"] = wall - result["seconds"]
+    result["bars_per_sec"] = result["bars"] / result["seconds"] if result["seconds"] else 0.0
+    return {name: round(value, 4) if isinstance(value, float) else value for name, value in result.items()}
+
+
+def measure_import(module, preload, heavy):
+    """Холодный импорт module в чистом процессе после preload: медиана секунд и лишние модули"""
+    code = IMPORT_CHILD.format(module=module, preload=preload, heavy=heavy)
+    runs = []
+    for _ in range(IMPORT_REPEATS):
+        out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True,
+                             cwd=os.path.dirname(abspath(__file__))).stdout
+        runs.append(json.loads(out.splitlines()[-1]))
+    return {"seconds": round(statistics.median(run["seconds"] for run in runs), 4), "heavy": runs[0]["heavy"]}
+
+
+def import_budget(budget):
+    """Замеры импорта по IMPORT_BUDGETS и список нарушений бюджета"""
+    results, found = {}, []
+    for module, (preload, heavy) in IMPORT_BUDGETS.items():
+        result = results[module] = measure_import(module, preload, heavy)
+        if result["seconds"] > budget:
+            found.append(f"import {module}: {result['seconds']:.3f} c сверх {preload}, бюджет {budget} c")
+        if result["heavy"]:
+            found.append(f"import {module}: тянет {', '.join(result['heavy'])}")
+
+    print(f"\n{'Импорт':<24}{'Сверх':>12}{'Время, c':>10}  Лишние модули")
+    for module, result in results.items():
+        print(f"{module:<24}{IMPORT_BUDGETS[module][0]:>12}{result['seconds']:>10.3f}  "
+              f"{', '.join(result['heavy']) or '-'}")
+    return results, found
+
+
+def machine():
+    """Где меряли: сравнивать можно только замеры с одной машины и одного Python"""
+    return {"host": platform.node(), "python": platform.python_version(), "cpus": os.cpu_count()}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def load_history(path):
+    if not exists(path):
+        return []
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def baselines(history, current_machine, window):
+    """Медиана метрик по последним window запускам каждого замера на этой машине"""
+    samples = {}
+    for record in history:
+        if record.get("machine") != current_machine:
+            continue
+        for key, result in record["results"].items():
+            samples.setdefault(key, []).append(result)
+    return {key: {metric: statistics.median(result[metric] for result in results[-window:])
+                  for metric in METRICS}
+            for key, results in samples.items()}
+
+
+def regressions(results, base, thresholds):
+    """[(замер, метрика, было, стало, изменение %)] хуже порога"""
+    found = []
+    for key, result in results.items():
+        if key not in base:
+            continue
+        for metric, (higher_is_better, _) in METRICS.items():
+            before, after = base[key][metric], result[metric]
+            if not before:
+                continue
+            change = (after - before) / before * 100
+            worse = -change if higher_is_better else change
+            if worse > thresholds[metric]:
+                found.append((key, metric, before, after, change))
+    return found
+
+
+def print_table(results, base):
+    print(f"\n{'Замер':<24}{'Баров':>10}{'Баров/с':>12}{'Δ':>8}{'RSS, МБ':>10}{'Δ':>8}{'Запуск, c':>11}{'Δ':>8}")
+    for key, r in results.items():
+        deltas = []
+        for metric in METRICS:
+            before = base.get(key, {}).get(metric)
+            deltas.append(f"{(r[metric] - before) / before * 100:+.1f}%" if before else "-")
+        print(f"{key:<24}{r['bars']:>10}{r['bars_per_sec']:>12.0f}{deltas[0]:>8}{r['rss_mb']:>10.1f}{deltas[1]:>8}"
+              f"{r['startup_s']:>11.2f}{deltas[2]:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки на синтетических свечах с историей и порогами регрессий")
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=CASES)
+    parser.add_argument("--intervals", nargs="+", default=["15"], choices=INTERVALS, help="Таймфреймы, минут")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "100k"], help="Баров: 10k, 100k, 1M, 10M")
+    parser.add_argument("--dir", default="./data/bench", help="Куда писать синтетические CSV")
+    parser.add_argument("--history", default=HISTORY, help="История замеров, строка JSON на запуск")
+    parser.add_argument("--baseline", type=int, default=5, help="Сравнивать с медианой стольких прошлых запусков")
+    parser.add_argument("--max-slowdown", type=float, default=METRICS["bars_per_sec"][1],
+                        help="Допустимое падение баров/с, %%")
+    parser.add_argument("--max-memory", type=float, default=METRICS["rss_mb"][1],
+                        help="Допустимый рост пиковой памяти, %%")
+    parser.add_argument("--max-startup", type=float, default=METRICS["startup_s"][1],
+                        help="Допустимый рост времени запуска, %%")
+    parser.add_argument("--max-import", type=float, default=IMPORT_BUDGET_S,
+                        help="Бюджет импорта скриптов сверх Backtrader/NumPy, с")
+    parser.add_argument("--no-save", action="store_true", help="Не дописывать запуск в историю")
+    args = parser.parse_args()
+
+    results = {}
+    for interval in args.intervals:
+        for size in args.sizes:
+            bars = parse_size(size)
+            csv_path = synthetic_csv(abspath(args.dir), interval, bars)
+            for case in args.cases:
+                key = f"{case}/{interval}m/{size}"
+                results[key] = measure(case, interval, csv_path, bars)
+                print(f"✅ {key}: {results[key]['bars_per_sec']:.0f} баров/с")
+
+    current_machine = machine()
+    history = load_history(args.history)
+    base = baselines(history, current_machine, args.baseline)
+    print_table(results, base)
+
+    imports, over_budget = import_budget(args.max_import)
+
+    thresholds = {"bars_per_sec": args.max_slowdown, "rss_mb": args.max_memory, "startup_s": args.max_startup}
+    found = regressions(results, base, thresholds)
+    if not args.no_save:
+        with open(args.history, "a", encoding="utf-8") as file:
+            file.write(json.dumps({
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "commit": git_commit(),
+                "machine": current_machine,
+                "thresholds": dict(thresholds, import_s=args.max_import),
+                "results": results,
+                "imports": imports,
+            }, ensure_ascii=False) + "\n")
+        print(f"\n✅ Замеры дописаны в {args.history}")
+
+    if found or over_budget:
+        print("\n⚠️ РЕГРЕССИИ:")
+        for key, metric, before, after, change in found:
+            print(f"{key} {metric}: {before:.2f} -> {after:.2f} ({change:+.1f}%, порог {thresholds[metric]}%)")
+        for problem in over_budget:
+            print(problem)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(*sys.argv[2:6])
+    else:
+        main()
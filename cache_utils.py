@@ -0,0 +1,37 @@
+import hashlib
+import os
+
+# Общее для дисковых кэшей (resample.py, result_cache.py): хэш содержимого
+# файла для ключа и удаление давно не использованных файлов по LRU.
+
+_hashes = {}  # (путь, размер, mtime) -> хэш, чтобы не читать файл повторно
+
+
+def file_hash(path):
+    """SHA-1 содержимого файла"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _hashes:
+        digest = hashlib.sha1()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        _hashes[key] = digest.hexdigest()
+    return _hashes[key]
+
+
+def evict_lru(cache_dir, max_bytes, keep=()):
+    """Удаляет самые давно использованные файлы, пока кэш больше max_bytes"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if os.path.isfile(path) and path not in keep:
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries) + sum(os.path.getsize(path) for path in keep)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
@@ -0,0 +1,136 @@
+import csv
+import math
+import os
+import struct
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+from data.candle_index import infer_step
+
+# Формат файла: заголовок, затем колонки подряд:
+# datetime (int64, секунды) + open, high, low, close, volume (float64)
+# Время хранится "как в CSV": строка из TickerGrub читается как UTC без сдвига
+MAGIC = b"CNDL"
+VERSION = 1
+HEADER = struct.Struct("<4sIQ")  # magic, версия, количество строк
+COLUMNS = ("open", "high", "low", "close", "volume")
+STORE_EXT = ".bin"
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def store_path_for(csv_path):
+    """Путь к бинарному файлу рядом с CSV"""
+    return os.path.splitext(csv_path)[0] + STORE_EXT
+
+
+def write_store(store_path, epochs, ohlcv):
+    """Записывает колонки в бинарный файл (epochs: n, ohlcv: 5 x n)"""
+    epochs = np.ascontiguousarray(epochs, dtype=np.int64)
+    ohlcv = np.ascontiguousarray(ohlcv, dtype=np.float64)
+    if ohlcv.shape != (len(COLUMNS), len(epochs)):
+        raise ValueError(f"ohlcv должен иметь форму (5, {len(epochs)}), а не {ohlcv.shape}")
+
+    tmp_path = store_path + ".tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(epochs)))
+        file.write(epochs.tobytes())
+        file.write(ohlcv.tobytes())
+    os.replace(tmp_path, store_path)  # Читатели не увидят недописанный файл
+    return store_path
+
+
+def read_csv_columns(csv_path):
+    """Читает CSV из TickerGrub в колонки (epochs, ohlcv)"""
+    times = []
+    columns = [[] for _ in COLUMNS]
+    with open(csv_path, newline="", encoding="utf-8") as file:
+        reader = csv.reader(file)
+        next(reader, None)  # Заголовок
+        for row in reader:
+            if not row:
+                continue
+            times.append(row[0])
+            for column, value in zip(columns, row[1:6]):
+                column.append(float(value) if value else math.nan)
+
+    epochs = np.array(times, dtype="datetime64[s]").astype(np.int64)
+    return epochs, np.array(columns, dtype=np.float64)
+
+
+def csv_to_store(csv_path, store_path=None):
+    """Однократная конвертация CSV из TickerGrub в бинарный файл"""
+    epochs, ohlcv = read_csv_columns(csv_path)
+    return write_store(store_path or store_path_for(csv_path), epochs, ohlcv)
+
+
+def is_fresh(store_path, csv_path):
+    """Бинарный файл есть и не старше CSV"""
+    if not os.path.exists(store_path):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    return os.path.getmtime(store_path) >= os.path.getmtime(csv_path)
+
+
+def ensure_store(path):
+    """CandleStore по CSV из TickerGrub или .bin
+
+    CSV конвертируется в .bin рядом с ним, только если .bin нет или он
+    старше CSV; дальше все читают .bin.
+    """
+    store_path = path
+    if not path.endswith(STORE_EXT):
+        store_path = store_path_for(path)
+        if not is_fresh(store_path, path):
+            csv_to_store(path, store_path)
+    return CandleStore(store_path)
+
+
+class CandleStore:
+    """Колонки свечей, отображённые в память (np.memmap)"""
+
+    def __init__(self, store_path):
+        self.path = store_path
+        with open(store_path, "rb") as file:
+            magic, version, size = HEADER.unpack(file.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{store_path}: не файл свечей (magic={magic!r}, version={version})")
+
+        self.size = size
+        self.datetime = np.memmap(store_path, dtype=np.int64, mode="r",
+                                  offset=HEADER.size, shape=(size,)) if size else np.empty(0, np.int64)
+        self.ohlcv = np.memmap(store_path, dtype=np.float64, mode="r",
+                               offset=HEADER.size + 8 * size,
+                               shape=(len(COLUMNS), size)) if size else np.empty((len(COLUMNS), 0))
+        for name, column in zip(COLUMNS, self.ohlcv):
+            setattr(self, name, column)
+        self._step = None
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def step(self):
+        """Длина свечи в секундах (считается при первом обращении)"""
+        if self._step is None:
+            self._step = infer_step(self.datetime)
+        return self._step
+
+    def bounds(self, start=None, end=None):
+        """Диапазон строк [lo, hi) с временем в [start, end] (бинарный поиск)"""
+        lo = 0 if start is None else int(np.searchsorted(self.datetime, start, side="left"))
+        hi = self.size if end is None else int(np.searchsorted(self.datetime, end, side="right"))
+        return lo, max(lo, hi)
+
+
+def to_epoch(dt):
+    """datetime без таймзоны -> секунды в шкале хранилища"""
+    return (dt - EPOCH) // timedelta(seconds=1)
+
+
+if __name__ == "__main__":
+    # python candle_store.py data/BTCUSDT_15.csv [data/BTCUSDT_60.csv ...]
+    for path in sys.argv[1:]:
+        print(f"✅ {path} -> {csv_to_store(path)}")
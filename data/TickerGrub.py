@@ -1,6 +1,19 @@
-from pybit.unified_trading import HTTP
 from pprint import pprint
 from datetime import datetime
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from os.path import exists, getsize
+import argparse
+import sys
+import threading
+import time
+
+import numpy as np
+
+try:
+    from .candle_index import INTERVAL_SECONDS, build_index, local_to_utc, utc_to_local
+except ImportError:  # Запуск скриптом из папки data
+    from candle_index import INTERVAL_SECONDS, build_index, local_to_utc, utc_to_local
 
 intro = """
 <<<---TickerGrub--->>>
@@ -18,59 +31,314 @@ BTCUSDT, LTCUSDT, ETHUSDT
 ticker_name = ""
 interval = "D"
 
-# Создаём объект HTTP для работы с Bybit
-session = HTTP(testnet=False)
+# Объект HTTP для работы с Bybit создаётся при первом скачивании (get_session):
+# импорт pybit занимает ~0.2 c, меню и офлайн-клиент bybit_fake без него быстрее
+session = None
+
+# Откуда начинаем, если файла ещё нет
+HISTORY_START = datetime(2022, 1, 1)
+# Bybit отдаёт не больше 1000 свечей за запрос
+PAGE_LIMIT = 1000
+CSV_HEADER = "datetime,open,high,low,close,volume"
+CSV_DTFORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def get_session():
+    """Общая сессия pybit HTTP, создаётся при первом обращении"""
+    global session
+    if session is None:
+        from pybit.unified_trading import HTTP
+        session = HTTP(testnet=False)
+    return session
+
+
+class RateLimiter:
+    """Не больше rate запросов в секунду на все потоки"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            sleep = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if sleep > 0:
+            time.sleep(sleep)
+
+
+def csv_file_for(ticker, interval):
+    return f"{ticker}_{interval}.csv"
+
+
+def last_saved_time(csv_file_name):
+    """Время (unix, секунды) последней свечи в CSV или None"""
+    if not exists(csv_file_name) or getsize(csv_file_name) == 0:
+        return None
+
+    with open(csv_file_name, "rb") as file:
+        # Читаем только хвост файла, не весь CSV
+        offset = max(0, getsize(csv_file_name) - 4096)
+        file.seek(offset)
+        lines = file.read().decode("utf-8").strip().splitlines()
 
+    if offset:
+        lines = lines[1:]  # Первая строка хвоста может быть обрезана
+    lines = [line for line in lines if line and not line.startswith("datetime")]
+    if not lines:
+        return None
+    # Локальное время в час перевода часов назад повторяется: какой из
+    # вариантов у последней свечи, видно только по свечам перед ней
+    local_times = np.array([line[:19].replace(" ", "T") for line in lines], dtype="datetime64[s]")
+    return int(local_to_utc(local_times.astype(np.int64))[-1])
 
-def start_grub():
-    global ticker_name, interval
 
-    all_candles = []
-    # начнем "сдалека", например 2017-01-01
-    start_time = int(datetime(2022, 1, 1).timestamp())
+def split_windows(start_time, end_time, interval):
+    """Окна [start, end] в секундах, по PAGE_LIMIT свечей в каждом"""
+    step = INTERVAL_SECONDS.get(interval)
+    if step is None:
+        return [(start_time, end_time)]
 
-    while True:
-        get_candles = session.get_kline(
+    span = step * PAGE_LIMIT
+    return [(lo, min(lo + span - 1, end_time)) for lo in range(start_time, end_time + 1, span)]
+
+
+def fetch_window(client, ticker, interval, window, limiter=None):
+    """Свечи одного окна по возрастанию времени, без повторов
+
+    Страницы могут прийти в любом порядке и залезать за границы окна:
+    всё лишнее отбрасывается, повторы схлопываются по времени.
+    """
+    start_time, end_time = window
+    lo_ms, hi_ms = start_time * 1000, end_time * 1000 + 999
+    step_ms = INTERVAL_SECONDS.get(interval, 0) * 1000
+    candles = {}
+
+    while lo_ms <= hi_ms:
+        if limiter:
+            limiter.wait()
+        get_candles = client.get_kline(
             category="spot",
-            symbol=ticker_name,
+            symbol=ticker,
             interval=interval,
-            start=start_time * 1000,  # API ждёт миллисекунды
-            limit=1000
+            start=lo_ms,  # API ждёт миллисекунды
+            end=hi_ms,
+            limit=PAGE_LIMIT
         )
+        page = get_candles["result"]["list"]
+        for candle in page:
+            candle_ms = int(candle[0])
+            if start_time * 1000 <= candle_ms <= end_time * 1000 + 999:
+                candles[candle_ms] = candle
+
+        if len(page) < PAGE_LIMIT:
+            break  # Окно выбрано целиком
+
+        # Полная страница: добираем то, что осталось в окне
+        page_times = [int(candle[0]) for candle in page]
+        if step_ms and min(page_times) - step_ms < lo_ms and max(page_times) + step_ms > hi_ms:
+            break  # Страница уже покрывает окно от начала до конца
+        if min(page_times) > lo_ms:
+            hi_ms = min(page_times) - 1  # API отдал самые свежие свечи
+        elif lo_ms <= max(page_times) < hi_ms:
+            lo_ms = max(page_times) + 1  # API отдал самые старые свечи
+        else:
+            break  # Страница не сдвигает границы окна
+
+    return [candles[candle_ms] for candle_ms in sorted(candles)]
 
-        candles = get_candles["result"]["list"]
-        if not candles:
-            break  # данных больше нет → останавливаемся
 
-        candles.reverse()  # хронологический порядок
-        all_candles.extend(candles)
+def local_datetimes(unix_times):
+    """unix-время (секунды) -> строки CSV_DTFORMAT, как datetime.fromtimestamp
 
-        # берём последнюю свечу и ставим время +1 секунда
-        last_time = int(candles[-1][0]) // 1000
+    Строки собирает NumPy без strftime на каждую свечу.
+    """
+    iso = np.datetime_as_string(utc_to_local(unix_times).astype("datetime64[s]"))
+    return [date_time[:10] + " " + date_time[11:] for date_time in iso.tolist()]
+
+
+def format_rows(candles):
+    """Свечи Bybit -> текст CSV одним куском"""
+    if not candles:
+        return ""
+    dates = local_datetimes([int(candle[0]) // 1000 for candle in candles])
+    return "".join(f"{date},{c[1]},{c[2]},{c[3]},{c[4]},{c[5]}\n" for date, c in zip(dates, candles))
+
+
+def plan_download(csv_file_name, candle_interval, end_time):
+    """Время последней свечи в файле (или None) и окна, которые осталось скачать"""
+    last_time = last_saved_time(csv_file_name)
+    if last_time is None:
+        start_time = int(HISTORY_START.timestamp())
+    else:
         start_time = last_time + 1
+    return last_time, split_windows(start_time, end_time, candle_interval)
+
 
-        # Если меньше 1000 пришло → значит дошли до "конца истории"
-        if len(candles) < 1000:
-            break
+def start_grub(client=None, ticker=None, candle_interval=None, workers=4, rate=10, end_time=None):
+    """Докачка истории в {ticker}_{interval}.csv
 
-    # сохраняем в CSV
-    csv_file_name = f"{ticker_name}_{interval}.csv"
-    first_row = "datetime,open,high,low,close,volume"
+    Окна по PAGE_LIMIT свечей качаются параллельно (workers потоков, не больше
+    rate запросов в секунду) и пишутся в файл по порядку сразу, как готовы.
+    Если файл уже есть, скачивание продолжается с его последней свечи.
+    client - объект с методом get_kline как у pybit HTTP (по умолчанию get_session()).
+    """
+    client = client or get_session()
+    ticker = ticker or ticker_name
+    candle_interval = candle_interval or interval
 
-    with open(csv_file_name, mode="w", encoding="utf-8") as file:
-        file.write(first_row + "\n")
+    csv_file_name = csv_file_for(ticker, candle_interval)
+    last_time, windows = plan_download(csv_file_name, candle_interval, end_time or int(time.time()))
+    limiter = RateLimiter(rate)
+    written = 0
+    started = time.perf_counter()
 
-        for candle in all_candles:
-            unix_time = int(candle[0]) // 1000
-            date_time = datetime.fromtimestamp(unix_time)
-            candle[0] = date_time.strftime("%Y-%m-%d %H:%M:%S")
+    mode = "a" if last_time is not None else "w"
+    with open(csv_file_name, mode=mode, encoding="utf-8") as file, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        if mode == "w":
+            file.write(CSV_HEADER + "\n")
 
-            candle_maped = map(str, candle[:6])
-            candle_join = ",".join(candle_maped)
-            file.write(candle_join + "\n")
+        # Держим в работе не больше 2 * workers окон, чтобы готовые,
+        # но ещё не записанные окна не копились в памяти
+        windows = iter(windows)
+        pending = deque()
 
+        def submit_next():
+            window = next(windows, None)
+            if window is not None:
+                pending.append(pool.submit(fetch_window, client, ticker, candle_interval, window, limiter))
+
+        for _ in range(2 * workers):
+            submit_next()
+
+        last_ms = -1 if last_time is None else last_time * 1000 + 999
+        while pending:
+            candles = pending.popleft().result()
+            submit_next()
+
+            # Окна могут перекрываться на границах: пишем только новые свечи
+            candles = [candle for candle in candles if int(candle[0]) > last_ms]
+            if candles:
+                file.write(format_rows(candles))
+                file.flush()
+                last_ms = int(candles[-1][0])
+                written += len(candles)
+
+    # Индекс рядом с CSV: поиск по дате, пропуски и повторы
+    index = build_index(csv_file_name)
+    index.save()
+
+    elapsed = time.perf_counter() - started
     print(f"✅ Данные сохранены в {csv_file_name}")
-    print(f"📊 Всего собрано свечей: {len(all_candles)}")
+    print(f"📊 Новых свечей: {written} за {elapsed:.1f} c")
+    print(f"📋 Проверка: {index.summary()}")
+    return written
+
+
+class BatchJob:
+    """Один тикер на одном интервале в пакетном скачивании"""
+
+    def __init__(self, ticker, candle_interval, end_time):
+        self.ticker = ticker
+        self.interval = candle_interval
+        self.csv_file_name = csv_file_for(ticker, candle_interval)
+        self.last_time, self.windows = plan_download(self.csv_file_name, candle_interval, end_time)
+        self.results = [None] * len(self.windows)
+        self.remaining = len(self.windows)
+        self.started = None
+        self.elapsed = 0.0
+        self.written = 0
+        self.index = None
+
+    def save(self):
+        """Все окна скачаны: новые свечи пишутся в файл одной записью"""
+        last_ms = -1 if self.last_time is None else self.last_time * 1000 + 999
+        candles = []
+        for window_candles in self.results:
+            for candle in window_candles:
+                if int(candle[0]) > last_ms:
+                    candles.append(candle)
+                    last_ms = int(candle[0])
+        self.results = None
+
+        text = format_rows(candles)
+        if self.last_time is None:
+            text = CSV_HEADER + "\n" + text
+        with open(self.csv_file_name, mode="w" if self.last_time is None else "a", encoding="utf-8") as file:
+            file.write(text)
+        self.index = build_index(self.csv_file_name)
+        self.index.save()
+
+        self.written = len(candles)
+        self.elapsed = time.perf_counter() - self.started
+
+
+def grub_batch(tickers, intervals, client=None, workers=8, rate=10, end_time=None):
+    """Докачка всех тикеров на всех интервалах общим пулом потоков
+
+    Окна всех файлов идут через один пул и один ограничитель запросов
+    (rate в секунду на всех). Файл пишется одной записью, как только
+    скачаны все его окна.
+    """
+    client = client or get_session()
+    end_time = end_time or int(time.time())
+    jobs = [BatchJob(ticker, candle_interval, end_time) for ticker in tickers for candle_interval in intervals]
+    tasks = iter([(job, index, window) for job in jobs for index, window in enumerate(job.windows)])
+    limiter = RateLimiter(rate)
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        in_flight = {}
+
+        def submit_next():
+            task = next(tasks, None)
+            if task is not None:
+                job, index, window = task
+                if job.started is None:
+                    job.started = time.perf_counter()
+                future = pool.submit(fetch_window, client, job.ticker, job.interval, window, limiter)
+                in_flight[future] = (job, index)
+
+        for _ in range(2 * workers):
+            submit_next()
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, index = in_flight.pop(future)
+                job.results[index] = future.result()
+                job.remaining -= 1
+                if job.remaining == 0:
+                    job.save()
+                submit_next()
+
+    elapsed = time.perf_counter() - started
+    print(f"{'Тикер':<12}{'Интервал':>9}{'Свечей':>10}{'Время, c':>10}{'Свечей/с':>10}"
+          f"{'Пропусков':>11}{'Повторов':>10}")
+    for job in jobs:
+        speed = job.written / job.elapsed if job.elapsed else 0
+        gaps, duplicates = (len(job.index.gaps), len(job.index.duplicates)) if job.index else ("-", "-")
+        print(f"{job.ticker:<12}{job.interval:>9}{job.written:>10}{job.elapsed:>10.1f}{speed:>10.0f}"
+              f"{gaps:>11}{duplicates:>10}")
+    total = sum(job.written for job in jobs)
+    print(f"\n✅ Файлов: {len(jobs)}, свечей: {total}, всего {elapsed:.1f} c ({total / elapsed:.0f} свечей/с)")
+    return jobs
+
+
+def grub_sequential(tickers, intervals, client=None, rate=10, end_time=None):
+    """Старый порядок для сравнения: файлы по одному, запросы по одному"""
+    started = time.perf_counter()
+    total = 0
+    for ticker in tickers:
+        for candle_interval in intervals:
+            total += start_grub(client, ticker, candle_interval, workers=1, rate=rate, end_time=end_time)
+    elapsed = time.perf_counter() - started
+    print(f"\n✅ Последовательно: свечей {total}, всего {elapsed:.1f} c ({total / elapsed:.0f} свечей/с)")
 
 
 def menu():
@@ -94,6 +362,27 @@ def menu():
         menu()
 
 
-# Запуск
+def batch_main():
+    parser = argparse.ArgumentParser(description="Пакетное скачивание свечей с Bybit")
+    parser.add_argument("--tickers", nargs="+", required=True, help="Например BTCUSDT ETHUSDT")
+    parser.add_argument("--intervals", nargs="+", required=True, help="Например 15 60 D")
+    parser.add_argument("--workers", type=int, default=8, help="Потоков на все файлы")
+    parser.add_argument("--rate", type=float, default=10, help="Запросов в секунду на все файлы")
+    parser.add_argument("--sequential", action="store_true", help="Качать по-старому, для сравнения")
+    args = parser.parse_args()
+
+    tickers = [ticker.upper() for ticker in args.tickers]
+    intervals = [candle_interval.upper() for candle_interval in args.intervals]
+    if args.sequential:
+        grub_sequential(tickers, intervals, rate=args.rate)
+    else:
+        grub_batch(tickers, intervals, workers=args.workers, rate=args.rate)
+
+
+# Запуск: без аргументов - меню, с аргументами - пакетный режим
+# python TickerGrub.py --tickers BTCUSDT ETHUSDT --intervals 15 60
 if __name__ == "__main__":
-    menu()
+    if len(sys.argv) > 1:
+        batch_main()
+    else:
+        menu()
@@ -0,0 +1,53 @@
+import random
+import threading
+
+# Офлайн-замена pybit HTTP для TickerGrub: тот же get_kline и формат ответа.
+# Свечи детерминированы (зависят только от времени), поэтому результат
+# скачивания можно сверять с expected_candles().
+
+
+class FakeHTTP:
+    """Поддельная сессия Bybit с настраиваемыми странностями
+
+    gaps - список (start_ms, end_ms), где биржа свечей не отдаёт;
+    overlap - сколько лишних свечей до start добавлять в ответ;
+    shuffle - перемешивать порядок свечей в странице;
+    oldest_first - отдавать первые limit свечей диапазона, а не последние.
+    """
+
+    def __init__(self, step_ms, listed_ms=0, gaps=(), overlap=0, shuffle=False,
+                 oldest_first=False, seed=0):
+        self.step_ms = step_ms
+        self.listed_ms = listed_ms - listed_ms % step_ms
+        self.gaps = list(gaps)
+        self.overlap = overlap
+        self.shuffle = shuffle
+        self.oldest_first = oldest_first
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def candle(self, candle_ms):
+        price = 100 + (candle_ms // self.step_ms) % 97
+        return [str(candle_ms), f"{price}", f"{price + 2}", f"{price - 1}", f"{price + 1}", "10.5", "1050"]
+
+    def in_gap(self, candle_ms):
+        return any(lo <= candle_ms <= hi for lo, hi in self.gaps)
+
+    def expected_candles(self, start_ms, end_ms):
+        """Какие свечи должны оказаться в файле за [start_ms, end_ms]"""
+        first = max(self.listed_ms, start_ms + (-start_ms) % self.step_ms)
+        return [self.candle(t) for t in range(first, end_ms + 1, self.step_ms) if not self.in_gap(t)]
+
+    def get_kline(self, category, symbol, interval, start=None, end=None, limit=200):
+        with self.lock:
+            self.calls += 1
+        start = (start or 0) - self.overlap * self.step_ms
+        candles = self.expected_candles(start, end)
+        candles = candles[:limit] if self.oldest_first else candles[-limit:]
+        candles.reverse()  # Как у Bybit: сначала самые свежие
+        if self.shuffle:
+            with self.lock:
+                self.random.shuffle(candles)
+        return {"retCode": 0, "retMsg": "OK", "result": {"category": category, "symbol": symbol,
+                                                        "list": candles}}
@@ -0,0 +1,361 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+# Индекс CSV из TickerGrub рядом с файлом (BTCUSDT_15.idx): время каждой
+# строки, её смещение в байтах, пропуски, повторы и свечи с нулевым объёмом.
+# Строится за один векторный проход по байтам файла, без разбора строк:
+# время берётся из первых 19 символов строки ("YYYY-MM-DD HH:MM:SS"),
+# объём - из последнего поля.
+# python candle_index.py BTCUSDT_1.csv [BTCUSDT_15.csv ...]
+
+INDEX_EXT = ".idx"
+NEWLINE, COMMA, ZERO, ONE, NINE = b"\n,019"
+DT_WIDTH = 19
+MAX_FIELD = 64  # Длиннее объём в CSV не бывает
+# Длина свечи в секундах в обозначениях Bybit/TickerGrub (у M длина плавает)
+INTERVAL_SECONDS = {
+    "1": 60, "3": 180, "5": 300, "15": 900, "30": 1800, "60": 3600,
+    "120": 7200, "240": 14400, "360": 21600, "720": 43200,
+    "D": 86400, "W": 604800,
+}
+
+
+def index_path_for(csv_path):
+    """Путь к индексу рядом с CSV"""
+    return os.path.splitext(csv_path)[0] + INDEX_EXT
+
+
+def read_padded(path, size):
+    """Байты файла и 8 нулевых байт в конце: слова byte_words не выходят за буфер"""
+    buf = np.zeros(size + 8, dtype=np.uint8)
+    with open(path, "rb") as file:
+        file.readinto(memoryview(buf)[:size])
+    return buf
+
+
+def days_from_civil(year, month, day):
+    """Дата -> дни от 1970-01-01 (векторно, григорианский календарь)"""
+    year = year - (month <= 2)
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def byte_words(buf):
+    """Восемь байт с каждой позиции как uint64 (представление без копии)"""
+    return np.ndarray(shape=(max(len(buf) - 7, 0),), dtype="<u8", buffer=buf, strides=(1,))
+
+
+def lanes(value, positions):
+    """uint64 с байтом value на позициях positions (байт 0 - младший)"""
+    return np.uint64(sum(value << (8 * k) for k in positions))
+
+
+def digit_lanes(words, positions):
+    """Цифры на позициях positions слов: (значения байт - "0", ошибки формата)
+
+    Остальные байты обнуляются. Ошибка - на месте цифры не цифра.
+    """
+    mask = lanes(0xFF, positions)
+    digits = (words & mask) - lanes(ZERO, positions)  # У цифр старшая тетрада 3: заёма нет
+    bad = ((words & lanes(0xF0, positions)) != lanes(0x30, positions)) | \
+          (((digits + lanes(6, positions)) & lanes(0xF0, positions)) != 0)
+    return digits & mask, bad
+
+
+def pair_values(digits):
+    """Байт k слова -> 10 * цифра k + цифра k + 1 (SWAR, без разбора по байтам)"""
+    return digits * np.uint64(10) + (digits >> np.uint64(8))
+
+
+def lane(words, k):
+    return ((words >> np.uint64(8 * k)) & np.uint64(0xFF)).astype(np.int64)
+
+
+def parse_times(buf, starts):
+    """Секунды "как в CSV" (строка читается как UTC) для строк с началами starts
+
+    Строка "YYYY-MM-DD HH:MM:SS" берётся тремя словами по 8 байт, пары
+    цифр складываются сразу во всех байтах слова. Дата разбирается один
+    раз на серию строк с одинаковой датой (в файле они идут подряд).
+    Возвращает (epochs, bad): bad - строки, где на месте цифр не цифры.
+    """
+    words = byte_words(buf)
+    head = words[starts]  # "YYYY-MM-"
+    clock = words[starts + 8]  # "DD HH:MM"
+    tail = words[starts + 16]  # ":SS"
+
+    day_bytes = np.uint64(0xFFFF)
+    runs = np.flatnonzero((head[1:] != head[:-1]) | (((clock[1:] ^ clock[:-1]) & day_bytes) != 0)) + 1
+    runs = np.concatenate(([0], runs)) if len(starts) else runs
+    date, bad_date = digit_lanes(head[runs], (0, 1, 2, 3, 5, 6))
+    day, bad_day = digit_lanes(clock[runs], (0, 1))
+    date, day = pair_values(date), pair_values(day)
+    days = days_from_civil(lane(date, 0) * 100 + lane(date, 2), lane(date, 5), lane(day, 0))
+    lengths = np.diff(np.append(runs, len(starts)))
+
+    clock, bad = digit_lanes(clock, (3, 4, 6, 7))
+    tail, bad_tail = digit_lanes(tail, (1, 2))
+    bad |= bad_tail | np.repeat(bad_date | bad_day, lengths)
+    clock, tail = pair_values(clock), pair_values(tail)
+    seconds = lane(clock, 3) * 3600 + lane(clock, 6) * 60 + lane(tail, 1)
+    return np.repeat(days * 86400, lengths) + seconds, bad
+
+
+def byte_flags(words, low, high):
+    """Старший бит в байтах слов, где байт ASCII в диапазоне [low, high]"""
+    high_bits = lanes(0x80, range(8))
+    seven_bits = lanes(0x7F, range(8))
+    above = ((words | high_bits) - lanes(low, range(8))) & high_bits
+    below = (lanes(0x80 | high, range(8)) - (words & seven_bits)) & high_bits
+    return above & below & ~words
+
+
+def zero_volumes(buf, ends):
+    """Строки, где в последнем поле (объём) нет ни одной ненулевой цифры
+
+    Поле читается с конца словами по 8 байт. Флаги байтов - старшие биты,
+    поэтому "ненулевая цифра правее последней запятой" - это просто
+    digits > commas.
+    """
+    words = byte_words(buf)
+    zero = np.ones(len(ends), dtype=bool)
+    inside = np.ones(len(ends), dtype=bool)  # Ещё не дошли до запятой перед объёмом
+    for start in range(8, MAX_FIELD + 1, 8):
+        word = words[np.maximum(ends - start, 0)]
+        commas = byte_flags(word, COMMA, COMMA)
+        digits = byte_flags(word, ONE, NINE)
+        zero &= ~(inside & (digits > commas))
+        inside &= commas == 0
+        if not inside.any():
+            break
+    return zero
+
+
+def infer_step(epochs):
+    """Длина свечи в секундах: медиана положительных разностей времени"""
+    diffs = np.diff(epochs)
+    diffs = diffs[::max(1, len(diffs) // 65536)]  # Для медианы хватает выборки по всему файлу
+    diffs = diffs[diffs > 0]
+    return int(np.median(diffs)) if len(diffs) else 0
+
+
+def utc_to_local(unix_times):
+    """unix-время (секунды) -> локальное время "как в CSV", как datetime.fromtimestamp
+
+    Смещение часового пояса берётся один раз на сутки (UTC), если оно
+    одинаково в начале и в конце суток; в сутки перевода часов - для
+    каждой свечи отдельно.
+    """
+    unix_times = np.asarray(unix_times, dtype=np.int64)
+    days, inverse = np.unique(unix_times // 86400, return_inverse=True)
+    starts = np.array([time.localtime(day * 86400).tm_gmtoff for day in days.tolist()], dtype=np.int64)
+    ends = np.array([time.localtime(day * 86400 + 86399).tm_gmtoff for day in days.tolist()], dtype=np.int64)
+    local_times = unix_times + starts[inverse]
+
+    mixed = (starts != ends)[inverse]
+    if mixed.any():
+        local_times[mixed] = [t + time.localtime(t).tm_gmtoff for t in unix_times[mixed].tolist()]
+    return local_times
+
+
+def local_to_utc(local_times):
+    """Обратно к utc_to_local: локальное время "как в CSV" -> unix-время
+
+    Время идёт по возрастанию, как в CSV. В час перевода часов назад
+    локальное время повторяется: берётся самый ранний вариант позже
+    предыдущей свечи. Несуществующее время (перевод вперёд) сдвигается
+    по смещению до перевода.
+    """
+    local_times = np.asarray(local_times, dtype=np.int64)
+    days, inverse = np.unique(local_times // 86400, return_inverse=True)
+    # Смещение не больше суток: если оно одно и то же с запасом в сутки
+    # с обеих сторон, перевода часов рядом нет
+    before = np.array([time.localtime(day * 86400 - 86400).tm_gmtoff for day in days.tolist()], dtype=np.int64)
+    after = np.array([time.localtime(day * 86400 + 2 * 86400).tm_gmtoff for day in days.tolist()], dtype=np.int64)
+    unix_times = local_times - before[inverse]
+
+    for i in np.flatnonzero((before != after)[inverse]).tolist():
+        local, day = int(local_times[i]), inverse[i]
+        candidates = sorted(local - offset for offset in {int(before[day]), int(after[day])}
+                            if time.localtime(local - offset).tm_gmtoff == offset)
+        later = [t for t in candidates if not i or t > unix_times[i - 1]]
+        unix_times[i] = (later or candidates or [local - before[day]])[0]
+    return unix_times
+
+
+def gap_flags(epochs, step, previous=None):
+    """True у строк, перед которыми пропуск или повтор времени
+
+    previous - время строки перед epochs[0], если она есть.
+    """
+    epochs = np.asarray(epochs, dtype=np.int64)
+    flags = np.zeros(len(epochs), dtype=bool)
+    if not step or not len(epochs):
+        return flags
+    diffs = np.diff(epochs, prepend=epochs[0] if previous is None else previous)
+    if previous is None:
+        diffs[0] = step
+    # Полтора шага: у месячных свечей длина плавает, а пропуск - это кратный шаг
+    return (diffs > step + step // 2) | (diffs <= 0)
+
+
+class CandleIndex:
+    """Индекс строк CSV: время, смещения и найденные проблемы
+
+    gaps - строки, перед которыми не хватает свечей (сколько - в missing),
+    duplicates - строки со временем не больше предыдущего (повтор или
+    непорядок), zero_volume - свечи без объёма, bad - строки с испорченным
+    временем.
+    """
+    ARRAYS = ("epochs", "offsets", "gaps", "missing", "duplicates", "zero_volume", "bad")
+
+    def __init__(self, csv_path, epochs, offsets, step, gaps, missing, duplicates, zero_volume, bad,
+                 csv_size, csv_mtime_ns):
+        self.csv_path = csv_path
+        self.epochs = epochs
+        self.offsets = offsets
+        self.step = step
+        self.gaps = gaps
+        self.missing = missing
+        self.duplicates = duplicates
+        self.zero_volume = zero_volume
+        self.bad = bad
+        self.csv_size = csv_size
+        self.csv_mtime_ns = csv_mtime_ns
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def row_at(self, epoch):
+        """Первая строка со временем не раньше epoch (бинарный поиск)
+
+        При повторах и непорядке во времени результат приблизительный:
+        такие строки есть в duplicates.
+        """
+        return int(np.searchsorted(self.epochs, epoch, side="left"))
+
+    def offset_at(self, epoch):
+        """Смещение в байтах первой строки со временем не раньше epoch"""
+        row = self.row_at(epoch)
+        return int(self.offsets[row]) if row < len(self) else self.csv_size
+
+    def flags(self):
+        """True у строк, перед которыми пропуск или повтор (по строкам файла)"""
+        flags = np.zeros(len(self), dtype=bool)
+        flags[self.gaps] = True
+        flags[self.duplicates] = True
+        return flags
+
+    def is_fresh(self):
+        """CSV не менялся с построения индекса"""
+        try:
+            stat = os.stat(self.csv_path)
+        except OSError:
+            return False
+        return stat.st_size == self.csv_size and stat.st_mtime_ns == self.csv_mtime_ns
+
+    def summary(self):
+        """Одна строка итогов проверки"""
+        return (f"{len(self)} строк, шаг {self.step} c, пропусков {len(self.gaps)} "
+                f"({int(self.missing.sum())} свечей), повторов {len(self.duplicates)}, "
+                f"нулевой объём {len(self.zero_volume)}, испорчено {len(self.bad)}")
+
+    def save(self, path=None):
+        path = path or index_path_for(self.csv_path)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            np.savez(file, meta=np.array([self.step, self.csv_size, self.csv_mtime_ns], dtype=np.int64),
+                     **{name: getattr(self, name) for name in self.ARRAYS})
+        os.replace(tmp_path, path)  # Читатели не увидят недописанный индекс
+        return path
+
+    @classmethod
+    def load(cls, csv_path, path=None):
+        with np.load(path or index_path_for(csv_path)) as saved:
+            step, csv_size, csv_mtime_ns = saved["meta"].tolist()
+            return cls(csv_path, step=step, csv_size=csv_size, csv_mtime_ns=csv_mtime_ns,
+                       **{name: saved[name] for name in cls.ARRAYS})
+
+
+def build_index(csv_path):
+    """Индекс CSV за один проход по байтам файла
+
+    Строки без перевода строки в конце (файл ещё дописывается) не входят
+    в индекс.
+    """
+    stat = os.stat(csv_path)
+    buf = read_padded(csv_path, stat.st_size)
+    ends = np.flatnonzero(buf[:stat.st_size] == NEWLINE)
+    starts = np.empty_like(ends)
+    starts[:1] = 0
+    starts[1:] = ends[:-1] + 1
+
+    rows = (ends - starts) > DT_WIDTH  # Заголовок отсеется ниже, пустые строки - здесь
+    if len(ends) and buf[:1].tobytes() == b"d":  # "datetime,open,..."
+        rows[0] = False
+    starts, ends = starts[rows], ends[rows]
+    # IndexedCSVData делает seek текстового файла прямо на эти смещения:
+    # это законно, только если смещение - начало строки
+    assert (buf[starts[starts > 0] - 1] == NEWLINE).all(), "Смещение строки не после перевода строки"
+
+    epochs, bad = parse_times(buf, starts)
+    # Испорченные строки остаются в индексе (смещения идут подряд), но во
+    # времени соседей не участвуют
+    good = np.flatnonzero(~bad) if bad.any() else np.arange(len(epochs))
+    diffs = np.diff(epochs[good])
+    step = infer_step(epochs[good])
+    if step:
+        jumps = np.flatnonzero(diffs > step + step // 2)
+        gaps = good[jumps + 1]
+        missing = (diffs[jumps] + step // 2) // step - 1
+    else:
+        gaps = missing = np.empty(0, dtype=np.int64)
+
+    return CandleIndex(
+        csv_path, epochs, starts, step, gaps, missing,
+        duplicates=good[np.flatnonzero(diffs <= 0) + 1],
+        zero_volume=np.flatnonzero(zero_volumes(buf, ends)),
+        bad=np.flatnonzero(bad),
+        csv_size=stat.st_size, csv_mtime_ns=stat.st_mtime_ns)
+
+
+def ensure_index(csv_path):
+    """Индекс из файла рядом с CSV; если его нет или он устарел - строится заново"""
+    path = index_path_for(csv_path)
+    if os.path.exists(path):
+        index = CandleIndex.load(csv_path, path)
+        if index.is_fresh():
+            return index
+    index = build_index(csv_path)
+    index.save(path)
+    return index
+
+
+def format_epoch(epoch):
+    return str(np.datetime64(int(epoch), "s")).replace("T", " ")
+
+
+def print_report(index, limit=10):
+    """Итоги и первые limit пропусков"""
+    print(f"📋 {index.csv_path}: {index.summary()}")
+    for row, missing in zip(index.gaps[:limit].tolist(), index.missing[:limit].tolist()):
+        print(f"   пропуск {format_epoch(index.epochs[row - 1])} -> {format_epoch(index.epochs[row])}: "
+              f"{missing} свечей")
+    if len(index.gaps) > limit:
+        print(f"   ... ещё {len(index.gaps) - limit}")
+
+
+if __name__ == "__main__":
+    for csv_path in sys.argv[1:]:
+        started = time.perf_counter()
+        index = build_index(csv_path)
+        elapsed = time.perf_counter() - started
+        index.save()
+        print_report(index)
+        print(f"⚡ Проверено за {elapsed:.2f} c")
@@ -0,0 +1,142 @@
+import os
+import sys
+from contextlib import contextmanager, redirect_stdout
+
+# Журнал событий стратегий вместо print.
+# Событие - кортеж (уровень, шаблон, аргументы). Строка собирается через
+# шаблон.format(*аргументы) только в приёмнике, который её выводит, а
+# событие ниже уровня журнала отбрасывается сразу, без форматирования.
+
+DEBUG = 10  # Отладка: проверки условий, смена статусов ордеров
+INFO = 20  # Сигналы, сделки, исполнения ордеров
+WARNING = 30  # Отклонённые ордера
+OFF = 100  # Журнал выключен (перебор параметров)
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", OFF: "OFF"}
+
+
+def format_event(event):
+    """Текст события"""
+    level, template, args = event
+    return template.format(*args) if args else template
+
+
+class ConsoleSink:
+    """Печатает события сразу, как print"""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def __call__(self, event):
+        print(format_event(event), file=self.stream or sys.stdout)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FileSink:
+    """Пишет события в файл пачками по batch штук"""
+
+    def __init__(self, path, batch=10000):
+        self.path = path
+        self.batch = batch
+        self.pending = []
+        self.file = open(path, "w", encoding="utf-8")
+
+    def __call__(self, event):
+        self.pending.append(event)
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.file.write("\n".join(map(format_event, self.pending)) + "\n")
+            self.pending.clear()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class EventRecorder:
+    """Журнал событий с уровнем и кольцевым буфером последних событий
+
+    Буфер на capacity событий выделяется заранее; capacity=0 отключает его.
+    Приёмники (sinks) - вызываемые объекты, получающие каждое событие.
+    """
+
+    def __init__(self, level=INFO, capacity=4096, sinks=()):
+        self.level = level
+        self.capacity = capacity
+        self.buffer = [None] * capacity
+        self.count = 0  # Сколько событий принято за всё время
+        self.sinks = list(sinks)
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def emit(self, level, template, *args):
+        if level < self.level:
+            return
+        event = (level, template, args)
+        if self.capacity:
+            self.buffer[self.count % self.capacity] = event
+        self.count += 1
+        for sink in self.sinks:
+            sink(event)
+
+    def debug(self, template, *args):
+        self.emit(DEBUG, template, *args)
+
+    def info(self, template, *args):
+        self.emit(INFO, template, *args)
+
+    def warning(self, template, *args):
+        self.emit(WARNING, template, *args)
+
+    def events(self):
+        """События из буфера, от старых к новым"""
+        if self.count <= self.capacity:
+            return self.buffer[:self.count]
+        start = self.count % self.capacity
+        return self.buffer[start:] + self.buffer[:start]
+
+    def lines(self):
+        """Текст событий из буфера"""
+        return [format_event(event) for event in self.events()]
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        """Дописывает и закрывает приёмники (файлы FileSink)"""
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def console_recorder(debug=False):
+    """Журнал по умолчанию: вывод в консоль, как раньше делал print"""
+    return EventRecorder(level=DEBUG if debug else INFO, capacity=0, sinks=[ConsoleSink()])
+
+
+def silent_recorder():
+    """Выключенный журнал: ни буфера, ни форматирования"""
+    return EventRecorder(level=OFF, capacity=0)
+
+
+@contextmanager
+def quiet():
+    """Вывод print в /dev/null на время блока: итоги stop() в переборе не нужны"""
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        yield
@@ -0,0 +1,167 @@
+import html
+import io
+from array import array
+from datetime import datetime
+from os.path import basename, splitext
+
+import numpy as np
+from backtrader import date2num
+from backtrader.observers import Broker
+
+# Быстрый график итогов бэктеста вместо cerebro.plot(): свечи сжимаются до
+# ширины картинки (на столбец пикселей - одна свеча с open первого бара,
+# close последнего, max high и min low, экстремумы не теряются), поверх -
+# только точки входа и выхода, под ценой - кривая капитала. Рисуется через
+# Figure без pyplot, окно не открывается, результат сразу пишется в файл:
+# PNG/SVG/PDF по расширению или HTML со встроенным SVG.
+#   strat = cerebro.run()[0]
+#   fast_plot(strat, "backtest.png")
+
+WIDTH = 1600  # Пикселей по горизонтали: столько свечей остаётся после сжатия
+HEIGHT = 900
+DPI = 100
+MPL_EPOCH = date2num(datetime(1970, 1, 1))  # Числа Backtrader -> даты matplotlib
+UP, DOWN = "#26a69a", "#ef5350"
+
+
+def line_values(line, size):
+    """Последние size значений линии Backtrader (по текущий бар) как массив numpy
+
+    В режиме runonce буфер наблюдателей заранее растянут и дополнен NaN,
+    поэтому конец берётся по line.idx, а не по длине буфера.
+    """
+    values = line.array
+    if isinstance(values, array):
+        values = np.frombuffer(values, dtype=np.float64)  # Без копии
+    else:  # exactbars: deque с хвостом линии
+        values = np.fromiter(values, dtype=np.float64)
+    end = line.idx + 1
+    return values[max(end - size, 0):end]
+
+
+def bucket_edges(size, buckets):
+    """Границы корзин: size баров на не больше чем buckets подряд идущих отрезков"""
+    if size <= buckets:
+        return np.arange(size + 1)
+    return np.linspace(0, size, buckets + 1).astype(np.int64)
+
+
+def decimate_ohlc(times, opens, highs, lows, closes, buckets):
+    """OHLC, сжатые до buckets свечей без потери максимумов и минимумов"""
+    edges = bucket_edges(len(times), buckets)
+    starts, ends = edges[:-1], edges[1:] - 1
+    return (times[starts], opens[starts], np.maximum.reduceat(highs, starts),
+            np.minimum.reduceat(lows, starts), closes[ends])
+
+
+def decimate_range(values, buckets):
+    """Минимум, максимум и последнее значение по корзинам"""
+    edges = bucket_edges(len(values), buckets)
+    starts = edges[:-1]
+    return (starts, np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts),
+            values[edges[1:] - 1])
+
+
+def executed_orders(strategy, data):
+    """Исполненные ордера по data: (время, цена, покупка ли)"""
+    marks = []
+    for order in getattr(strategy.broker, "orders", ()):
+        if order.data is data and order.status == order.Completed:
+            marks.append((order.executed.dt, order.executed.price, order.isbuy()))
+    return marks
+
+
+def equity_line(strategy, size):
+    """Капитал на каждом баре из наблюдателя Broker (stdstats) или None"""
+    for observer in strategy.observers:
+        if isinstance(observer, Broker) and len(observer):
+            return line_values(observer.lines.value, min(size, len(observer)))
+    return None
+
+
+def run_title(strategy, data, size):
+    """Заголовок по умолчанию: фид, число баров и итоговый капитал"""
+    name = basename(data._name or str(getattr(data.p, "dataname", "")))
+    return f"{name} {size} баров, капитал {strategy.broker.getvalue():.2f}"
+
+
+def render(strategy, data=None, width=WIDTH, height=HEIGHT, dpi=DPI, title=None):
+    """Figure matplotlib с графиком прогона strategy"""
+    from matplotlib.collections import LineCollection
+    from matplotlib.figure import Figure
+
+    data = data if data is not None else strategy.data
+    size = len(data)
+    if not size:
+        raise ValueError("В фиде нет баров: график строится после cerebro.run()")
+    times = line_values(data.datetime, size)
+    if len(times) < size:
+        raise ValueError("В фиде осталась не вся история (exactbars): график не построить")
+    times = times - MPL_EPOCH
+    # Ширина области графика ~ ширина картинки за вычетом полей
+    buckets = max(int(width * 0.85), 1)
+
+    equity = equity_line(strategy, size)
+    fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    if equity is not None:
+        price_ax, equity_ax = fig.subplots(2, 1, sharex=True, gridspec_kw={"height_ratios": [3, 1]})
+    else:
+        price_ax, equity_ax = fig.subplots(1, 1), None
+
+    x, o, h, l, c = decimate_ohlc(times, line_values(data.open, size), line_values(data.high, size),
+                                  line_values(data.low, size), line_values(data.close, size), buckets)
+    colors = np.where(c >= o, UP, DOWN)
+    step = np.median(np.diff(x)) if len(x) > 1 else 1.0
+    # Толщина тела в пунктах: ~70% от столбца, приходящегося на свечу
+    body = max(0.7 * width * 0.85 / len(x) * 72 / dpi, 0.5)
+    price_ax.add_collection(LineCollection(np.stack([np.column_stack([x, l]), np.column_stack([x, h])], axis=1),
+                                           colors=colors, linewidths=0.6))
+    price_ax.add_collection(LineCollection(
+        np.stack([np.column_stack([x, np.minimum(o, c)]), np.column_stack([x, np.maximum(o, c)])], axis=1),
+        colors=colors, linewidths=body))
+    price_ax.set_xlim(x[0] - step, x[-1] + step)
+    price_ax.set_ylim(l.min() * 0.995, h.max() * 1.005)
+
+    marks = executed_orders(strategy, data)
+    for is_buy, marker, color, label in ((True, "^", "#1565c0", "Покупка"), (False, "v", "#e65100", "Продажа")):
+        points = [(dt - MPL_EPOCH, price) for dt, price, buy in marks if buy is is_buy]
+        if points:
+            px, py = zip(*points)
+            price_ax.scatter(px, py, marker=marker, s=28, color=color, label=label, zorder=3, linewidths=0)
+    if marks:
+        price_ax.legend(loc="upper left")
+    price_ax.set_ylabel("Цена")
+    price_ax.grid(alpha=0.3)
+
+    if equity_ax is not None:
+        starts, low, high, last = decimate_range(equity, buckets)
+        ex = times[len(times) - len(equity):][starts]
+        equity_ax.fill_between(ex, low, high, color="#90caf9", linewidth=0)
+        equity_ax.plot(ex, last, color="#1565c0", linewidth=0.8)
+        equity_ax.set_ylabel("Капитал")
+        equity_ax.grid(alpha=0.3)
+
+    bottom_ax = equity_ax if equity_ax is not None else price_ax
+    bottom_ax.xaxis_date()
+    fig.autofmt_xdate()
+    fig.suptitle(title or run_title(strategy, data, len(times)))
+    fig.tight_layout()
+    return fig
+
+
+def fast_plot(strategy, path, data=None, width=WIDTH, height=HEIGHT, dpi=DPI, title=None):
+    """Пишет график прогона в path: .html - страница с SVG, иначе формат по расширению"""
+    data = data if data is not None else strategy.data
+    fig = render(strategy, data, width, height, dpi, title)
+    if splitext(path)[1].lower() in (".html", ".htm"):
+        svg = io.StringIO()
+        fig.savefig(svg, format="svg")
+        svg = svg.getvalue()
+        svg = svg[svg.find("<svg"):]  # Без XML-пролога и DOCTYPE
+        heading = html.escape(title or run_title(strategy, data, len(data)))
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{heading}</title></head>\n"
+                       f"<body>\n{svg}\n</body></html>\n")
+    else:
+        fig.savefig(path)
+    return path
@@ -0,0 +1,334 @@
+import argparse
+import time
+from datetime import datetime
+from os.path import abspath
+
+import numpy as np
+from candle_store import ensure_store, to_epoch
+from run_setup import BROKER
+
+# Быстрый бэктест CandlesOnly и ImbalanceStrategy без объектной модели
+# Backtrader: одна позиция, рыночные ордера, фиксированный объём и
+# процентная комиссия, как у FixedSize и setcommission в скриптах.
+# Повторяет исполнение Cerebro по умолчанию: ордер, созданный в next()
+# на баре i, исполняется по open первого бара с временем позже бара i
+# (у дневного таймфрейма - первого бара следующих суток); пока ордер не
+# исполнен, стратегия в next() ничего не делает. Ордер, для которого
+# такого бара нет, не исполняется. Между сделками ядро не идёт по барам, а ищет следующий
+# сигнал/выход по массивам, поэтому годится для отсева параметров перед
+# проверкой в Backtrader.
+# python kernel.py --strategy imbalance --validate
+
+
+def imbalance_signals(high, low, close, imbalance, profit):
+    """Бары, где find_bear_imbalance вернёт True (те же выражения)"""
+    signals = np.zeros(len(close), dtype=bool)
+    if len(close) < 4:
+        return signals
+    third_imb_kline = low[:-3]
+    second_imb_kline = low[1:-2]
+    first_imb_kline = high[2:-1]
+    current_kline = close[3:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        signals[3:] = ((second_imb_kline < third_imb_kline)
+                       & ((first_imb_kline - current_kline) / first_imb_kline > profit / 100)
+                       & ((third_imb_kline - first_imb_kline) / third_imb_kline > imbalance / 100))
+    return signals
+
+
+def fill_bars(datetime, n):
+    """Для каждого бара - бар исполнения созданного на нём ордера (n - никогда)"""
+    if datetime is None:
+        return np.arange(1, n + 1)
+    return np.searchsorted(datetime, datetime, side="right")
+
+
+def first_true(mask_fn, start, stop, step=256):
+    """Первый индекс в [start, stop), где mask_fn(lo, hi) истинна, или None
+
+    Проверяет окна растущего размера, чтобы не считать маску на весь ряд.
+    """
+    lo = start
+    while lo < stop:
+        hi = min(lo + step, stop)
+        hits = np.flatnonzero(mask_fn(lo, hi))
+        if len(hits):
+            return lo + int(hits[0])
+        lo = hi
+        step *= 2
+    return None
+
+
+class Book:
+    """Исполнение рыночных ордеров фиксированного объёма как в BackBroker
+
+    Открытие позиции проверяется на деньги (can_open), как check_submitted
+    и _execute в BackBroker. Закрытие не проверяется: BackBroker отклонит
+    его, только если убыток сделки больше всего капитала.
+    """
+
+    def __init__(self, cash, stake, commission):
+        self.cash = cash
+        self.stake = stake
+        self.commission = commission
+        self.size = 0.0
+        self.entry_bar = None
+        self.entry_price = None
+        self.entry_comm = None
+        self.fills = []  # (бар, объём со знаком, цена)
+        self.trades = []  # (бар входа, бар выхода, объём, цена входа, цена выхода, pnl, pnlcomm)
+
+    def can_open(self, size, price):
+        """Хватит ли денег на открытие size по price (у шорта выручка приходит сразу)"""
+        cash = self.cash - size * price
+        cash -= abs(size) * price * self.commission
+        return cash >= 0.0
+
+    def open(self, bar, size, price):
+        comm = abs(size) * price * self.commission
+        self.cash -= size * price
+        self.cash -= comm
+        self.size = size
+        self.entry_bar, self.entry_price, self.entry_comm = bar, price, comm
+        self.fills.append((bar, size, price))
+
+    def close(self, bar, price):
+        size = self.size
+        comm = abs(size) * price * self.commission
+        pnl = size * (price - self.entry_price)
+        self.cash += size * price
+        self.cash -= comm
+        self.trades.append((self.entry_bar, bar, size, self.entry_price, price,
+                            pnl, pnl - self.entry_comm - comm))
+        self.fills.append((bar, -size, price))
+        self.size = 0.0
+
+
+def equity_curve(book, close, cash):
+    """Капитал на каждом баре (после исполнения ордеров бара)"""
+    n = len(close)
+    flows = np.zeros(n + 1)
+    sizes = np.zeros(n + 1)
+    for bar, size, price in book.fills:
+        flows[bar] -= size * price + abs(size) * price * book.commission
+        sizes[bar] += size
+    return cash + np.cumsum(flows[:n]) + np.cumsum(sizes[:n]) * close
+
+
+def result(book, close, cash):
+    equity = equity_curve(book, close, cash)
+    trades = np.array(book.trades, dtype=[
+        ("entry_bar", np.int64), ("exit_bar", np.int64), ("size", np.float64),
+        ("entry_price", np.float64), ("exit_price", np.float64),
+        ("pnl", np.float64), ("pnlcomm", np.float64)])
+    value = book.cash + book.size * close[-1] if len(close) else cash
+    return {"trades": trades, "fills": book.fills, "equity": equity, "value": value}
+
+
+def run_imbalance(open_, high, low, close, datetime=None, imbalance=0.7, profit=0.7, stop_loss=2.0, take_profit=1.5,
+                  cash=BROKER["cash"], stake=BROKER["stake"], commission=BROKER["commission"]):
+    """ImbalanceStrategy: шорт по сигналу, выход по stop_loss/take_profit на close
+
+    datetime - время баров по возрастанию (None - у всех баров разное).
+    Возвращает {"trades": структурированный массив сделок, "fills": список
+    исполнений (бар, объём, цена), "equity": капитал по барам,
+    "value": итоговый капитал}.
+    """
+    n = len(close)
+    book = Book(cash, stake, commission)
+    fills = fill_bars(datetime, n)
+    candidates = np.flatnonzero(imbalance_signals(high, low, close, imbalance, profit))
+
+    bar, k = 0, 0
+    while True:
+        # Без позиции: следующий сигнал, на который хватает денег (Margin иначе),
+        # вход по open бара исполнения
+        k = max(k, int(np.searchsorted(candidates, bar)))
+        while k < len(candidates) and not book.can_open(-stake, close[candidates[k]]):
+            k += 1
+        if k == len(candidates) or fills[candidates[k]] >= n:
+            break
+        entry = int(fills[candidates[k]])
+        if not book.can_open(-stake, open_[entry]):
+            bar = entry  # Денег не хватило по цене исполнения: ордер обнуляется
+            continue
+        book.open(entry, -stake, open_[entry])
+
+        # В позиции: первый close за уровнями, считая бар входа
+        entry_price = book.entry_price
+        stop = entry_price * (1 + stop_loss / 100)
+        target = entry_price * (1 - take_profit / 100)
+        hit = first_true(lambda lo, hi: (close[lo:hi] >= stop) | (close[lo:hi] <= target), entry, n)
+        if hit is None or fills[hit] >= n:
+            break
+        bar = int(fills[hit])
+        book.close(bar, open_[bar])
+
+    return result(book, close, cash)
+
+
+def run_candles(open_, high, low, close, datetime=None, ExitCandles=5,
+                cash=BROKER["cash"], stake=BROKER["stake"], commission=BROKER["commission"]):
+    """CandlesOnly: покупка после закрытия ниже предыдущего, выход через ExitCandles баров
+
+    close[-1] и close[-2] на первых барах берутся с конца ряда, как у
+    линий Backtrader при preload. Результат как у run_imbalance.
+    """
+    n = len(close)
+    book = Book(cash, stake, commission)
+    fills = fill_bars(datetime, n)
+    previous = np.roll(close, 1)
+    candidates = np.flatnonzero((close < previous) & (np.roll(close, 2) != 0))
+
+    bar, k = 0, 0
+    while True:
+        # Без позиции: сигнал, на который хватает денег (Margin иначе)
+        k = max(k, int(np.searchsorted(candidates, bar)))
+        while k < len(candidates) and not book.can_open(stake, close[candidates[k]]):
+            k += 1
+        if k == len(candidates) or fills[candidates[k]] >= n:
+            break
+        entry = int(fills[candidates[k]])
+        if not book.can_open(stake, open_[entry]):
+            bar = entry  # Денег не хватило по цене исполнения: ордер обнуляется
+            continue
+        book.open(entry, stake, open_[entry])
+
+        # len(self) - bar_executed >= ExitCandles, bar_executed = entry + 1
+        exit_signal = entry + max(ExitCandles, 1)
+        if exit_signal >= n or fills[exit_signal] >= n:
+            break
+        bar = int(fills[exit_signal])
+        book.close(bar, open_[bar])
+
+    return result(book, close, cash)
+
+
+KERNELS = {
+    "imbalance": run_imbalance,
+    "candles": run_candles,
+}
+
+
+def store_arrays(store, fromdate=None, todate=None, sessionend=86400 - 1e-5):
+    """(open, high, low, close, время) из CandleStore с отбором как у StoreData
+
+    У дневного таймфрейма (по умолчанию в скриптах) время бара - конец
+    его суток, поэтому отбор и исполнение ордеров идут по целым суткам.
+    Время - секунды от 1970-01-01, годится как аргумент datetime ядер.
+    """
+    epochs = np.asarray(store.datetime)
+    stamps = np.maximum(epochs // 86400 * 86400 + sessionend, epochs)
+    lo = 0 if fromdate is None else int(np.searchsorted(stamps, to_epoch(fromdate), side="left"))
+    hi = len(epochs) if todate is None else int(np.searchsorted(stamps, to_epoch(todate), side="right"))
+    open_, high, low, close, _ = (np.ascontiguousarray(column[lo:hi]) for column in store.ohlcv)
+    return open_, high, low, close, stamps[lo:hi]
+
+
+def backtrader_run(store, strategy, params, fromdate=None, todate=None, broker=None):
+    """Тот же прогон в Cerebro: (исполнения, сделки, капитал по барам, итог)"""
+    from backtrader import Analyzer, Cerebro
+    from events import quiet, silent_recorder
+    from run_setup import load_strategy, setup_broker
+    from store_feed import StoreData
+    from streaming_stats import EquityCurve
+
+    class Fills(Analyzer):
+        def start(self):
+            self.fills, self.trades = [], []
+
+        def notify_order(self, order):
+            if order.status == order.Completed:
+                self.fills.append((len(self.strategy) - 1, order.executed.size, order.executed.price))
+
+        def notify_trade(self, trade):
+            if trade.isclosed:
+                self.trades.append(trade.pnlcomm)
+
+    cerebro = Cerebro(stdstats=False)
+    cerebro.adddata(StoreData(dataname=store, fromdate=fromdate, todate=todate))
+    cerebro.addstrategy(load_strategy(strategy), debug=False, recorder=silent_recorder(), **params)
+    setup_broker(cerebro, broker)
+    cerebro.addanalyzer(Fills, _name="fills")
+    cerebro.addanalyzer(EquityCurve, _name="equity")
+
+    with quiet():
+        strat = cerebro.run()[0]
+    fills = strat.analyzers.fills
+    return fills.fills, fills.trades, strat.analyzers.equity.values, cerebro.broker.getvalue()
+
+
+def validate(store, strategy, params, fromdate=None, todate=None, broker=None, rtol=1e-9):
+    """Сверка ядра с Cerebro сделка в сделку, список расхождений (пустой - совпало)"""
+    broker = broker or BROKER
+    bt_fills, bt_trades, bt_equity, bt_value = backtrader_run(store, strategy, params, fromdate, todate, broker)
+    arrays = store_arrays(store, fromdate, todate)
+    fast = KERNELS[strategy](*arrays, cash=broker["cash"], stake=broker["stake"],
+                             commission=broker["commission"], **params)
+
+    problems = []
+    if len(bt_fills) != len(fast["fills"]):
+        problems.append(f"исполнений: Cerebro {len(bt_fills)}, ядро {len(fast['fills'])}")
+    for index, (expected, got) in enumerate(zip(bt_fills, fast["fills"])):
+        if expected[0] != got[0] or expected[1] != got[1] or not np.isclose(expected[2], got[2], rtol=rtol):
+            problems.append(f"исполнение #{index}: Cerebro {expected}, ядро {got}")
+            break
+    if not np.allclose(bt_trades, fast["trades"]["pnlcomm"][:len(bt_trades)], rtol=rtol) or \
+            len(bt_trades) != len(fast["trades"]):
+        problems.append(f"pnlcomm сделок не совпадает ({len(bt_trades)} / {len(fast['trades'])})")
+    if len(bt_equity) != len(fast["equity"]) or not np.allclose(bt_equity, fast["equity"], rtol=rtol):
+        problems.append("кривая капитала не совпадает")
+    if not np.isclose(bt_value, fast["value"], rtol=rtol):
+        problems.append(f"итог: Cerebro {bt_value:.6f}, ядро {fast['value']:.6f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Быстрый бэктест CandlesOnly/ImbalanceStrategy на массивах")
+    parser.add_argument("--strategy", choices=list(KERNELS), default="imbalance")
+    parser.add_argument("--data", default=None, help="CSV из TickerGrub или .bin")
+    parser.add_argument("--fromdate", default="2022-01-01")
+    parser.add_argument("--todate", default="2025-10-01")
+    parser.add_argument("--validate", action="store_true", help="Сверить с Cerebro и сравнить время")
+    parser.add_argument("--imbalance", type=float, default=0.5)
+    parser.add_argument("--profit", type=float, default=0.5)
+    parser.add_argument("--stop-loss", type=float, default=2.0)
+    parser.add_argument("--take-profit", type=float, default=1.5)
+    parser.add_argument("--exit-candles", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.strategy == "imbalance":
+        params = {"imbalance": args.imbalance, "profit": args.profit,
+                  "stop_loss": args.stop_loss, "take_profit": args.take_profit}
+    else:
+        params = {"ExitCandles": args.exit_candles}
+
+    data = abspath(args.data or ("./data/BTCUSDT_15.csv" if args.strategy == "imbalance"
+                                 else "./data/BTCUSDT_60.csv"))
+    store = ensure_store(data)
+    fromdate = datetime.fromisoformat(args.fromdate)
+    todate = datetime.fromisoformat(args.todate)
+
+    started = time.perf_counter()
+    arrays = store_arrays(store, fromdate, todate)
+    fast = KERNELS[args.strategy](*arrays, **params)
+    elapsed = time.perf_counter() - started
+    trades = fast["trades"]
+    print(f"Конечный капитал: ${fast['value']:.2f}")
+    print(f"Сделок: {len(trades)} (прибыльных {int((trades['pnlcomm'] > 0).sum())}, "
+          f"убыточных {int((trades['pnlcomm'] <= 0).sum())})")
+    print(f"⚡ Ядро: {elapsed * 1000:.1f} мс")
+
+    if args.validate:
+        started = time.perf_counter()
+        problems = validate(store, args.strategy, params, fromdate, todate)
+        reference = time.perf_counter() - started
+        print(f"🐢 Cerebro + сверка: {reference:.1f} c, ускорение x{reference / elapsed:.0f}")
+        for problem in problems:
+            print(f"❌ {problem}")
+        if not problems:
+            print("✅ Совпадает с Cerebro сделка в сделку")
+
+
+if __name__ == "__main__":
+    main()
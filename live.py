@@ -0,0 +1,241 @@
+import argparse
+import math
+import os
+import time
+from collections import deque
+from datetime import datetime
+from os.path import abspath
+
+import numpy as np
+from backtrader import Analyzer, Cerebro
+from candle_store import to_epoch
+from run_setup import setup_broker
+from store_feed import StoreData
+
+# Живой режим: новые закрытые свечи дописываются в работающий Cerebro,
+# стратегия считает сигналы только на них. Память ограничена: Cerebro
+# работает с exactbars=1, фид держит lookback последних баров.
+# python live.py data/BTCUSDT_15.csv --backfill 100
+
+
+def parse_row(line):
+    """Строка CSV из TickerGrub -> (epoch, open, high, low, close, volume)"""
+    fields = line.rstrip("\r\n").split(",")
+    epoch = to_epoch(datetime.strptime(fields[0], "%Y-%m-%d %H:%M:%S"))
+    return (epoch, *(float(value) if value else math.nan for value in fields[1:6]))
+
+
+class CsvTailSource:
+    """Новые строки CSV-файла, который дописывает TickerGrub
+
+    backfill - сколько последних свечей файла отдать при первом опросе,
+    чтобы у стратегии была история для lookback. idle_timeout - через
+    сколько секунд без новых строк считать поток законченным (None - никогда).
+    """
+
+    def __init__(self, path, backfill=0, idle_timeout=None):
+        self.path = path
+        self.backfill = backfill
+        self.idle_timeout = idle_timeout
+        self.offset = None
+        self.started = False
+        self.last_data = time.monotonic()
+        self.finished = False
+
+    def _start(self, file):
+        # Стартуем с конца файла, отступив на backfill строк
+        size = file.seek(0, os.SEEK_END)
+        if not self.backfill:
+            self.offset = size
+            return
+        block = min(size, 512 * (self.backfill + 2))
+        file.seek(size - block)
+        lines = file.read(block).splitlines(keepends=True)
+        unfinished = len(lines.pop()) if lines and not lines[-1].endswith(b"\n") else 0
+        if block < size:
+            lines = lines[1:]  # Первая строка блока может быть обрезана
+        self.offset = size - unfinished - sum(map(len, lines[-self.backfill:]))
+
+    def poll(self):
+        """Список (свеча, время готовности) для новых полных строк"""
+        with open(self.path, "rb") as file:
+            if self.offset is None:
+                self._start(file)
+            file.seek(self.offset)
+            chunk = file.read()
+
+        ready = time.perf_counter() if self.started else None  # Для backfill задержку не считаем
+        self.started = True
+        end = chunk.rfind(b"\n") + 1  # Недописанную строку оставляем на потом
+        rows = []
+        for line in chunk[:end].decode("utf-8").splitlines():
+            if line and not line.startswith("datetime"):
+                rows.append((parse_row(line), ready))
+        self.offset += end
+
+        if rows:
+            self.last_data = time.monotonic()
+        elif self.idle_timeout is not None and time.monotonic() - self.last_data > self.idle_timeout:
+            self.finished = True
+        return rows
+
+
+class FakeCandleSource:
+    """Офлайн-источник: свечи из списка, по одной каждые period секунд
+
+    Время готовности свечи - момент её "закрытия" по расписанию, так что
+    задержка считается от закрытия свечи до решения стратегии.
+    """
+
+    def __init__(self, rows, period=0.0, backfill=0):
+        self.rows = list(rows)
+        self.period = period
+        self.backfill = backfill  # Сколько первых свечей отдать сразу
+        self.position = 0
+        self.started = None
+        self.finished = not self.rows
+
+    def poll(self):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now
+        due = self.backfill + int((now - self.started) / self.period) if self.period else len(self.rows)
+        due = min(due, len(self.rows))
+
+        out = []
+        for index in range(self.position, due):
+            if index < self.backfill:
+                closed = None  # История, задержку по ней не считаем
+            else:
+                closed = self.started + (index - self.backfill + 1) * self.period if self.period else now
+            out.append((self.rows[index], closed))
+        self.position = due
+        self.finished = self.position >= len(self.rows)
+        return out
+
+
+class LiveData(StoreData):
+    """Фид, который получает закрытые свечи из источника по мере появления
+
+    Источник - объект с методом poll() (список (свеча, время готовности))
+    и атрибутом finished. Время баров считается так же, как в StoreData.
+    """
+    params = (
+        ("source", None),
+        ("lookback", 4),  # Сколько последних баров нужно стратегии
+        ("poll_interval", 0.002),  # Пауза между опросами источника, с
+    )
+
+    def islive(self):
+        return True
+
+    def haslivedata(self):
+        return bool(self._queue)
+
+    def start(self):
+        super(StoreData, self).start()
+        self._queue = deque()
+        self.ready_time = None  # Когда текущий бар стал доступен
+        self._last_epoch = None
+        self._step = 0  # Длина свечи: наименьшая разность времени из увиденных
+
+    def qbuffer(self, savemem=0, replaying=False):
+        super(LiveData, self).qbuffer(savemem, replaying)
+        self.minbuffer(self.p.lookback)
+
+    def preload(self):
+        raise RuntimeError("LiveData не поддерживает preload")
+
+    def _load(self):
+        source = self.p.source
+        if not self._queue:
+            self._queue.extend(source.poll())
+            if not self._queue:
+                if source.finished:
+                    return False
+                time.sleep(self.p.poll_interval)
+                return None  # Данных пока нет, Cerebro спросит снова
+
+        row, self.ready_time = self._queue.popleft()
+        lines = self.lines
+        lines.datetime[0] = self._datetimes(np.array(row[:1], dtype=np.int64))[0]
+        lines.open[0], lines.high[0], lines.low[0], lines.close[0], lines.volume[0] = row[1:]
+        lines.openinterest[0] = self.p.nullvalue
+        lines.gap[0] = float(self._gap(row[0]))
+        return True
+
+    def _gap(self, epoch):
+        """Пропуск или повтор перед свечой (как gap_flags, но по одной свече)"""
+        last, self._last_epoch = self._last_epoch, epoch
+        if last is None:
+            return False
+        diff = epoch - last
+        if diff > 0 and (not self._step or diff < self._step):
+            self._step = diff
+        return diff <= 0 or diff > self._step + self._step // 2
+
+
+class SignalLatency(Analyzer):
+    """Задержка от готовности бара до решения стратегии
+
+    Хранит только последние window значений, итог - перцентили в мс.
+    """
+    params = (
+        ("window", 10000),
+    )
+
+    def start(self):
+        self.latencies = deque(maxlen=self.p.window)
+        self.bars = 0
+
+    def next(self):
+        ready_time = getattr(self.data, "ready_time", None)
+        if ready_time is not None:
+            self.latencies.append(time.perf_counter() - ready_time)
+        self.bars += 1
+
+    def get_analysis(self):
+        if not self.latencies:
+            return {"bars": self.bars}
+        ms = np.array(self.latencies) * 1000
+        return {
+            "bars": self.bars,
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p99_ms": float(np.percentile(ms, 99)),
+            "max_ms": float(ms.max()),
+        }
+
+
+def run_live(source, strategy, lookback=4, broker=None, **strategy_params):
+    """Запуск стратегии на живом источнике, возвращает результат SignalLatency
+
+    broker - капитал, размер позиции и комиссия (по умолчанию BROKER).
+    """
+    cerebro = Cerebro(exactbars=1, stdstats=False)
+    cerebro.adddata(LiveData(source=source, lookback=lookback))
+    cerebro.addstrategy(strategy, **strategy_params)
+    setup_broker(cerebro, broker)
+    cerebro.addanalyzer(SignalLatency, _name="latency")
+
+    strat = cerebro.run()[0]
+    return strat.analyzers.latency.get_analysis()
+
+
+def main():
+    from strategy_imbalance import ImbalanceStrategy
+
+    parser = argparse.ArgumentParser(description="ImbalanceStrategy на дописываемом CSV")
+    parser.add_argument("csv", nargs="?", default="./data/BTCUSDT_15.csv")
+    parser.add_argument("--backfill", type=int, default=100, help="Свечей истории при старте")
+    parser.add_argument("--idle-timeout", type=float, default=None, help="Выход, если нет новых свечей, с")
+    parser.add_argument("--imbalance", type=float, default=0.5)
+    parser.add_argument("--profit", type=float, default=0.5)
+    args = parser.parse_args()
+
+    source = CsvTailSource(abspath(args.csv), backfill=args.backfill, idle_timeout=args.idle_timeout)
+    latency = run_live(source, ImbalanceStrategy, imbalance=args.imbalance, profit=args.profit, debug=False)
+    print(f"\n⏱ Задержка сигнала: {latency}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import backtrader
+from backtrader import Analyzer, Cerebro
+
+# Профиль Cerebro для длинной истории (минутки за годы), память не растёт
+# с числом баров:
+# - без preload: StoreData читает бары из файла кусками по LOAD_CHUNK,
+#   CSV читается построчно;
+# - exactbars=1: у линий остаётся только хвост, нужный индикаторам и
+#   стратегиям (атрибут lookback стратегии);
+# - без наблюдателей и графика;
+# - завершённые ордера и закрытые сделки не копятся в брокере и стратегии
+#   (ордер, отклонённый брокером на каждом втором баре, - это ~2 КБ на бар).
+# Анализаторы должны хранить состояние постоянного размера, как StreamingStats.
+#   cerebro = low_memory_cerebro()
+
+LOW_MEMORY = {"exactbars": 1, "stdstats": False}
+# ForgetFinished чистит внутренние списки Backtrader; их устройство
+# проверено на этой версии
+BACKTRADER_VERSION = "1.9.78"
+
+
+def private_state_ok(strategy):
+    """Внутренние списки стратегии и брокера устроены так, как ждёт ForgetFinished"""
+    broker = strategy.broker
+    trades = getattr(strategy, "_trades", None)
+    return (isinstance(getattr(strategy, "_orders", None), list)
+            and isinstance(trades, dict)
+            and all(isinstance(history, dict) and all(isinstance(items, list) for items in history.values())
+                    for history in trades.values())
+            and isinstance(getattr(broker, "orders", None), list)
+            and isinstance(getattr(broker, "_ocos", None), dict))
+
+
+class ForgetFinished(Analyzer):
+    """Выбрасывает завершённые ордера и закрытые сделки из истории прогона
+
+    Уведомления о них стратегия и анализаторы к этому времени уже получили.
+    Списки чистятся, когда в них набирается keep элементов. Strategy._orders -
+    только журнал копий уведомлений (Backtrader его не читает), он
+    очищается целиком. Списки внутренние (Backtrader BACKTRADER_VERSION):
+    если у другой версии или другого брокера они устроены иначе,
+    анализатор ничего не трогает.
+    """
+    params = (
+        ("keep", 64),
+    )
+
+    def start(self):
+        self.active = private_state_ok(self.strategy)
+        if not self.active:
+            print(f"⚠️ ForgetFinished выключен: внутренние списки Backtrader {backtrader.__version__} "
+                  f"устроены не так, как в {BACKTRADER_VERSION}")
+
+    def next(self):
+        if not self.active:
+            return
+        strategy = self.strategy
+        keep = self.p.keep
+        if len(strategy._orders) >= keep:
+            del strategy._orders[:]
+        broker = strategy.broker
+        if len(broker.orders) >= keep:
+            broker.orders = [order for order in broker.orders if order.alive()]
+            # BackBroker помнит OCO-группу каждого ордера: нужны только живые и их ведущие
+            ocos = broker._ocos
+            if len(ocos) >= keep:
+                refs = {order.ref for order in broker.orders}
+                refs |= {ocos[ref] for ref in refs if ref in ocos}
+                broker._ocos = {ref: ocos[ref] for ref in refs if ref in ocos}
+        for trades in strategy._trades.values():
+            for history in trades.values():
+                if len(history) >= keep:
+                    del history[:-1]  # Последняя сделка может быть открыта
+
+
+def low_memory_cerebro(**kwargs):
+    """Cerebro с профилем LOW_MEMORY"""
+    cerebro = Cerebro(**dict(LOW_MEMORY, **kwargs))
+    cerebro.addanalyzer(ForgetFinished)
+    return cerebro
@@ -1,15 +1,31 @@
-from os.path import abspath # Функция дпя работы с путями
+from os.path import abspath, exists # Функции дпя работы с путями
 from datetime import datetime # Объект дпя работы со временем
 from backtrader import Cerebro, Strategy, sizers, analyzers, OrderBase  # Компоненты
 from backtrader.feeds import GenericCSVData # Основной class дпя CSV
+from events import console_recorder # Журнал событий вместо print
+from streaming_stats import TradeStats # Итоги сделок без списков
 # import matplotlib
 # matplotlib.use('TkAgg')
 
 
+class FeedState:  # Состояние CandlesOnly по одному фиду
+    __slots__ = ("data", "bars", "order", "bar_executed", "trade_stats")
+
+    def __init__(self, data):
+        self.data = data  # Фид
+        self.bars = 0  # len(data) на прошлом шаге: пришёл ли новый бар
+        self.order = None  # Храним ордер этого фида
+        self.bar_executed = None  # Номер бара фида, на котором исполнилась покупка
+        self.trade_stats = TradeStats()  # Итоги сделок только по этому фиду
+
+
 class CandlesOnly(Strategy): #Наследуемся c1асса Strategy
     params = {
-        "ExitCandles": 5 # через сколько дней выйдем из позиции
+        "ExitCandles": 5, # через сколько дней выйдем из позиции
+        "debug": True, # Выводить смену статусов ордеров
+        "recorder": None # EventRecorder; по умолчанию вывод в консоль
     }
+    lookback = 3 # Баров истории для условия входа: close[0], close[-1], close[-2]
 
     def __init__(self):
         # Инициализация стратегии и временных рядов
@@ -21,77 +37,99 @@ class CandlesOnly(Strategy): #Наследуемся c1асса Strategy
         self.high = self.data.high  # Цены максимума
         self.low = self.data.low  # Цены минимума
         self.volume = self.data.volume  # Объёмы
-        self.order = None  # Храним ордер
-        self.bar_executed = None
-        self.win_trades = []  # Суммы прибыльных трейдов
-        self.lose_trades = []  # Суммы убыточных трейдов
+        # Фидов может быть много (портфель): ордер и вход храним по каждому
+        self.states = {data: FeedState(data) for data in self.datas}
+        self.trade_stats = TradeStats()  # Итоги прибыльных и убыточных трейдов по всем фидам
+        self.log = self.params.recorder or console_recorder(self.params.debug)  # Журнал событий
+
+    def qbuffer(self, savemem=0, replaying=False):
+        # Режим exactbars: фид хранит только lookback последних баров.
+        # Выход через ExitCandles считается по номеру бара, история для него не нужна
+        super(CandlesOnly, self).qbuffer(savemem, replaying)
+        if savemem > 0:
+            for data in self.datas:
+                data.minbuffer(self.lookback)
 
     def notify_order(self, order: OrderBase):
         # Срабатывает, когда изменяется статус ордера
-        print("Cтaтyc ордера изменился", order.status)
+        self.log.debug("Cтaтyc ордера изменился {}", order.status)
         if order.status in [order.Submitted, order.Accepted]:
             return
+        state = self.states[order.data]  # Состояние фида этого ордера
         if order.status in [order.Completed]:
             if order.isbuy():
-                print("Произошла заявка на покупку",order.executed.price)
-                print("Оплаченные комиссии",order.executed.comm)
-                self.bar_executed = len(self)
-                print("Номер свечи на которой исполнилась покупка", self.bar_executed)
+                state.bar_executed = len(order.data)
+                self.log.info("Произошла заявка на покупку {}\n"
+                              "Оплаченные комиссии {}\n"
+                              "Номер свечи на которой исполнилась покупка {}",
+                              order.executed.price, order.executed.comm, state.bar_executed)
             elif order.issell():
-                print("Произошла заявка на продажу",order.executed.price)
-                print("Оплаченные комиссии",order.executed.comm)
+                self.log.info("Произошла заявка на продажу {}\n"
+                              "Оплаченные комиссии {}",
+                              order.executed.price, order.executed.comm)
         elif order.status in [order.Cancelled, order.Margin, order.Rejected]:
-            print("order.Cancelled, order.Margin, order.Rejected")
-        self.order = None
+            self.log.warning("order.Cancelled, order.Margin, order.Rejected")
+        state.order = None
 
     def notify_trade(self, trade):
         # Срабатывает, когда произошел трейд
         #print("Произошел трейд", trade.pnl)  # Финальная сумма с трейда
         if trade.isclosed:
+            self.trade_stats.add(trade.pnlcomm)
+            self.states[trade.data].trade_stats.add(trade.pnlcomm)
             if trade.pnlcomm > 0:
-                self.win_trades.append(trade.pnlcomm)
-                print("Profit", trade.pnlcomm)
+                self.log.info("Profit {}\n", trade.pnlcomm)
             else:
-                self.lose_trades.append(trade.pnlcomm)
-                print("Loses", trade.pnlcomm)
-            print()
+                self.log.info("Loses {}\n", trade.pnlcomm)
 
     def next(self):
-        if self.order:
+        for state in self.states.values():  # Каждый фид, у которого пришёл новый бар
+            bars = len(state.data)
+            if bars != state.bars:
+                state.bars = bars
+                self.next_feed(state)
+
+    prenext = next  # Фиды начинаются в разные даты: торгуем уже начавшиеся
+
+    def next_feed(self, state):
+        # Шаг стратегии по одному фиду
+        if state.order:
             return
-        if not self.position:
-            is_buy = self.close[0] < self.close[-1] and self.close[-2]
-            #is_buy = self.close[0] < self.close[-1] and self.close[-1] < self.close[-2]
+        close = state.data.close
+        if not self.getposition(state.data):
+            is_buy = close[0] < close[-1] and close[-2]
+            #is_buy = close[0] < close[-1] and close[-1] < close[-2]
             if is_buy:
-                print("Make BUY!")
-                self.order = self.buy()
+                self.log.info("Make BUY!")
+                state.order = self.buy(data=state.data)
         else:
-            is_sell = len(self) - self.bar_executed >= self.params.ExitCandles  # ExitCandles
+            is_sell = len(state.data) - state.bar_executed >= self.params.ExitCandles  # ExitCandles
             if is_sell:
-                print("END deal")
-                self.order = self.sell()
+                self.log.info("END deal")
+                state.order = self.sell(data=state.data)
 
     def stop(self):
         # Срабатывает после завершения бэктеста
-        print("Результат бэктеста")
-        print("Конечный капитал: ", self.broker.getvalue())
-        print("Количество прибыльных сделок: ", len(self.win_trades))
-        print("Количество убыточных сделок: ", len(self.lose_trades))
-        all_trade_len = len(self.win_trades) + len(self.lose_trades)
-        try:
-            win_rate = (len(self.win_trades) / all_trade_len) * 100
-        except:
-            win_rate = 0
-        try:
-            max_win_trades = max(self.win_trades)
-            max_lose_trades = max(self.lose_trades)
-        except:
-            max_win_trades = 0
-            max_lose_trades = 0
-        print("Bceгo сделок: ", all_trade_len)
-        print("Коэффициент побед: ", win_rate)
-        print("Максимальная прибыль: ", max_win_trades)
-        print("Максимальный убыток: ", max_lose_trades)
+        self.log.flush()
+        print_results(self.broker.getvalue(), self.trade_stats)
+
+
+def print_results(value, stats):
+    # Итоги бэктеста: из stop() или по сделкам из кэша
+    print("Результат бэктеста")
+    print("Конечный капитал: ", value)
+    print("Количество прибыльных сделок: ", stats.wins)
+    print("Количество убыточных сделок: ", stats.losses)
+    if stats.wins and stats.losses:
+        max_win_trades = stats.max_win
+        max_lose_trades = stats.min_loss  # Как max() по списку убытков
+    else:
+        max_win_trades = 0
+        max_lose_trades = 0
+    print("Bceгo сделок: ", stats.count)
+    print("Коэффициент побед: ", stats.win_rate)
+    print("Максимальная прибыль: ", max_win_trades)
+    print("Максимальный убыток: ", max_lose_trades)
 
 class MyCSVData(GenericCSVData):
     # Подготовка источника свечных данных
@@ -108,19 +146,61 @@ class MyCSVData(GenericCSVData):
     }
 
 
-csv_file_path = abspath("./data/BTCUSDT_60.csv")  # Путь к источнику данных
-data = MyCSVData(
-    dataname = csv_file_path,
-    fromdate = datetime(2022, 1, 24),
-    todate = datetime(2025, 8, 2),
-    reverse = False)
-# Подключение источника данных, аналитика и запуск бэктеста
-cerebro = Cerebro()  # Создаём объект Церебро. Мозг Бэктрейдера
-cerebro.adddata(data)  # Добавляем поток данных. Хранится в self.data
-cerebro.addstrategy(CandlesOnly)  # Добавляем стратегию CandlesOnly
-cerebro.broker.setcash(10000)  # стартовый баланс
-cerebro.addsizer(sizers.FixedSize, stake=0.1)  # Размер позиции
-cerebro.broker.setcommission(commission=0.0018)  # Комиссия брокера
-cerebro.run()  # Запускаем бэктест
-cerebro.plot(style="candle")  # Рисуем свечной график
-cerebro.plot()
\ No newline at end of file
+if __name__ == "__main__":  # Стратегию можно импортировать без запуска бэктеста
+    import argparse
+    from store_feed import open_feed  # Бинарный файл свечей вместо CSV (NumPy - только здесь)
+    parser = argparse.ArgumentParser(description="Бэктест CandlesOnly")
+    parser.add_argument("--low-memory", action="store_true",  # Для минуток за годы
+                        help="Память не растёт с числом баров, без графика")
+    parser.add_argument("--plot", metavar="FILE", default=None,  # Быстро и без окна
+                        help="График в файл (.png, .svg, .html) вместо cerebro.plot()")
+    parser.add_argument("--cache", action="store_true",  # Повторный прогон - мгновенно
+                        help="Итоги из кэша result_cache.py, если такой прогон уже был")
+    args = parser.parse_args()
+
+    csv_file_path = abspath("./data/BTCUSDT_60.csv")  # Путь к источнику данных
+    if exists(csv_file_path):
+        data = open_feed(  # MyCSVData или StoreData, если есть свежий .bin
+            csv_file_path, MyCSVData,
+            fromdate = datetime(2022, 1, 24),
+            todate = datetime(2025, 8, 2),
+            reverse = False)
+    else:
+        # Отдельного файла нет: часовые свечи собираются из 15-минутных (с кэшем)
+        from resample import resampled_feed  # Импорт только когда нужен: быстрее старт
+        data = resampled_feed(
+            abspath("./data/BTCUSDT_15.csv"), "60",
+            fromdate = datetime(2022, 1, 24),
+            todate = datetime(2025, 8, 2))
+    # Подключение источника данных, аналитика и запуск бэктеста
+    # Создаём объект Церебро. Мозг Бэктрейдера
+    if args.low_memory:  # Длинная история без роста памяти
+        from low_memory import low_memory_cerebro
+        cerebro = low_memory_cerebro()
+    else:
+        cerebro = Cerebro()
+    cerebro.adddata(data)  # Добавляем поток данных. Хранится в self.data
+    cerebro.addstrategy(CandlesOnly)  # Добавляем стратегию CandlesOnly
+    cerebro.broker.setcash(10000)  # стартовый баланс
+    cerebro.addsizer(sizers.FixedSize, stake=0.1)  # Размер позиции
+    cerebro.broker.setcommission(commission=0.0018)  # Комиссия брокера
+    if args.cache:
+        from result_cache import ResultCache
+        strat = ResultCache().run(cerebro)[0]  # Бэктест или его итоги из кэша
+    else:
+        strat = cerebro.run()[0]  # Запускаем бэктест
+    if getattr(strat, "cached", False):  # stop() не вызывался: итоги по сделкам из кэша
+        stats = TradeStats()
+        for trade in strat.trades:
+            stats.add(trade["pnlcomm"])
+        print("Результат из кэша, прогон от", strat.meta["created"])
+        print_results(strat.value, stats)
+        print("График не строится по результату из кэша")
+    elif args.low_memory:  # В режиме --low-memory истории для графика нет
+        print("График не строится в режиме --low-memory")
+    elif args.plot:  # Свечи сжаты до ширины картинки, только сделки и капитал
+        from fastplot import fast_plot
+        print("График сохранён в", fast_plot(strat, args.plot))
+    else:
+        cerebro.plot(style="candle")  # Рисуем свечной график
+        cerebro.plot()
\ No newline at end of file
@@ -0,0 +1,210 @@
+import argparse
+import time
+from ast import literal_eval
+from datetime import datetime
+from os.path import abspath, basename, splitext
+
+import numpy as np
+from backtrader import Cerebro
+from backtrader.linebuffer import LineBuffer
+from candle_store import ensure_store
+from events import quiet, silent_recorder
+from run_setup import BROKER, STRATEGIES, load_strategy, setup_broker
+from store_feed import StoreData
+from streaming_stats import StreamingStats
+
+# Портфель: одна стратегия на многих фидах в одном Cerebro (один брокер,
+# одни анализаторы) вместо отдельного процесса на каждую пару. Шкала
+# времени - объединение времён всех фидов - строится один раз после
+# preload; на каждом шаге продвигаются только фиды, у которых есть бар,
+# без опроса всех фидов, как в Cerebro._runonce (ClockFeed).
+# python portfolio.py data/BTCUSDT_15.csv data/ETHUSDT_15.csv --strategy imbalance
+
+
+class SharedClock:
+    """Общая шкала времени фидов, загруженных целиком (preload)
+
+    datetimes - время каждого шага (числа Backtrader), advancing[i] -
+    фиды, у которых на шаге i есть бар. Повторы времени внутри фида
+    идут отдельными шагами, как в Cerebro._runonce.
+    """
+
+    def __init__(self, datas):
+        times, ranks, feeds = [], [], []
+        for number, data in enumerate(datas):
+            dts = np.frombuffer(data.datetime.array, dtype=np.float64)[:data.buflen()]
+            times.append(dts)
+            ranks.append(np.arange(len(dts)) - np.searchsorted(dts, dts))  # Номер повтора времени
+            feeds.append(np.full(len(dts), number))
+        dts, rank, feed = np.concatenate(times), np.concatenate(ranks), np.concatenate(feeds)
+
+        order = np.lexsort((feed, rank, dts))
+        dts, rank, feed = dts[order], rank[order], feed[order]
+        new = np.ones(len(dts), dtype=bool)
+        new[1:] = (dts[1:] != dts[:-1]) | (rank[1:] != rank[:-1])
+        step = np.cumsum(new) - 1
+        present = np.zeros((int(new.sum()), len(datas)), dtype=bool)
+        present[step, feed] = True
+
+        self.datetimes = dts[new].tolist()
+        self.present = present  # Шаг x фид: есть ли бар
+        # Одинаковые наборы фидов (обычно "все") - один и тот же кортеж
+        datas = tuple(datas)
+        sets = {}
+        self.advancing = []
+        for row in present:
+            key = row.tobytes()
+            if key not in sets:
+                sets[key] = tuple(data for data, has in zip(datas, row) if has)
+            self.advancing.append(sets[key])
+
+    def __len__(self):
+        return len(self.datetimes)
+
+    @staticmethod
+    def applies(datas):
+        """Шкала годится: фиды в памяти целиком и время в них не убывает"""
+        for data in datas:
+            if data.datetime.mode != LineBuffer.UnBounded:
+                return False
+            dts = np.frombuffer(data.datetime.array, dtype=np.float64)[:data.buflen()]
+            if len(dts) > 1 and (np.diff(dts) < 0).any():
+                return False
+        return True
+
+
+class ClockFeed:
+    """Один фид вместо всех для Cerebro._runonce: шаг SharedClock
+
+    Cerebro._runonce на каждом шаге спрашивает у всех фидов время
+    следующего бара (advance_peek) и продвигает те, у кого оно меньше
+    всех. ClockFeed отвечает за всех сразу временем шага и продвигает
+    только фиды шага.
+    """
+    _timeframe = _compression = 0  # Для сортировки фидов в _runonce
+
+    def __init__(self, clock):
+        self.steps = zip(clock.datetimes, clock.advancing)
+        self.step = next(self.steps, None)
+
+    def advance_peek(self):
+        return self.step[0] if self.step else float("inf")
+
+    def advance(self):
+        for data in self.step[1]:
+            data.advance()
+        self.step = next(self.steps, None)
+
+
+class PortfolioCerebro(Cerebro):
+    """Cerebro, который в режиме runonce идёт по SharedClock
+
+    Цикл прогона - Cerebro._runonce Backtrader 1.9.78 как есть: на время
+    прогона фиды в нём заменяются одним ClockFeed. С writers (им нужны
+    сами фиды) и фидами, для которых шкала не годится, - обычный прогон.
+    """
+
+    def _runonce(self, runstrats):
+        if self.runwriters or not SharedClock.applies(self.datas):
+            return super(PortfolioCerebro, self)._runonce(runstrats)
+
+        self.shared_clock = SharedClock(self.datas)
+        datas, self.datas = self.datas, [ClockFeed(self.shared_clock)]
+        try:
+            return super(PortfolioCerebro, self)._runonce(runstrats)
+        finally:
+            self.datas = datas
+
+
+def symbol_of(path):
+    """Имя фида по файлу: data/ETHUSDT_15.csv -> ETHUSDT_15"""
+    return splitext(basename(path))[0]
+
+
+def open_stores(paths):
+    """CandleStore по каждому файлу; CSV один раз конвертируются в .bin"""
+    return [ensure_store(path) for path in paths]
+
+
+def run_portfolio(paths, strategy="imbalance", params=None, fromdate=None, todate=None, broker=None,
+                  cerebro_class=PortfolioCerebro):
+    """Одна стратегия на всех фидах paths в одном Cerebro
+
+    Стартовый капитал - broker["cash"] на каждый фид, размер позиции -
+    broker["stake"] в каждом фиде. Возвращает итоги по фидам и по портфелю.
+    """
+    broker = broker or BROKER
+    strategy_class, fixed = load_strategy(strategy), STRATEGIES[strategy][2]
+    stores = open_stores(paths)
+
+    cerebro = cerebro_class(stdstats=False)  # BuySell - по наблюдателю на фид, для графика
+    for path, store in zip(paths, stores):
+        cerebro.adddata(StoreData(dataname=store, fromdate=fromdate, todate=todate), name=symbol_of(path))
+    cerebro.addstrategy(strategy_class, debug=False, recorder=silent_recorder(), **dict(fixed, **(params or {})))
+    setup_broker(cerebro, dict(broker, cash=broker["cash"] * len(paths)))
+    cerebro.addanalyzer(StreamingStats, _name="stats")
+
+    started = time.perf_counter()
+    with quiet():  # Итоги stop() стратегии - по всем фидам сразу
+        strat = cerebro.run()[0]
+    elapsed = time.perf_counter() - started
+
+    feeds = []
+    for data, state in strat.states.items():
+        stats = state.trade_stats
+        feeds.append(dict(
+            symbol=data._name,
+            bars=len(data),
+            trades=stats.count,
+            wins=stats.wins,
+            net_profit=stats.total_profit + stats.total_loss,
+        ))
+    return {
+        "feeds": feeds,
+        "summary": strat.analyzers.stats.get_analysis(),
+        "steps": len(strat),
+        "bars": sum(feed["bars"] for feed in feeds),
+        "elapsed": elapsed,
+    }
+
+
+def print_report(report):
+    """Таблица по фидам и итог портфеля"""
+    print(f"{'Фид':<16}{'Баров':>9}{'Сделок':>8}{'Прибыльных':>12}{'Чистая прибыль':>16}")
+    for feed in report["feeds"]:
+        print(f"{feed['symbol']:<16}{feed['bars']:>9}{feed['trades']:>8}{feed['wins']:>12}"
+              f"{feed['net_profit']:>16.2f}")
+
+    s = report["summary"]
+    sharpe = f"{s.sharpe:.2f}" if s.sharpe is not None else "N/A"
+    print(f"\n📈 ПОРТФЕЛЬ ({len(report['feeds'])} фидов):")
+    print(f"Капитал: {s.value:.2f}")
+    print(f"Sharpe: {sharpe}")
+    print(f"Макс. просадка: {s.max_drawdown:.2f}%")
+    print(f"Сделок: {s.trades} (прибыльных {s.won}, убыточных {s.lost})")
+    print(f"\n⚡ {report['bars']} баров ({report['steps']} шагов общей шкалы) за {report['elapsed']:.1f} c, "
+          f"{report['bars'] / report['elapsed']:.0f} баров/с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Одна стратегия на многих фидах в одном Cerebro")
+    parser.add_argument("data", nargs="+", help="CSV из TickerGrub или .bin, по файлу на пару")
+    parser.add_argument("--strategy", choices=list(STRATEGIES), default="imbalance")
+    parser.add_argument("--fromdate", default=None)
+    parser.add_argument("--todate", default=None)
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                        help="Параметр стратегии, например --param imbalance=0.3")
+    args = parser.parse_args()
+
+    params = {}
+    for item in args.param:
+        name, value = item.split("=", 1)
+        params[name] = literal_eval(value)
+    report = run_portfolio([abspath(path) for path in args.data], args.strategy, params,
+                           fromdate=datetime.fromisoformat(args.fromdate) if args.fromdate else None,
+                           todate=datetime.fromisoformat(args.todate) if args.todate else None)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()
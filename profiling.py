@@ -0,0 +1,189 @@
+import json
+import platform
+import resource
+import sys
+import time
+from array import array
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+import backtrader
+import numpy as np
+
+# Профилирование прогона Cerebro по фазам: на время run() методы фидов,
+# брокера, стратегий и анализаторов оборачиваются таймерами, после -
+# возвращаются на место. Время каждой фазы считается без вложенных фаз
+# (next без find_bear_imbalance и т.д.), сумма фаз равна общему времени.
+#
+#   profiler = RunProfiler(cerebro)
+#   results = profiler.run()
+#   with profiler.phase("plot"):
+#       cerebro.plot()
+#   profiler.dump("profile.json")
+
+# Фаза -> методы стратегии
+STRATEGY_PHASES = {
+    "lines": ("_next", "_oncepost", "_once"),  # Линии и индикаторы стратегии
+    "next": ("prenext", "nextstart", "next"),
+    "notify_order": ("notify_order",),
+    "notify_trade": ("notify_trade",),
+    "observers": ("_next_observers",),
+}
+# Методы анализаторов, через которые их вызывает стратегия
+ANALYZER_METHODS = ("_start", "_stop", "_prenext", "_nextstart", "_next",
+                    "_notify_order", "_notify_trade", "_notify_cashvalue", "_notify_fund")
+# Отдельные фазы для собственных методов стратегий, если они есть
+EXTRA_METHODS = ("find_bear_imbalance",)
+
+
+def peak_rss_mb():
+    """Пиковая память процесса, МБ"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class RunProfiler:
+    """Время и число вызовов по фазам одного прогона Cerebro"""
+
+    def __init__(self, cerebro, extra_methods=EXTRA_METHODS):
+        self.cerebro = cerebro
+        self.extra_methods = extra_methods
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.stack = ["other"]  # Текущая фаза - последняя
+        self.mark = None
+        self.bar_times = array("d")  # Время между началами соседних баров
+        self.last_bar = None
+        self.patches = []  # (объект, имя, было ли в __dict__, прежнее значение)
+        self.memory = {}
+
+    def _enter(self, phase):
+        now = time.perf_counter()
+        self.seconds[self.stack[-1]] += now - self.mark
+        self.mark = now
+        self.stack.append(phase)
+        self.calls[phase] += 1
+
+    def _exit(self):
+        now = time.perf_counter()
+        self.seconds[self.stack.pop()] += now - self.mark
+        self.mark = now
+
+    def _wrap(self, phase, func, per_bar=False):
+        profiler = self
+
+        def wrapper(*args, **kwargs):
+            profiler._enter(phase)
+            if per_bar:
+                if profiler.last_bar is not None:
+                    profiler.bar_times.append(profiler.mark - profiler.last_bar)
+                profiler.last_bar = profiler.mark
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler._exit()
+        return wrapper
+
+    def _patch(self, target, name, phase, per_bar=False):
+        """Обернуть target.name (класс или объект), если ещё не обёрнут"""
+        if any(t is target and n == name for t, n, _, _ in self.patches) or not hasattr(target, name):
+            return
+        own = name in vars(target)
+        original = vars(target)[name] if own else None
+        self.patches.append((target, name, own, original))
+        setattr(target, name, self._wrap(phase, getattr(target, name), per_bar))
+
+    def _restore(self):
+        for target, name, own, original in reversed(self.patches):
+            if own:
+                setattr(target, name, original)
+            else:
+                delattr(target, name)
+        self.patches = []
+
+    def _install(self):
+        cerebro = self.cerebro
+        for data in cerebro.datas:
+            self._patch(data, "preload", "data_load")
+            self._patch(data, "load", "data_load")
+        self._patch(cerebro.broker, "next", "broker")
+
+        for entry in cerebro.strats:  # addstrategy добавляет список [(класс, args, kwargs)]
+            for strategy, _, _ in entry:
+                for phase, names in STRATEGY_PHASES.items():
+                    for name in names:
+                        self._patch(strategy, name, phase, per_bar=name in ("_next", "_oncepost"))
+                for name in self.extra_methods:
+                    self._patch(strategy, name, name)
+
+        for analyzer, _, _ in cerebro.analyzers:
+            for name in ANALYZER_METHODS:
+                self._patch(analyzer, name, "analyzers")
+
+    @contextmanager
+    def phase(self, name):
+        """Отдельная фаза вне run(), например построение графика"""
+        if not self.stack[1:]:
+            self.mark = time.perf_counter()  # Время между фазами не считаем
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def run(self, **kwargs):
+        """cerebro.run(**kwargs) под профилировщиком"""
+        self.memory["rss_before_mb"] = peak_rss_mb()
+        self._install()
+        try:
+            with self.phase("run"):
+                return self.cerebro.run(**kwargs)
+        finally:
+            self._restore()
+            self.memory["peak_rss_mb"] = peak_rss_mb()
+
+    def report(self):
+        """Итог в виде словаря, пригодного для JSON"""
+        seconds = dict(self.seconds)
+        # Собственное время run - цикл Cerebro, не попавший в другие фазы
+        seconds["other"] = seconds.get("other", 0.0) + seconds.pop("run", 0.0)
+        phases = {name: {"seconds": round(seconds[name], 6), "calls": self.calls[name]}
+                  for name in sorted(seconds, key=seconds.get, reverse=True)}
+
+        bars = {"count": len(self.bar_times) + (self.last_bar is not None)}
+        if self.bar_times:
+            us = np.frombuffer(self.bar_times, dtype=np.float64) * 1e6
+            p50, p90, p99 = np.percentile(us, [50, 90, 99])
+            bars.update(p50_us=round(float(p50), 2), p90_us=round(float(p90), 2),
+                        p99_us=round(float(p99), 2), max_us=round(float(us.max()), 2))
+
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "argv": sys.argv,
+            "python": platform.python_version(),
+            "backtrader": backtrader.__version__,
+            "total_seconds": round(sum(seconds.values()), 6),
+            "phases": phases,
+            "bars": bars,
+            "memory": {name: round(value, 1) for name, value in self.memory.items()},
+        }
+
+    def dump(self, path):
+        """Дописать отчёт строкой JSON в файл: история для сравнения прогонов"""
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(self.report(), ensure_ascii=False) + "\n")
+
+
+def print_report(report):
+    """Таблица фаз для консоли"""
+    total = report["total_seconds"] or 1
+    print(f"\n⏱ ПРОФИЛЬ ПРОГОНА ({report['total_seconds']:.2f} c):")
+    for name, phase in report["phases"].items():
+        print(f"{name:<22}{phase['seconds']:>9.3f} c {phase['seconds'] / total * 100:>6.1f}% "
+              f"{phase['calls']:>10} вызовов")
+    bars = report["bars"]
+    if "p50_us" in bars:
+        print(f"Бар: p50 {bars['p50_us']:.0f} мкс, p90 {bars['p90_us']:.0f} мкс, "
+              f"p99 {bars['p99_us']:.0f} мкс, max {bars['max_us']:.0f} мкс ({bars['count']} баров)")
+    print(f"Пиковая память: {report['memory']['peak_rss_mb']:.1f} МБ")
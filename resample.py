@@ -0,0 +1,97 @@
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+from cache_utils import evict_lru, file_hash
+from candle_store import STORE_EXT, ensure_store, write_store
+from data.candle_index import INTERVAL_SECONDS, local_to_utc, utc_to_local
+from store_feed import StoreData
+
+# Старшие таймфреймы из одного файла с самым мелким интервалом.
+# Свечи агрегируются NumPy (reduceat) и кэшируются на диске как файлы
+# candle_store, ключ - хэш исходного файла, часовой пояс и интервал. Кэш ограничен по
+# размеру: при переполнении удаляются давно не использованные файлы.
+# Интервалы режутся по UTC, как свечи Bybit, а время баров - местное,
+# как в CSV из TickerGrub.
+
+CACHE_DIR = "./data/cache"
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# Недели у Bybit начинаются с понедельника, а 1970-01-01 - четверг
+WEEK_ORIGIN = 4 * 86400
+
+
+def timezone_key():
+    """Короткий хэш местного часового пояса: от него зависят границы баров в кэше"""
+    zone = repr((time.tzname, time.timezone, time.altzone, os.environ.get("TZ")))
+    return hashlib.sha1(zone.encode("utf-8")).hexdigest()[:8]
+
+
+def aggregate(epochs, ohlcv, interval):
+    """Свечи -> свечи интервала interval (время бара - начало интервала)
+
+    epochs - местное время "как в CSV" по возрастанию. Границы интервалов
+    считаются по UTC, как у Bybit: в Москве дневной бар начинается
+    в 03:00, а в сутки перевода часов бары не становятся короче или
+    длиннее. Неполные интервалы на краях сохраняются как есть.
+    """
+    seconds = INTERVAL_SECONDS[interval]
+    origin = WEEK_ORIGIN if interval == "W" else 0
+    epochs = np.asarray(epochs)
+    if not len(epochs):
+        return np.empty(0, np.int64), np.empty((5, 0))
+
+    buckets = (local_to_utc(epochs) - origin) // seconds
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+    ends = np.concatenate((starts[1:], [len(epochs)]))
+
+    open_, high, low, close, volume = np.asarray(ohlcv)
+    result = np.array([
+        open_[starts],
+        np.maximum.reduceat(high, starts),
+        np.minimum.reduceat(low, starts),
+        close[ends - 1],
+        np.add.reduceat(volume, starts),
+    ])
+    return utc_to_local(buckets[starts] * seconds + origin), result
+
+
+def resampled_store(source, interval, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """Путь к файлу candle_store со свечами interval, собранными из source
+
+    source - CSV из TickerGrub или .bin с самым мелким интервалом.
+    """
+    if interval not in INTERVAL_SECONDS:
+        raise ValueError(f"Неизвестный интервал {interval!r}, доступны: {', '.join(INTERVAL_SECONDS)}")
+
+    store = ensure_store(source)
+    source = store.path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    cached = os.path.join(cache_dir, f"{file_hash(source)[:16]}_{timezone_key()}_{interval}{STORE_EXT}")
+    if os.path.exists(cached):
+        os.utime(cached)  # Отметка для LRU
+        return cached
+
+    if len(store) > 1:
+        step = int(np.median(np.diff(store.datetime[:1000])))
+        if step >= INTERVAL_SECONDS[interval]:
+            raise ValueError(f"Интервал {interval!r} не крупнее исходного ({step} с)")
+
+    epochs, ohlcv = aggregate(store.datetime, store.ohlcv, interval)
+    write_store(cached, epochs, ohlcv)
+    evict_lru(cache_dir, max_bytes, keep=(cached,))
+    return cached
+
+
+def resampled_feed(source, interval, cache_dir=CACHE_DIR, **kwargs):
+    """StoreData со свечами interval - замена MyCSVData для стратегий"""
+    return StoreData(dataname=resampled_store(source, interval, cache_dir), **kwargs)
+
+
+if __name__ == "__main__":
+    # python resample.py data/BTCUSDT_15.csv 60 240 D
+    for target in sys.argv[2:]:
+        print(f"✅ {target}: {resampled_store(sys.argv[1], target)}")
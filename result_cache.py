@@ -0,0 +1,442 @@
+import argparse
+import ast
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, time as dtime
+from types import SimpleNamespace
+
+import backtrader
+import numpy as np
+from backtrader import Analyzer
+from backtrader.utils import AutoOrderedDict
+from cache_utils import evict_lru, file_hash
+from candle_store import CandleStore, to_epoch
+from data.candle_index import ensure_index
+
+# Кэш итогов бэктестов на диске. Ключ - всё, от чего зависит результат:
+# хэш свечей, которые прочитает фид (только строки периода, дописанные
+# в CSV свечи ключ не меняют), исходный код модулей проекта, где
+# определены стратегия, анализаторы, сайзеры и фиды, и модулей, которые
+# они импортируют, параметры стратегии, настройки брокера, сайзера и
+# список анализаторов. В кэше -
+# итоги анализаторов, список закрытых сделок и report_state() стратегии
+# (счётчики для отчёта stop(), если метод есть). Размер ограничен, лишнее
+# удаляется по LRU (cache_utils.py).
+#   cache = ResultCache()
+#   strat = cache.run(cerebro)[0]  # Вместо cerebro.run()
+#   strat.analyzers.stats.get_analysis()
+# python result_cache.py --list | --clear | --invalidate ImbalanceStrategy
+
+RESULTS_DIR = "./data/cache/results"
+RESULTS_MAX_BYTES = 64 * 1024 * 1024
+CACHE_VERSION = 2  # Увеличить, если меняется формат записей или общий код прогона
+# Параметры стратегий, не влияющие на результат: vectorized даёт те же
+# сделки и счётчики условий, что и проверка по барам
+IGNORED_PARAMS = ("debug", "recorder", "vectorized")
+CEREBRO_PARAMS = ("cheat_on_open", "broker_coo", "quicknotify", "tradehistory")
+DATA_MARGIN = 86400  # Запас в сутки вокруг периода, как у StoreData и IndexedCSVData
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_fingerprints = {}  # (путь, размер, mtime, период) -> хэш
+_imports = {}  # (путь, mtime) -> файлы модулей проекта, которые он импортирует
+
+
+class ClosedTrades(Analyzer):
+    """Список закрытых сделок для записи в кэш"""
+
+    def start(self):
+        self.trades = []
+
+    def notify_trade(self, trade):
+        if trade.isclosed:
+            self.trades.append({
+                "data": trade.data._name,
+                "long": bool(trade.long),
+                "opened": trade.open_datetime().isoformat(),
+                "closed": trade.close_datetime().isoformat(),
+                "price": trade.price,
+                "barlen": trade.barlen,
+                "pnl": trade.pnl,
+                "pnlcomm": trade.pnlcomm,
+                "commission": trade.commission,
+            })
+
+    def get_analysis(self):
+        return self.trades
+
+
+class StoredAnalyzer:
+    """Анализатор из кэша: только get_analysis()"""
+
+    def __init__(self, analysis):
+        self.analysis = analysis
+
+    def get_analysis(self):
+        return self.analysis
+
+
+class CachedResult:
+    """Итоги прогона из кэша вместо стратегии из cerebro.run()
+
+    Анализаторы читаются так же: strat.analyzers.stats.get_analysis().
+    """
+    cached = True
+
+    def __init__(self, record):
+        self.analyzers = SimpleNamespace(**{name: StoredAnalyzer(from_plain(analysis))
+                                            for name, analysis in record["analyzers"].items()})
+        self.trades = record["analyzers"]["closed_trades"]
+        self.value = record["value"]
+        self.cash = record["cash"]
+        self.state = record["state"]  # report_state() стратегии или None
+        self.meta = record["meta"]
+
+
+def to_plain(value):
+    """Итоги анализатора -> JSON: NamedTuple помечается классом, ключи-даты - строки"""
+    if hasattr(value, "_asdict"):
+        cls = type(value)
+        return {"__namedtuple__": f"{cls.__module__}:{cls.__qualname__}",
+                **{name: to_plain(item) for name, item in value._asdict().items()}}
+    if isinstance(value, dict):
+        return {(key.isoformat() if isinstance(key, (date, dtime)) else str(key)): to_plain(item)
+                for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    if isinstance(value, (date, dtime)):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)
+
+
+def from_plain(value):
+    """Обратно к to_plain: NamedTuple - своим классом, словари - AutoOrderedDict"""
+    if isinstance(value, dict):
+        if "__namedtuple__" in value:
+            module, name = value["__namedtuple__"].split(":")
+            cls = getattr(importlib.import_module(module), name)
+            return cls(**{key: from_plain(item) for key, item in value.items() if key != "__namedtuple__"})
+        result = AutoOrderedDict()
+        for key, item in value.items():
+            result[key] = from_plain(item)
+        return result
+    if isinstance(value, list):
+        return [from_plain(item) for item in value]
+    return value
+
+
+def simple_params(params, skip=()):
+    """Параметры Backtrader, которые можно положить в ключ (объекты - по имени класса)"""
+    result = {}
+    for name, value in params.items():
+        if name in skip:
+            continue
+        if isinstance(value, (datetime, date, dtime)):
+            value = value.isoformat()
+        elif not (value is None or isinstance(value, (bool, int, float, str))):
+            value = type(value).__name__
+        result[name] = value
+    return result
+
+
+def project_file(obj):
+    """Файл модуля проекта, где определён obj (или самого obj, если это модуль), иначе None
+
+    Backtrader, NumPy и стандартная библиотека в ключ не попадают: их
+    версия меняется вместе с окружением, а не с правками в проекте.
+    """
+    module = obj if inspect.ismodule(obj) else sys.modules.get(getattr(obj, "__module__", None) or "")
+    path = getattr(module, "__file__", None)
+    if not path or not path.endswith(".py"):
+        return None
+    path = os.path.abspath(path)
+    if not path.startswith(PROJECT_DIR + os.sep) or "site-packages" in path:
+        return None
+    return path
+
+
+def module_file(name, root=PROJECT_DIR):
+    """Файл модуля name (data.candle_index) внутри root или None"""
+    base = os.path.join(root, *name.split("."))
+    for path in (base + ".py", os.path.join(base, "__init__.py")):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def project_imports(path):
+    """Файлы модулей проекта, которые импортирует файл path
+
+    По тексту модуля, а не по его глобальным именам: импорты внутри
+    функций и в блоке __main__ тоже учитываются, а скрипт и тот же модуль,
+    импортированный из перебора, дают одни и те же зависимости.
+    """
+    key = (path, os.stat(path).st_mtime_ns)
+    if key not in _imports:
+        with open(path, encoding="utf-8") as file:
+            tree = ast.parse(file.read(), path)
+        files = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names, root = [alias.name for alias in node.names], PROJECT_DIR
+            elif isinstance(node, ast.ImportFrom):
+                root = PROJECT_DIR
+                if node.level:  # from .candle_index import ...: от папки пакета
+                    root = os.path.dirname(path)
+                    for _ in range(node.level - 1):
+                        root = os.path.dirname(root)
+                prefix = f"{node.module}." if node.module else ""
+                names = ([node.module] if node.module else []) + [prefix + alias.name for alias in node.names]
+            else:
+                continue
+            files.update(filter(None, (module_file(name, root) for name in names)))
+        _imports[key] = sorted(files)
+    return _imports[key]
+
+
+def source_hash(classes):
+    """SHA-1 исходного кода модулей проекта, от которых зависит прогон
+
+    Модули, где определены classes и их базовые классы, и все модули
+    проекта, которые они импортируют, прямо или через другие модули
+    проекта (TradeStats, find_bear_imbalance, events и т. п.). Любая
+    правка в них меняет ключ.
+    """
+    files = set()
+    pending = list(filter(None, (project_file(base) for cls in classes for base in cls.__mro__)))
+    while pending:
+        path = pending.pop()
+        if path not in files:
+            files.add(path)
+            pending.extend(project_imports(path))
+
+    digest = hashlib.sha1()
+    for path in sorted(files):  # Имя модуля не важно: __main__ или импорт - один ключ
+        digest.update(file_hash(path).encode("ascii"))
+    return digest.hexdigest()
+
+
+def data_file(data):
+    """Файл свечей фида (CSV или .bin) или None"""
+    dataname = data.p.dataname
+    path = dataname.path if isinstance(dataname, CandleStore) else dataname
+    return path if isinstance(path, str) and os.path.exists(path) else None
+
+
+def data_fingerprint(data):
+    """Хэш свечей периода, которые прочитает фид, или None, если фид не из файла"""
+    dataname = data.p.dataname
+    path = data_file(data)
+    if path is None:
+        return None
+
+    start = to_epoch(data.p.fromdate) - DATA_MARGIN if data.p.fromdate else None
+    end = to_epoch(data.p.todate) + DATA_MARGIN if data.p.todate else None
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, start, end)
+    if key not in _fingerprints:
+        digest = hashlib.sha1()
+        if isinstance(dataname, CandleStore) or path.endswith(".bin"):
+            store = dataname if isinstance(dataname, CandleStore) else CandleStore(path)
+            lo, hi = store.bounds(start, end)
+            lo = max(lo - 1, 0)  # Линия gap первого бара зависит от предыдущей строки
+            digest.update(np.ascontiguousarray(store.datetime[lo:hi]).tobytes())
+            for column in store.ohlcv:
+                digest.update(np.ascontiguousarray(column[lo:hi]).tobytes())
+        elif hasattr(data.p, "index"):  # IndexedCSVData: байты строк периода
+            index = data.p.index or ensure_index(path)
+            row = index.row_at(start) if start is not None else 0
+            begin = int(index.offsets[max(row - 1, 0)]) if len(index) else 0
+            stop = index.offset_at(end + 1) if end is not None else index.csv_size
+            with open(path, "rb") as file:
+                file.seek(begin)
+                digest.update(file.read(stop - begin))
+        else:
+            digest.update(file_hash(path).encode("ascii"))  # CSV без индекса: файл целиком
+        _fingerprints[key] = digest.hexdigest()
+    return _fingerprints[key]
+
+
+def run_spec(cerebro):
+    """Всё, от чего зависит результат прогона, или None, если прогон не кэшируется"""
+    if len(cerebro.strats) != 1 or len(cerebro.strats[0]) != 1 or not cerebro.datas:
+        return None  # optstrategy и несколько стратегий не кэшируются
+    datas = []
+    for data in cerebro.datas:
+        fingerprint = data_fingerprint(data)
+        if fingerprint is None:
+            return None
+        datas.append({"class": type(data).__name__, "name": data._name, "candles": fingerprint,
+                      "params": simple_params(data.p._getkwargs(), skip=("dataname", "index"))})
+
+    strategy, args, kwargs = cerebro.strats[0][0]
+    params = dict(strategy.params._getpairs(), **kwargs)
+    broker = cerebro.broker
+    return {
+        "version": CACHE_VERSION,
+        "backtrader": backtrader.__version__,
+        "datas": datas,
+        "strategy": strategy.__name__,
+        "source": source_hash([strategy, *(type(data) for data in cerebro.datas),
+                               *(cls for cls, _, _ in cerebro.sizers.values()),
+                               *(cls for cls, _, _ in cerebro.analyzers)]),
+        "args": list(args),
+        "params": simple_params(params, skip=IGNORED_PARAMS),
+        "cash": broker.startingcash,
+        "broker": simple_params(broker.p._getkwargs(), skip=("commission", "cash")),
+        "commission": {str(name): simple_params(info.p._getkwargs()) for name, info in broker.comminfo.items()},
+        "sizers": {str(idx): [cls.__name__, list(args), simple_params(kwargs)]
+                   for idx, (cls, args, kwargs) in cerebro.sizers.items()},
+        "analyzers": [[cls.__name__, list(args), simple_params(kwargs)] for cls, args, kwargs in cerebro.analyzers],
+        "cerebro": {name: cerebro.p._get(name) for name in CEREBRO_PARAMS},
+    }
+
+
+class ResultCache:
+    """Итоги бэктестов в cache_dir: файл JSON на прогон"""
+
+    def __init__(self, cache_dir=RESULTS_DIR, max_bytes=RESULTS_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    @staticmethod
+    def key(spec):
+        return hashlib.sha1(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Запись по ключу или None"""
+        path = self.path(key)
+        try:
+            with open(path, encoding="utf-8") as file:
+                record = json.load(file)
+            os.utime(path)  # Отметка для LRU
+        except (FileNotFoundError, ValueError):
+            return None
+        return record
+
+    def put(self, key, record):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(record, file)
+        os.replace(tmp_path, path)  # Читатели не увидят недописанную запись
+        try:
+            evict_lru(self.cache_dir, self.max_bytes, keep=(path,))
+        except FileNotFoundError:
+            pass  # Файл уже удалил параллельный процесс перебора
+
+    def lookup(self, cerebro):
+        """CachedResult, если прогон cerebro уже есть в кэше, иначе None (cerebro не запускается)"""
+        spec = run_spec(cerebro)
+        record = self.get(self.key(spec)) if spec is not None else None
+        if record is None:
+            return None
+        self.hits += 1
+        return CachedResult(record)
+
+    def run(self, cerebro):
+        """cerebro.run() через кэш: [стратегия] при промахе, [CachedResult] при попадании
+
+        Прогоны, которые нельзя описать ключом (фид не из файла,
+        несколько стратегий), выполняются как обычно.
+        """
+        spec = run_spec(cerebro)
+        if spec is None:
+            return cerebro.run()
+
+        key = self.key(spec)
+        record = self.get(key)
+        if record is not None:
+            self.hits += 1
+            return [CachedResult(record)]
+
+        self.misses += 1
+        cerebro.addanalyzer(ClosedTrades, _name="closed_trades")
+        started = time.perf_counter()
+        results = cerebro.run()
+        strat = results[0]
+        self.put(key, {
+            "meta": {
+                "strategy": spec["strategy"],
+                "params": spec["params"],
+                "datas": [(data._name, os.path.abspath(data_file(data)), str(data.p.fromdate), str(data.p.todate))
+                          for data in cerebro.datas],
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "seconds": time.perf_counter() - started,
+            },
+            "value": strat.broker.getvalue(),
+            "cash": strat.broker.getcash(),
+            "state": to_plain(strat.report_state()) if hasattr(strat, "report_state") else None,
+            "analyzers": {analyzer.__class__.__name__ if not name else name: to_plain(analyzer.get_analysis())
+                          for name, analyzer in zip(strat.analyzers.getnames(), strat.analyzers)},
+        })
+        return results
+
+    def entries(self):
+        """[(ключ, запись)] всех записей кэша"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in sorted(os.listdir(self.cache_dir)):
+            if name.endswith(".json"):
+                record = self.get(name[:-5])
+                if record is not None:
+                    entries.append((name[:-5], record))
+        return entries
+
+    def invalidate(self, strategy=None, data=None):
+        """Удаляет записи стратегии strategy и/или фидов, в имени или пути которых есть data
+
+        Без аргументов очищает кэш целиком. Возвращает число удалённых записей.
+        """
+        removed = 0
+        for key, record in self.entries():
+            meta = record["meta"]
+            if strategy and meta["strategy"] != strategy:
+                continue
+            if data and not any(data in name or data in path for name, path, _, _ in meta["datas"]):
+                continue
+            os.remove(self.path(key))
+            removed += 1
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Кэш итогов бэктестов")
+    parser.add_argument("--dir", default=RESULTS_DIR)
+    parser.add_argument("--list", action="store_true", help="Показать записи")
+    parser.add_argument("--clear", action="store_true", help="Удалить все записи")
+    parser.add_argument("--invalidate", metavar="STRATEGY", default=None, help="Удалить записи стратегии")
+    parser.add_argument("--data", default=None, help="Удалить записи фидов, в имени или пути которых есть строка")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.dir)
+    if args.clear or args.invalidate or args.data:
+        print(f"🗑 Удалено записей: {cache.invalidate(args.invalidate, args.data)}")
+    if args.list or not (args.clear or args.invalidate or args.data):
+        entries = cache.entries()
+        for key, record in entries:
+            meta = record["meta"]
+            params = ", ".join(f"{name}={value}" for name, value in meta["params"].items())
+            print(f"{key[:12]} {meta['created']} {meta['strategy']:<18} {record['value']:>12.2f} "
+                  f"{meta['seconds']:>6.1f} c | {params}")
+        size = sum(os.path.getsize(cache.path(key)) for key, _ in entries)
+        print(f"Записей: {len(entries)}, {size / 1024:.0f} КБ в {args.dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import importlib
+
+# Общие настройки прогонов для sweep.py, walkforward.py, portfolio.py,
+# kernel.py и bench-скриптов: брокер по умолчанию и стратегии с сетками
+# параметров. Без Backtrader: kernel.py и batch_eval.py берут BROKER и
+# стартуют без него, классы стратегий импортирует load_strategy().
+
+BROKER = {
+    "cash": 10000,
+    "commission": 0.0018,
+    "stake": 0.1,
+}
+
+# Стратегия -> ("модуль:класс", сетка параметров, постоянные параметры)
+STRATEGIES = {
+    "imbalance": ("strategy_imbalance:ImbalanceStrategy",
+                  {"imbalance": [0.3, 0.5, 0.7], "profit": [0.3, 0.5, 0.7]}, {"vectorized": True}),
+    "candles": ("main:CandlesOnly", {"ExitCandles": [3, 5, 8, 13]}, {}),
+}
+
+
+def load_strategy(name):
+    """Класс стратегии name из STRATEGIES (модуль импортируется при первом вызове)"""
+    module, cls = STRATEGIES[name][0].split(":")
+    return getattr(importlib.import_module(module), cls)
+
+
+def setup_broker(cerebro, broker=None):
+    """Стартовый капитал, размер позиции и комиссия из broker (по умолчанию BROKER)"""
+    from backtrader import sizers
+
+    broker = broker or BROKER
+    cerebro.broker.setcash(broker["cash"])
+    cerebro.addsizer(sizers.FixedSize, stake=broker["stake"])
+    cerebro.broker.setcommission(commission=broker["commission"])
+    return cerebro
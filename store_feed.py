@@ -0,0 +1,246 @@
+import math
+from array import array
+from datetime import datetime, timedelta
+
+import numpy as np
+from backtrader import TimeFrame
+from backtrader.feed import DataBase
+from backtrader.linebuffer import LineBuffer
+from candle_store import EPOCH, CandleStore, is_fresh, store_path_for, to_epoch
+from data.candle_index import ensure_index, gap_flags
+
+# Фиды Backtrader поверх candle_store: StoreData читает бинарный файл
+# свечей, IndexedCSVData - CSV с fromdate по индексу. Отдельно от
+# candle_store, чтобы хранилище (конвертация, CandleStore) можно было
+# импортировать без Backtrader: NumPy-ядро kernel.py и batch_eval.py
+# стартуют без него в разы быстрее.
+
+EPOCH_ORDINAL = EPOCH.toordinal()
+CHUNK = 65536  # Сколько баров переводим в числа Backtrader за раз при preload
+LOAD_CHUNK = 4096  # То же для чтения по бару (load): столько строк живут объектами Python
+
+
+def two_sum(a, b):
+    """Сумма и её точная ошибка округления (a + b == s + err без округления)"""
+    s = a + b
+    bb = s - a
+    return s, (a - (s - bb)) + (b - bb)
+
+
+def bt_datetimes(epochs):
+    """Секунды -> числа Backtrader, бит в бит как date2num()
+
+    date2num складывает сутки, часы/24, минуты/1440 и секунды/86400 через
+    math.fsum (сумма, округлённая один раз). Здесь та же сумма по всему
+    массиву: two_sum даёт точные ошибки округления частичных сумм, и если
+    их сумма сама точна, одно последнее сложение и есть округление fsum.
+    Остальные бары (на реальных временах таких не встречалось) считаются
+    через fsum по одному.
+    """
+    epochs = np.asarray(epochs, dtype=np.int64)
+    days, secs = np.divmod(epochs, 86400)
+    hours, secs = np.divmod(secs, 3600)
+    minutes, secs = np.divmod(secs, 60)
+
+    total, err1 = two_sum((days + EPOCH_ORDINAL).astype(np.float64), hours / 24.0)
+    total, err2 = two_sum(total, minutes / 1440.0)
+    total, err3 = two_sum(total, secs / 86400.0)
+    err, lost1 = two_sum(err1, err2)
+    err, lost2 = two_sum(err, err3)
+    out = total + err
+
+    fsum = math.fsum
+    for i in np.flatnonzero((lost1 != 0) | (lost2 != 0)).tolist():
+        out[i] = fsum((float(EPOCH_ORDINAL + days[i]), hours[i] / 24.0,
+                       minutes[i] / 1440.0, secs[i] / 86400.0, 0.0))
+    return out
+
+
+class StoreData(DataBase):
+    """Фид Backtrader поверх бинарного файла свечей
+
+    Повторяет поведение MyCSVData (те же времена баров и фильтр
+    fromdate/todate), но не парсит строки: начало и конец периода
+    находятся бинарным поиском, а при preload колонки копируются
+    в линии целиком. Линия gap - 1.0 у баров, перед которыми в данных
+    пропуск или повтор времени.
+
+    window=(start, end) - только бары с временем start <= t < end (секунды
+    хранилища). Граница по времени свечи, а не по времени бара Backtrader,
+    которое зависит от timeframe (дневной сдвигает его на конец сессии).
+    """
+    lines = ("gap",)
+    params = (
+        ("nullvalue", float("NaN")),  # Значение openinterest, как в MyCSVData
+        ("window", None),
+    )
+
+    def start(self):
+        super(StoreData, self).start()
+        dataname = self.p.dataname
+        self._store = dataname if isinstance(dataname, CandleStore) else CandleStore(dataname)
+
+        # Запас в сутки: для дневного таймфрейма время бара сдвигается на
+        # конец сессии, точную границу отсечёт стандартный фильтр load()
+        day = 86400
+        start = to_epoch(self.p.fromdate) - day if self.p.fromdate else None
+        end = to_epoch(self.p.todate) + day if self.p.todate else None
+        self._lo, self._hi = self._store.bounds(start, end)
+        if self.p.window:
+            lo, hi = self._store.bounds(self.p.window[0], self.p.window[1] - 1)
+            self._lo = max(self._lo, lo)
+            self._hi = max(min(self._hi, hi), self._lo)
+        self._pos = self._lo
+        self._chunk_end = self._lo
+        self._rows = None
+
+    def _datetimes(self, epochs):
+        """Время баров так же, как GenericCSVData._loadline"""
+        if self.p.timeframe < TimeFrame.Days:
+            return bt_datetimes(epochs)
+
+        # Дневной и выше: время бара не раньше конца его сессии
+        days, inverse = np.unique(epochs // 86400, return_inverse=True)
+        eosnums = np.array([
+            self.date2num(datetime.combine((EPOCH + timedelta(days=day)).date(), self.p.sessionend))
+            for day in days.tolist()])[inverse]
+
+        sessionend = self.p.sessionend
+        eos_secs = sessionend.hour * 3600 + sessionend.minute * 60 + sessionend.second
+        if len(epochs) and int((epochs % 86400).max()) < eos_secs:
+            return eosnums  # Все бары раньше конца сессии (обычный случай)
+        dtnums = bt_datetimes(epochs)
+        return np.where(eosnums > dtnums, eosnums, dtnums)
+
+    def _read(self, lo, hi):
+        """Колонки строк [lo, hi) в порядке линий Backtrader"""
+        store = self._store
+        ohlcv = np.asarray(store.ohlcv[:, lo:hi])
+        oi = np.full(hi - lo, self.p.nullvalue, dtype=np.float64)
+        epochs = np.asarray(store.datetime[lo:hi])
+        gaps = gap_flags(epochs, store.step, int(store.datetime[lo - 1]) if lo else None)
+        return (self._datetimes(epochs), *ohlcv, oi, gaps.astype(np.float64))
+
+    def _load(self):
+        if self._pos >= self._chunk_end:
+            if self._pos >= self._hi:
+                return False
+            self._chunk_end = min(self._pos + LOAD_CHUNK, self._hi)
+            self._rows = list(zip(*(col.tolist() for col in self._read(self._pos, self._chunk_end))))
+            self._row = 0
+
+        values = self._rows[self._row]
+        self._row += 1
+        self._pos += 1
+        lines = self.lines
+        lines.datetime[0], lines.open[0], lines.high[0], lines.low[0], \
+            lines.close[0], lines.volume[0], lines.openinterest[0], lines.gap[0] = values
+        return True
+
+    def preload(self):
+        lines = self.lines
+        if self._filters or self._tzinput or len(self) or \
+                any(line.mode != LineBuffer.UnBounded for line in lines):
+            return super(StoreData, self).preload()
+
+        # Быстрый путь: колонки копируются в линии кусками, с той же
+        # отсечкой по fromdate/todate, что и в load()
+        targets = (lines.datetime, lines.open, lines.high, lines.low,
+                   lines.close, lines.volume, lines.openinterest, lines.gap)
+        for line in targets:
+            line.array = array("d")
+
+        for lo in range(self._lo, self._hi, CHUNK):
+            columns = self._read(lo, min(lo + CHUNK, self._hi))
+            dtnums = columns[0]
+            after = np.flatnonzero(dtnums > self.todate)
+            keep = np.arange(after[0] if len(after) else len(dtnums))
+            keep = keep[dtnums[keep] >= self.fromdate]
+            for line, column in zip(targets, columns):
+                line.array.frombytes(column[keep].tobytes())
+            if len(after):
+                break
+
+        for line in targets:
+            line.idx = line.lencount = len(line.array)
+            line.idx -= 1
+        self._pos = self._chunk_end = self._hi
+
+        self._last()
+        self.home()
+
+
+_indexed_classes = {}
+
+
+def byte_seekable(file):
+    """Текстовый файл, где смещение в байтах - законная позиция seek
+
+    Официально seek текстового файла принимает только значения tell(),
+    но в кодировке, совместимой с ASCII, без состояния декодера (UTF-8,
+    cp1251, ...) это и есть смещение в байтах. Иначе (UTF-16, BOM, StringIO)
+    файл читается с начала.
+    """
+    encoding = getattr(file, "encoding", None)
+    if not encoding or not file.seekable():
+        return False
+    sample = "datetime,0123456789-: .\r\n"
+    try:
+        return sample.encode(encoding) == sample.encode("ascii")
+    except (LookupError, UnicodeError):
+        return False
+
+
+def indexed_csv_class(csvcls):
+    """Подкласс CSV-фида, который читает файл с fromdate по индексу
+
+    Вместо разбора всех строк до начала периода файл сдвигается на
+    смещение нужной строки (бинарный поиск по индексу). Линия gap - как
+    у StoreData.
+    """
+    if csvcls not in _indexed_classes:
+        class IndexedCSVData(csvcls):
+            lines = ("gap",)
+            params = (
+                ("index", None),  # CandleIndex этого CSV
+                ("gap", -1),  # Колонки gap в CSV нет
+            )
+
+            def start(self):
+                super(IndexedCSVData, self).start()
+                index = self.p.index
+                # Запас в сутки, как в StoreData
+                self._row = 0
+                if self.p.fromdate and byte_seekable(self.f) and len(index):
+                    # fromdate после конца индекса: с последней строки индекса,
+                    # за ней может быть недописанная строка без "\n"
+                    self._row = min(index.row_at(to_epoch(self.p.fromdate) - 86400), len(index) - 1)
+                if self._row:
+                    # Смещение индекса - начало строки (сразу после "\n"),
+                    # а байты ASCII декодируются без состояния: seek на него
+                    # даёт то же, что tell() в начале этой строки
+                    self.f.seek(int(index.offsets[self._row]))
+                self._gaps = index.flags()
+
+            def _loadline(self, linetokens):
+                loaded = super(IndexedCSVData, self)._loadline(linetokens)
+                row = self._row
+                self.lines.gap[0] = float(self._gaps[row]) if row < len(self._gaps) else 0.0
+                self._row = row + 1
+                return loaded
+
+        IndexedCSVData.__name__ = "Indexed" + csvcls.__name__
+        _indexed_classes[csvcls] = IndexedCSVData
+    return _indexed_classes[csvcls]
+
+
+def open_feed(csv_path, csvcls, **kwargs):
+    """StoreData, если рядом с CSV есть свежий бинарный файл, иначе csvcls
+
+    CSV читается через индекс из data/candle_index.py: с fromdate, без
+    разбора строк до начала периода.
+    """
+    store_path = store_path_for(csv_path)
+    if is_fresh(store_path, csv_path):
+        return StoreData(dataname=store_path, **kwargs)
+    return indexed_csv_class(csvcls)(dataname=csv_path, index=ensure_index(csv_path), **kwargs)
@@ -1,19 +1,48 @@
 from os.path import abspath
 from datetime import datetime
-from backtrader import Cerebro, Strategy, sizers, analyzers, OrderBase
+from backtrader import Cerebro, Strategy, sizers, OrderBase
+from backtrader.linebuffer import LineBuffer
 from backtrader.feeds import GenericCSVData
+from events import DEBUG, INFO, console_recorder
+from streaming_stats import StreamingStats, TradeStats
+
+class FeedState:
+    """Состояние ImbalanceStrategy по одному фиду: ордер, вход, готовые условия"""
+    __slots__ = ("data", "bars", "order", "entry_price", "conditions", "gap", "gap_spans", "trade_stats")
+
+    def __init__(self, data):
+        self.data = data
+        self.bars = 0  # len(data) на прошлом шаге: пришёл ли у фида новый бар
+        self.order = None
+        self.entry_price = None
+        self.conditions = None  # Условия по всему ряду (режим vectorized)
+        self.gap = None  # Линия gap фида (skip_gaps)
+        self.gap_spans = None
+        self.trade_stats = TradeStats()  # Итоги сделок только по этому фиду
+
 
 class ImbalanceStrategy(Strategy):
-    """Стратегия торговли на медвежьем имбалансе"""
+    """Стратегия торговли на медвежьем имбалансе
+
+    Работает с любым числом фидов в одном Cerebro: ордер, цена входа и
+    условия хранятся по каждому фиду отдельно (states), статистика
+    условий и сделок - общая. Фид, у которого на шаге общей шкалы времени
+    нет нового бара, пропускается.
+    """
     params = {
         "imbalance": 0.7,
         "profit": 0.7,
         "stop_loss": 2.0,
         "take_profit": 1.5,
-        "debug": True  # Режим отладки
+        "debug": True,  # Режим отладки
+        "recorder": None,  # EventRecorder; по умолчанию вывод в консоль
+        "vectorized": False,  # Условия считаются заранее по всему ряду (нужен preload)
+        "skip_gaps": False  # Не входить по свечам, между которыми пропуск в данных
     }
+    lookback = 4  # Баров истории, которые читает find_bear_imbalance
 
     def __init__(self):
+        # Линии первого фида; сама стратегия читает линии из states
         self.time = self.data.datetime
         self.open = self.data.open
         self.close = self.data.close
@@ -21,10 +50,8 @@ class ImbalanceStrategy(Strategy):
         self.low = self.data.low
         self.volume = self.data.volume
 
-        self.order = None
-        self.entry_price = None
-        self.win_trades = []
-        self.lose_trades = []
+        self.states = {data: FeedState(data) for data in self.datas}  # Фид -> его состояние
+        self.trade_stats = TradeStats()  # Итоги сделок без списков, по всем фидам
         self.checks_counter = 0  # Счетчик проверок
         self.condition_stats = {
             'condition_0': 0,
@@ -33,23 +60,84 @@ class ImbalanceStrategy(Strategy):
             'all_conditions': 0
         }
 
-    def find_bear_imbalance(self):
-        """Поиск медвежьего имбаланса на последних 4 свечах"""
-        if len(self) < 4:
+        self.gap_checks = False
+        if self.params.skip_gaps:
+            # Линия gap есть у фидов из open_feed (StoreData, CSV с индексом)
+            for state in self.states.values():
+                if "gap" not in state.data.lines.getlinealiases():
+                    raise ValueError("skip_gaps: у фида нет линии gap, откройте данные через open_feed")
+                state.gap = state.data.gap
+            self.gap_checks = True
+        self.gap_skips = 0  # Сигналы, пропущенные из-за дыр в данных
+        self.log = self.params.recorder or console_recorder(self.params.debug)
+
+    def qbuffer(self, savemem=0, replaying=False):
+        super(ImbalanceStrategy, self).qbuffer(savemem, replaying)
+        if savemem > 0:
+            # exactbars: фид хранит только последние lookback баров
+            for data in self.datas:
+                data.minbuffer(self.lookback)
+
+    def start(self):
+        # Данные уже загружены целиком (preload): считаем условия один раз
+        if not self.params.vectorized:
+            return
+        for state in self.states.values():
+            data = state.data
+            if data.buflen() and data.close.mode == LineBuffer.UnBounded:
+                state.conditions = self.precompute_conditions(state)
+
+    def precompute_conditions(self, state):
+        """Условия find_bear_imbalance для каждого бара фида (массивы NumPy)"""
+        import numpy as np  # Только для vectorized: без него импорт модуля быстрее
+
+        data = state.data
+        low = np.array(data.low.array)
+        high = np.array(data.high.array)
+        close = np.array(data.close.array)
+
+        # Те же выражения, что и в find_bear_imbalance, со сдвигом на 3 бара
+        third_imb_kline = low[:-3]
+        second_imb_kline = low[1:-2]
+        first_imb_kline = high[2:-1]
+        current_kline = close[3:]
+
+        conditions = np.zeros((4, len(close)), dtype=bool)
+        conditions[0, 3:] = second_imb_kline < third_imb_kline
+        conditions[1, 3:] = (first_imb_kline - current_kline) / first_imb_kline > self.params.profit / 100
+        conditions[2, 3:] = (third_imb_kline - first_imb_kline) / third_imb_kline > self.params.imbalance / 100
+        conditions[3] = conditions[0] & conditions[1] & conditions[2]
+        if state.gap is not None:
+            # Пропуск перед любой из трёх последних свечей окна
+            gap = np.array(state.gap.array) > 0
+            spans = np.zeros(len(close), dtype=bool)
+            spans[3:] = gap[1:-2] | gap[2:-1] | gap[3:]
+            state.gap_spans = spans.tolist()
+        return conditions.T.tolist()
+
+    def find_bear_imbalance(self, state):
+        """Поиск медвежьего имбаланса на последних 4 свечах фида"""
+        data = state.data
+        if len(data) < 4:
             return False
 
         self.checks_counter += 1
 
-        # Получаем данные
-        third_imb_kline = self.low[-3]
-        second_imb_kline = self.low[-2]
-        first_imb_kline = self.high[-1]
-        current_kline = self.close[0]
-
-        # Вычисляем условия
-        condition_0 = second_imb_kline < third_imb_kline
-        condition_1 = (first_imb_kline - current_kline) / first_imb_kline > self.params.profit / 100
-        condition_2 = (third_imb_kline - first_imb_kline) / third_imb_kline > self.params.imbalance / 100
+        if state.conditions is not None:
+            # Условия уже посчитаны в start(), читаем готовые значения
+            condition_0, condition_1, condition_2, all_conditions = state.conditions[len(data) - 1]
+        else:
+            # Получаем данные
+            third_imb_kline = data.low[-3]
+            second_imb_kline = data.low[-2]
+            first_imb_kline = data.high[-1]
+            current_kline = data.close[0]
+
+            # Вычисляем условия
+            condition_0 = second_imb_kline < third_imb_kline
+            condition_1 = (first_imb_kline - current_kline) / first_imb_kline > self.params.profit / 100
+            condition_2 = (third_imb_kline - first_imb_kline) / third_imb_kline > self.params.imbalance / 100
+            all_conditions = condition_0 and condition_1 and condition_2
 
         # Статистика условий
         if condition_0:
@@ -60,155 +148,205 @@ class ImbalanceStrategy(Strategy):
             self.condition_stats['condition_2'] += 1
 
         # Отладочный вывод каждые 100 свечей
-        if self.params.debug and self.checks_counter % 100 == 0:
-            imbalance_gap = ((third_imb_kline - first_imb_kline) / third_imb_kline * 100) if third_imb_kline > 0 else 0
-            profit_gap = ((first_imb_kline - current_kline) / first_imb_kline * 100) if first_imb_kline > 0 else 0
-
-            print(f"\n📊 Check #{self.checks_counter} | Date: {self.time.datetime(0)}")
-            print(f"   Third Low[-3]: {third_imb_kline:.2f}")
-            print(f"   Second Low[-2]: {second_imb_kline:.2f}")
-            print(f"   First High[-1]: {first_imb_kline:.2f}")
-            print(f"   Current Close[0]: {current_kline:.2f}")
-            print(f"   Condition 0 (second < third): {condition_0} | {second_imb_kline:.2f} < {third_imb_kline:.2f}")
-            print(f"   Condition 1 (profit > {self.params.profit}%): {condition_1} | Gap: {profit_gap:.2f}%")
-            print(f"   Condition 2 (imbalance > {self.params.imbalance}%): {condition_2} | Gap: {imbalance_gap:.2f}%")
-
-        if all([condition_0, condition_1, condition_2]):
+        if self.params.debug and self.checks_counter % 100 == 0 and self.log.enabled(DEBUG):
+            self.log_check(state, condition_0, condition_1, condition_2)
+
+        if all_conditions and state.gap is not None and self.spans_gap(state):
+            self.gap_skips += 1
+            self.log.debug("⏭ Имбаланс через пропуск в данных пропущен: {}", data.datetime.datetime(0))
+            return False
+
+        if all_conditions:
             self.condition_stats['all_conditions'] += 1
-            imbalance_gap = ((third_imb_kline - first_imb_kline) / third_imb_kline * 100)
-            profit_gap = ((first_imb_kline - current_kline) / first_imb_kline * 100)
-
-            print(f"\n✅✅✅ Bear Imbalance found! Date: {self.time.datetime(0)}")
-            print(f"   Third Low[-3]: {third_imb_kline:.2f}")
-            print(f"   Second Low[-2]: {second_imb_kline:.2f}")
-            print(f"   First High[-1]: {first_imb_kline:.2f}")
-            print(f"   Current Close[0]: {current_kline:.2f}")
-            print(f"   Imbalance Gap: {imbalance_gap:.2f}%")
-            print(f"   Profit Gap: {profit_gap:.2f}%")
+            if self.log.enabled(INFO):
+                self.log_imbalance(state)
             return True
 
         return False
 
+    def spans_gap(self, state):
+        """Окно из 4 свечей фида разорвано пропуском или повтором времени"""
+        if state.conditions is not None:
+            return state.gap_spans[len(state.data) - 1]
+        gap = state.gap
+        return gap[0] > 0 or gap[-1] > 0 or gap[-2] > 0
+
+    def log_check(self, state, condition_0, condition_1, condition_2):
+        """Отладочное событие очередной проверки условий"""
+        data = state.data
+        third_imb_kline = data.low[-3]
+        second_imb_kline = data.low[-2]
+        first_imb_kline = data.high[-1]
+        current_kline = data.close[0]
+        imbalance_gap = ((third_imb_kline - first_imb_kline) / third_imb_kline * 100) if third_imb_kline > 0 else 0
+        profit_gap = ((first_imb_kline - current_kline) / first_imb_kline * 100) if first_imb_kline > 0 else 0
+
+        self.log.debug(
+            "\n📊 Check #{} | Date: {}\n"
+            "   Third Low[-3]: {:.2f}\n"
+            "   Second Low[-2]: {:.2f}\n"
+            "   First High[-1]: {:.2f}\n"
+            "   Current Close[0]: {:.2f}\n"
+            "   Condition 0 (second < third): {} | {:.2f} < {:.2f}\n"
+            "   Condition 1 (profit > {}%): {} | Gap: {:.2f}%\n"
+            "   Condition 2 (imbalance > {}%): {} | Gap: {:.2f}%",
+            self.checks_counter, data.datetime.datetime(0),
+            third_imb_kline, second_imb_kline, first_imb_kline, current_kline,
+            condition_0, second_imb_kline, third_imb_kline,
+            self.params.profit, condition_1, profit_gap,
+            self.params.imbalance, condition_2, imbalance_gap)
+
+    def log_imbalance(self, state):
+        """Событие найденного имбаланса"""
+        data = state.data
+        third_imb_kline = data.low[-3]
+        second_imb_kline = data.low[-2]
+        first_imb_kline = data.high[-1]
+        current_kline = data.close[0]
+        imbalance_gap = ((third_imb_kline - first_imb_kline) / third_imb_kline * 100)
+        profit_gap = ((first_imb_kline - current_kline) / first_imb_kline * 100)
+
+        self.log.info(
+            "\n✅✅✅ Bear Imbalance found! Date: {}\n"
+            "   Third Low[-3]: {:.2f}\n"
+            "   Second Low[-2]: {:.2f}\n"
+            "   First High[-1]: {:.2f}\n"
+            "   Current Close[0]: {:.2f}\n"
+            "   Imbalance Gap: {:.2f}%\n"
+            "   Profit Gap: {:.2f}%",
+            data.datetime.datetime(0), third_imb_kline, second_imb_kline,
+            first_imb_kline, current_kline, imbalance_gap, profit_gap)
+
     def notify_order(self, order: OrderBase):
         if order.status in [order.Submitted, order.Accepted]:
             return
 
+        state = self.states[order.data]
         if order.status in [order.Completed]:
             if order.issell():
-                self.entry_price = order.executed.price
-                print(f"\n🔴 SHORT opened at {order.executed.price:.2f}")
-                print(f"   Commission: {order.executed.comm:.2f}")
-                print(f"   Stop Loss: {self.entry_price * (1 + self.params.stop_loss / 100):.2f}")
-                print(f"   Take Profit: {self.entry_price * (1 - self.params.take_profit / 100):.2f}")
+                state.entry_price = order.executed.price
+                self.log.info("\n🔴 SHORT opened at {:.2f}\n"
+                              "   Commission: {:.2f}\n"
+                              "   Stop Loss: {:.2f}\n"
+                              "   Take Profit: {:.2f}",
+                              order.executed.price, order.executed.comm,
+                              state.entry_price * (1 + self.params.stop_loss / 100),
+                              state.entry_price * (1 - self.params.take_profit / 100))
             elif order.isbuy():
-                print(f"🟢 SHORT closed at {order.executed.price:.2f}")
-                print(f"   Commission: {order.executed.comm:.2f}")
+                self.log.info("🟢 SHORT closed at {:.2f}\n"
+                              "   Commission: {:.2f}",
+                              order.executed.price, order.executed.comm)
 
         elif order.status in [order.Cancelled, order.Margin, order.Rejected]:
-            print(f"⚠️ Order cancelled/rejected: {order.status}")
+            self.log.warning("⚠️ Order cancelled/rejected: {}", order.status)
 
-        self.order = None
+        state.order = None
 
     def notify_trade(self, trade):
         if trade.isclosed:
-            pnl_percent = (trade.pnlcomm / self.entry_price) * 100 if self.entry_price else 0
+            state = self.states[trade.data]
+            pnl_percent = (trade.pnlcomm / state.entry_price) * 100 if state.entry_price else 0
 
+            self.trade_stats.add(trade.pnlcomm)
+            state.trade_stats.add(trade.pnlcomm)
             if trade.pnlcomm > 0:
-                self.win_trades.append(trade.pnlcomm)
-                print(f"💰 Profit: {trade.pnlcomm:.2f} ({pnl_percent:.2f}%)")
+                self.log.info("💰 Profit: {:.2f} ({:.2f}%)\n", trade.pnlcomm, pnl_percent)
             else:
-                self.lose_trades.append(trade.pnlcomm)
-                print(f"📉 Loss: {trade.pnlcomm:.2f} ({pnl_percent:.2f}%)")
-            print()
+                self.log.info("📉 Loss: {:.2f} ({:.2f}%)\n", trade.pnlcomm, pnl_percent)
 
     def next(self):
-        if self.order:
+        for state in self.states.values():
+            bars = len(state.data)
+            if bars != state.bars:  # У фида новый бар на этом шаге
+                state.bars = bars
+                self.next_feed(state)
+
+    # Пока не у всех фидов есть бары (фиды начинаются в разные даты),
+    # Backtrader зовёт prenext: уже начавшиеся фиды торгуются как обычно
+    prenext = next
+
+    def next_feed(self, state):
+        """Шаг стратегии по одному фиду"""
+        if state.order:
             return
 
-        if not self.position:
-            if self.find_bear_imbalance():
-                print(f"📊 Opening SHORT position")
-                self.order = self.sell()
+        data = state.data
+        if not self.getposition(data):
+            if self.find_bear_imbalance(state):
+                self.log.info("📊 Opening SHORT position")
+                state.order = self.sell(data=data)
         else:
-            current_price = self.close[0]
+            current_price = data.close[0]
 
-            if current_price >= self.entry_price * (1 + self.params.stop_loss / 100):
-                print(f"🛑 Stop Loss triggered at {current_price:.2f}")
-                self.order = self.buy()
-            elif current_price <= self.entry_price * (1 - self.params.take_profit / 100):
-                print(f"🎯 Take Profit triggered at {current_price:.2f}")
-                self.order = self.buy()
+            if current_price >= state.entry_price * (1 + self.params.stop_loss / 100):
+                self.log.info("🛑 Stop Loss triggered at {:.2f}", current_price)
+                state.order = self.buy(data=data)
+            elif current_price <= state.entry_price * (1 - self.params.take_profit / 100):
+                self.log.info("🎯 Take Profit triggered at {:.2f}", current_price)
+                state.order = self.buy(data=data)
 
     def stop(self):
-        print("\n" + "=" * 60)
-        print("📊 РЕЗУЛЬТАТЫ БЭКТЕСТА")
-        print("=" * 60)
-        print(f"Конечный капитал: ${self.broker.getvalue():.2f}")
-        print(f"Прибыльных сделок: {len(self.win_trades)}")
-        print(f"Убыточных сделок: {len(self.lose_trades)}")
-        # Статистика проверок условий
-        print("\n📈 СТАТИСТИКА УСЛОВИЙ:")
-        print(f"Всего проверок: {self.checks_counter}")
-        print(
-            f"Condition 0 (second < third) выполнено: {self.condition_stats['condition_0']} раз ({self.condition_stats['condition_0'] / self.checks_counter * 100:.2f}%)")
-        print(
-            f"Condition 1 (profit > {self.params.profit}%) выполнено: {self.condition_stats['condition_1']} раз ({self.condition_stats['condition_1'] / self.checks_counter * 100:.2f}%)")
-        print(
-            f"Condition 2 (imbalance > {self.params.imbalance}%) выполнено: {self.condition_stats['condition_2']} раз ({self.condition_stats['condition_2'] / self.checks_counter * 100:.2f}%)")
-        print(
-            f"Все условия одновременно: {self.condition_stats['all_conditions']} раз ({self.condition_stats['all_conditions'] / self.checks_counter * 100:.2f}%)")
-
-        all_trade_len = len(self.win_trades) + len(self.lose_trades)
-
-        if all_trade_len > 0:
-            win_rate = (len(self.win_trades) / all_trade_len) * 100
-            total_profit = sum(self.win_trades)
-            total_loss = sum(self.lose_trades)
-            net_profit = total_profit + total_loss
-
-            print(f"\n💼 ТОРГОВАЯ СТАТИСТИКА:")
-            print(f"Всего сделок: {all_trade_len}")
-            print(f"Коэффициент побед: {win_rate:.2f}%")
-
-            if self.win_trades:
-                max_win = max(self.win_trades)
-            try:
-                avg_win = total_profit / len(self.win_trades)
-            except:
-                avg_win = 0
-            print(f"Максимальная прибыль: ${max_win:.2f}")
-            print(f"Средняя прибыль: ${avg_win:.2f}")
-
-            if self.lose_trades:
-                max_lose = min(self.lose_trades)
-                try:
-                    avg_lose = total_loss / len(self.lose_trades)
-                except ZeroDivisionError:
-                    avg_lose = 0
-            else:
-                max_lose = 0
-                avg_lose = 0
-
-            print(f"Максимальный убыток: ${max_lose:.2f}")
-            print(f"Средний убыток: ${avg_lose:.2f}")
-
-            print(f"\n💰 ФИНАНСОВЫЕ ПОКАЗАТЕЛИ:")
-            print(f"Общая прибыль: ${total_profit:.2f}")
+        self.log.flush()
+        print_results(self.broker.getvalue(), self.trade_stats, self.report_state(), self.params)
+
+    def report_state(self):
+        """Счётчики условий для отчёта stop(): result_cache.py хранит их с итогами прогона"""
+        return {
+            "checks": self.checks_counter,
+            "conditions": dict(self.condition_stats),
+            "gap_checks": self.gap_checks,
+            "gap_skips": self.gap_skips,
+        }
 
-            print(f"Общий убыток: ${total_loss:.2f}")
-            print(f"Чистая прибыль: ${net_profit:.2f}")
 
-            if self.win_trades and self.lose_trades:
-                profit_factor = abs(total_profit / total_loss)
-                print(f"Profit Factor: {profit_factor:.2f}")
-        else:
-            print("\n⚠️ Сделок не было")
-            print("\n💡 РЕКОМЕНДАЦИИ:")
-            print("   1. Уменьшите параметры imbalance и profit")
-            print("   2. Проверьте данные в CSV файле")
-            print("   3. Измените временной период")
+def print_results(value, stats, state, params):
+    """Отчёт бэктеста: из stop() или по итогам из кэша"""
+    print("\n" + "=" * 60)
+    print("📊 РЕЗУЛЬТАТЫ БЭКТЕСТА")
+    print("=" * 60)
+    print(f"Конечный капитал: ${value:.2f}")
+    print(f"Прибыльных сделок: {stats.wins}")
+    print(f"Убыточных сделок: {stats.losses}")
+    # Статистика проверок условий
+    checks, conditions = state["checks"], state["conditions"]
+    print("\n📈 СТАТИСТИКА УСЛОВИЙ:")
+    print(f"Всего проверок: {checks}")
+    print(
+        f"Condition 0 (second < third) выполнено: {conditions['condition_0']} раз ({conditions['condition_0'] / checks * 100:.2f}%)")
+    print(
+        f"Condition 1 (profit > {params.profit}%) выполнено: {conditions['condition_1']} раз ({conditions['condition_1'] / checks * 100:.2f}%)")
+    print(
+        f"Condition 2 (imbalance > {params.imbalance}%) выполнено: {conditions['condition_2']} раз ({conditions['condition_2'] / checks * 100:.2f}%)")
+    print(
+        f"Все условия одновременно: {conditions['all_conditions']} раз ({conditions['all_conditions'] / checks * 100:.2f}%)")
+    if state["gap_checks"]:
+        print(f"Пропущено из-за дыр в данных: {state['gap_skips']}")
+
+    if stats.count > 0:
+        print(f"\n💼 ТОРГОВАЯ СТАТИСТИКА:")
+        print(f"Всего сделок: {stats.count}")
+        print(f"Коэффициент побед: {stats.win_rate:.2f}%")
+        print(f"Максимальная прибыль: ${stats.max_win:.2f}")
+        print(f"Средняя прибыль: ${stats.avg_win:.2f}")
+        print(f"Максимальный убыток: ${stats.max_loss:.2f}")
+        print(f"Средний убыток: ${stats.avg_loss:.2f}")
+
+        print(f"\n💰 ФИНАНСОВЫЕ ПОКАЗАТЕЛИ:")
+        print(f"Общая прибыль: ${stats.total_profit:.2f}")
+
+        print(f"Общий убыток: ${stats.total_loss:.2f}")
+        print(f"Чистая прибыль: ${stats.total_profit + stats.total_loss:.2f}")
+
+        if stats.profit_factor is not None:
+            print(f"Profit Factor: {stats.profit_factor:.2f}")
+    else:
+        print("\n⚠️ Сделок не было")
+        print("\n💡 РЕКОМЕНДАЦИИ:")
+        print("   1. Уменьшите параметры imbalance и profit")
+        print("   2. Проверьте данные в CSV файле")
+        print("   3. Измените временной период")
 
-            print("=" * 60)
+        print("=" * 60)
 
 class MyCSVData(GenericCSVData):
     """Класс для загрузки CSV файла"""
@@ -224,19 +362,40 @@ class MyCSVData(GenericCSVData):
     }
 
 if __name__ == "__main__":
+    import argparse
+    from contextlib import nullcontext
+    from types import SimpleNamespace
+    from store_feed import open_feed  # NumPy и индекс CSV - только при запуске бэктеста
+
+    parser = argparse.ArgumentParser(description="Бэктест ImbalanceStrategy")
+    parser.add_argument("--profile", metavar="JSON", default=None,
+                        help="Профиль прогона по фазам, дописывается в файл строкой JSON")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="Длинная история (минутки): память не растёт с числом баров, без графика")
+    parser.add_argument("--plot", metavar="FILE", default=None,
+                        help="Быстрый график в файл (.png, .svg, .html) вместо cerebro.plot()")
+    parser.add_argument("--cache", action="store_true",
+                        help="Итоги прогона из кэша result_cache.py, если такой прогон уже был")
+    args = parser.parse_args()
+
     # Путь к CSV файлу
     csv_file_path = abspath("./data/BTCUSDT_15.csv")
 
-    # Загрузка данных
-    data = MyCSVData(
-        dataname=csv_file_path,
+    # Загрузка данных (бинарный файл из candle_store.py, если он есть)
+    data = open_feed(
+        csv_file_path, MyCSVData,
         fromdate=datetime(2022, 1, 1),
         todate=datetime(2025, 10, 1),
         reverse=False
     )
 
     # Создание и настройка Cerebro
-    cerebro = Cerebro()
+    # Профиль памяти, профайлер и кэш импортируются, только если включены
+    if args.low_memory:
+        from low_memory import low_memory_cerebro
+        cerebro = low_memory_cerebro()
+    else:
+        cerebro = Cerebro()
     cerebro.adddata(data)
 
     # Параметры стратегии (попробуйте уменьшить для
@@ -245,16 +404,15 @@ if __name__ == "__main__":
                         profit=0.5,  # Уменьшен с 0.7 до 0.5
                         stop_loss=2.0,
                         take_profit=1.5,
-                        debug=True)  # Включена отладка
+                        debug=True,  # Включена отладка
+                        vectorized=True)  # Условия считаются заранее по всему ряду
 
     cerebro.broker.setcash(10000)  # Стартовый баланс
     cerebro.addsizer(sizers.FixedSize, stake=0.1)  # Размер позиции
     cerebro.broker.setcommission(commission=0.0018)  # Комиссия
 
-    # Добавление аналитики
-    cerebro.addanalyzer(analyzers.SharpeRatio, _name='sharpe')
-    cerebro.addanalyzer(analyzers.DrawDown, _name='drawdown')
-    cerebro.addanalyzer(analyzers.TradeAnalyzer, _name='trades')
+    # Добавление аналитики: Sharpe, просадка и сделки одним потоковым анализатором
+    cerebro.addanalyzer(StreamingStats, _name='stats')
 
     print(f"\n🚀 Начальный капитал: ${cerebro.broker.getvalue():.2f}")
     print(f"📅 Период: 2022-01-24 до 2025-08-02")
@@ -265,33 +423,56 @@ if __name__ == "__main__":
     print(f"   - Take Profit: 1.5%")
 
     # Запуск бэктеста
-    results = cerebro.run()
+    profiler = None
+    if args.profile:
+        from profiling import RunProfiler, print_report
+        profiler = RunProfiler(cerebro)
+        results = profiler.run()
+    elif args.cache:
+        from result_cache import ResultCache
+        results = ResultCache().run(cerebro)
+    else:
+        results = cerebro.run()
 
     # Дополнительная аналитика
     strat = results[0]
+    cached = getattr(strat, "cached", False)
+    if cached:  # stop() не вызывался: отчёт по сделкам и счётчикам из кэша
+        print(f"\n📦 Результат из кэша (прогон от {strat.meta['created']})")
+        stats = TradeStats()
+        for trade in strat.trades:
+            stats.add(trade["pnlcomm"])
+        print_results(strat.value, stats, strat.state, SimpleNamespace(**strat.meta["params"]))
 
     print("\n📊 ДОПОЛНИТЕЛЬНАЯ АНАЛИТИКА:")
 
-    if hasattr(strat.analyzers, 'sharpe'):
-        sharpe = strat.analyzers.sharpe.get_analysis().get('sharperatio', None)
-        print(f"Sharpe Ratio: {sharpe if sharpe else 'N/A'}")
-
-    if hasattr(strat.analyzers, 'drawdown'):
-        dd = strat.analyzers.drawdown.get_analysis()
-        max_dd = dd.get('max', {}).get('drawdown', 0)
-        print(f"Max Drawdown: {max_dd:.2f}%")
-
-    if hasattr(strat.analyzers, 'trades'):
-        trades = strat.analyzers.trades.get_analysis()
-        print(f"Total Trades: {trades.get('total', {}).get('total', 0)}")
-        print(f"Won Trades: {trades.get('won', {}).get('total', 0)}")
-        print(f"Lost Trades: {trades.get('lost', {}).get('total', 0)}")
-
-    # Построение графика
-    try:
-        cerebro.plot(style="candle")
-    except Exception as e:
-        print(f"\n⚠️ Ошибка при построении графика: {e}")
+    stats = strat.analyzers.stats.get_analysis()
+    print(f"Sharpe Ratio: {stats.sharpe if stats.sharpe else 'N/A'}")
+    print(f"Max Drawdown: {stats.max_drawdown:.2f}%")
+    print(f"Total Trades: {stats.trades}")
+    print(f"Won Trades: {stats.won}")
+    print(f"Lost Trades: {stats.lost}")
+
+    # Построение графика (в режиме --low-memory истории для него нет)
+    if args.low_memory:
+        print("\n⚠️ График не строится в режиме --low-memory")
+    elif cached:
+        print("\n⚠️ График не строится по результату из кэша")
+    else:
+        try:
+            with profiler.phase("plot") if profiler else nullcontext():
+                if args.plot:  # Свечи сжаты до ширины картинки, окно не открывается
+                    from fastplot import fast_plot
+                    print(f"\n🖼️ График сохранён в {fast_plot(strat, args.plot)}")
+                else:
+                    cerebro.plot(style="candle")
+        except Exception as e:
+            print(f"\n⚠️ Ошибка при построении графика: {e}")
+
+    if profiler:
+        profiler.dump(args.profile)
+        print_report(profiler.report())
+        print(f"✅ Профиль дописан в {args.profile}")
 
         # cerebro.addstrategy(ImbalanceStrategy,
         #                     imbalance=0.3,  # Еще меньше
@@ -0,0 +1,199 @@
+import math
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from backtrader import Analyzer, date2num
+from backtrader.utils import num2date
+
+# Итоги бэктеста без списков сделок и вложенных словарей: всё считается
+# на лету в состоянии фиксированного размера. Числа совпадают с тем, что
+# печатают стратегии (win_trades/lose_trades) и стандартные SharpeRatio,
+# DrawDown и TradeAnalyzer с параметрами по умолчанию.
+
+
+class TradeStats:
+    """Накопитель итогов закрытых сделок по pnlcomm
+
+    Прибыльная сделка - pnlcomm > 0, как в notify_trade стратегий.
+    Суммы копятся в порядке сделок, как sum() по спискам.
+    """
+    __slots__ = ("wins", "losses", "breakeven", "total_profit", "total_loss", "max_win", "max_loss",
+                 "min_loss")
+
+    def __init__(self):
+        self.wins = 0
+        self.losses = 0
+        self.breakeven = 0  # Убыточные с pnlcomm == 0: TradeAnalyzer считает их выигрышными
+        self.total_profit = 0
+        self.total_loss = 0
+        self.max_win = 0  # Самая большая прибыль
+        self.max_loss = 0  # Самый большой убыток (минимальный pnlcomm)
+        self.min_loss = 0  # Самый маленький убыток (максимальный pnlcomm среди убыточных)
+
+    def add(self, pnlcomm):
+        if pnlcomm > 0:
+            self.max_win = pnlcomm if not self.wins else max(self.max_win, pnlcomm)
+            self.wins += 1
+            self.total_profit += pnlcomm
+        else:
+            self.max_loss = pnlcomm if not self.losses else min(self.max_loss, pnlcomm)
+            self.min_loss = pnlcomm if not self.losses else max(self.min_loss, pnlcomm)
+            self.losses += 1
+            self.breakeven += pnlcomm == 0
+            self.total_loss += pnlcomm
+
+    @property
+    def count(self):
+        return self.wins + self.losses
+
+    @property
+    def win_rate(self):
+        return self.wins / self.count * 100 if self.count else 0
+
+    @property
+    def avg_win(self):
+        return self.total_profit / self.wins if self.wins else 0
+
+    @property
+    def avg_loss(self):
+        return self.total_loss / self.losses if self.losses else 0
+
+    @property
+    def profit_factor(self):
+        """|прибыль / убыток| или None, если нет прибыльных или убыточных сделок"""
+        return abs(self.total_profit / self.total_loss) if self.wins and self.losses else None
+
+
+class StatsRecord(NamedTuple):
+    """Плоский итог StreamingStats: дёшево передаётся из процессов перебора"""
+    value: float
+    sharpe: Optional[float]
+    max_drawdown: float
+    trades: int  # Открытые за прогон сделки, как total.total у TradeAnalyzer
+    closed: int
+    won: int  # won/lost как у TradeAnalyzer (pnlcomm >= 0 - выигрыш)
+    lost: int
+    win_rate: float
+    gross_profit: float
+    gross_loss: float
+    net_profit: float
+    profit_factor: Optional[float]
+    avg_win: float
+    avg_loss: float
+    max_win: float
+    max_loss: float
+
+
+class RunState:
+    """Состояние StreamingStats: несколько чисел вместо истории прогона"""
+    __slots__ = ("value", "peak", "max_drawdown", "year_end", "value_start", "last_value",
+                 "year_return", "returns", "opened", "trades")
+
+    def __init__(self, value):
+        self.value = value
+        self.peak = float("-inf")
+        self.max_drawdown = 0.0
+        self.year_end = float("-inf")  # Число Backtrader начала следующего года
+        self.value_start = value  # Капитал на конец прошлого года
+        self.last_value = value
+        self.year_return = None  # Доходность текущего года на последний бар
+        self.returns = []  # Доходности закончившихся лет: по числу лет, а не баров
+        self.opened = 0
+        self.trades = TradeStats()
+
+
+class StreamingStats(Analyzer):
+    """Капитал, Sharpe, просадка и статистика сделок одним анализатором
+
+    Sharpe - как SharpeRatio по умолчанию (годовые доходности,
+    riskfreerate 1%, стандартное отклонение по генеральной совокупности),
+    просадка - как max.drawdown у DrawDown.
+    """
+    params = (
+        ("riskfreerate", 0.01),
+    )
+
+    def start(self):
+        self.state = RunState(self.strategy.broker.getvalue())
+
+    def notify_fund(self, cash, value, fundvalue, shares):
+        state = self.state
+        state.value = value
+        if value > state.peak:
+            state.peak = value
+
+    def notify_trade(self, trade):
+        if trade.justopened:
+            self.state.opened += 1
+        elif trade.isclosed:
+            self.state.trades.add(trade.pnlcomm)
+
+    def next(self):
+        state = self.state
+        dtnum = self.strategy.datetime[0]
+        if dtnum >= state.year_end:
+            # Новый год: доходность прошлого закончена, отсчёт от его последнего капитала
+            if state.year_return is not None:
+                state.returns.append(state.year_return)
+            state.value_start = state.last_value
+            state.year_end = date2num(datetime(num2date(dtnum).year + 1, 1, 1))
+
+        value = state.value
+        state.year_return = (value / state.value_start) - 1.0
+        state.last_value = value
+
+        drawdown = 100.0 * (state.peak - value) / state.peak
+        if drawdown > state.max_drawdown:
+            state.max_drawdown = drawdown
+
+    def sharpe(self):
+        """Коэффициент Шарпа по годовым доходностям (None, если не считается)"""
+        state = self.state
+        returns = state.returns + ([state.year_return] if state.year_return is not None else [])
+        if not returns:
+            return None
+        rate = pow(1.0 + self.p.riskfreerate, 1.0 / 1) - 1.0
+        ret_free = [r - rate for r in returns]
+        ret_free_avg = math.fsum(ret_free) / len(ret_free)
+        retdev = math.sqrt(math.fsum([(x - ret_free_avg) ** 2.0 for x in ret_free]) / len(ret_free))
+        try:
+            return ret_free_avg / retdev
+        except ZeroDivisionError:
+            return None
+
+    def get_analysis(self):
+        state = self.state
+        trades = state.trades
+        return StatsRecord(
+            value=self.strategy.broker.getvalue(),
+            sharpe=self.sharpe(),
+            max_drawdown=state.max_drawdown,
+            trades=state.opened,
+            closed=trades.count,
+            won=trades.wins + trades.breakeven,
+            lost=trades.losses - trades.breakeven,
+            win_rate=trades.win_rate,
+            gross_profit=trades.total_profit,
+            gross_loss=trades.total_loss,
+            net_profit=trades.total_profit + trades.total_loss,
+            profit_factor=trades.profit_factor,
+            avg_win=trades.avg_win,
+            avg_loss=trades.avg_loss,
+            max_win=trades.max_win,
+            max_loss=trades.max_loss,
+        )
+
+
+class EquityCurve(Analyzer):
+    """Капитал на каждом баре: {"datetime": [...], "value": [...]}"""
+
+    def start(self):
+        self.datetimes = []
+        self.values = []
+
+    def next(self):
+        self.datetimes.append(self.data.datetime[0])
+        self.values.append(self.strategy.broker.getvalue())
+
+    def get_analysis(self):
+        return {"datetime": self.datetimes, "value": self.values}
@@ -0,0 +1,156 @@
+import argparse
+import itertools
+import os
+import time
+from datetime import datetime
+from multiprocessing import Pool
+from os.path import abspath
+
+from candle_store import CandleStore, ensure_store
+from events import quiet
+from run_setup import BROKER, setup_broker
+
+# Перебор параметров ImbalanceStrategy на всех ядрах.
+# Свечи читаются из бинарного файла candle_store (np.memmap): каждый процесс
+# только отображает его в память, страницы общие через кэш ОС.
+# Точки, уже посчитанные раньше (result_cache.py), берутся из кэша и в пул
+# не попадают: повторный перебор с расширенной сеткой считает только новые.
+# Backtrader и стратегия импортируются только в make_cerebro: GRID и
+# param_grid берёт batch_eval.py, которому Backtrader не нужен.
+# python sweep.py --imbalance 0.3 0.5 0.7 --profit 0.3 0.5 --stop-loss 2 3
+
+GRID = {
+    "imbalance": [0.3, 0.5, 0.7],
+    "profit": [0.3, 0.5, 0.7],
+    "stop_loss": [2.0],
+    "take_profit": [1.5],
+}
+
+_worker = {}  # Состояние процесса-исполнителя: хранилище и настройки прогона
+
+
+def param_grid(grid):
+    """Все комбинации параметров: {"a": [1, 2]} -> [{"a": 1}, {"a": 2}]"""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+def init_worker(store_path, fromdate, todate, broker, cache):
+    """Инициализация процесса: открываем хранилище один раз"""
+    _worker["store"] = CandleStore(store_path)
+    _worker["fromdate"] = fromdate
+    _worker["todate"] = todate
+    _worker["broker"] = broker
+    if cache:
+        from result_cache import ResultCache
+        _worker["cache"] = ResultCache()
+    else:
+        _worker["cache"] = None
+
+
+def make_cerebro(store, params, fromdate, todate, broker):
+    """Cerebro одного бэктеста перебора"""
+    from backtrader import Cerebro
+    from store_feed import StoreData
+    from strategy_imbalance import ImbalanceStrategy
+    from streaming_stats import StreamingStats
+
+    cerebro = Cerebro(stdstats=False)  # Наблюдатели нужны только для графика
+    cerebro.adddata(StoreData(dataname=store, fromdate=fromdate, todate=todate))
+    cerebro.addstrategy(ImbalanceStrategy, debug=False, vectorized=True, **params)
+    setup_broker(cerebro, broker)
+
+    cerebro.addanalyzer(StreamingStats, _name='stats')  # Sharpe, DrawDown и TradeAnalyzer в одном
+    return cerebro
+
+
+def run_one(params):
+    """Один бэктест с заданными параметрами, результат плоским словарём"""
+    cerebro = make_cerebro(_worker["store"], params, _worker["fromdate"], _worker["todate"], _worker["broker"])
+    cache = _worker["cache"]
+    with quiet():  # print в notify_* не нужен в переборе
+        strat = (cache.run(cerebro) if cache else cerebro.run())[0]
+    return dict(params, **strat.analyzers.stats.get_analysis()._asdict())
+
+
+def run_sweep(data_path, grid, fromdate=None, todate=None, workers=None, broker=None, cache=True):
+    """Прогон всей сетки параметров в пуле процессов
+
+    С cache точки, которые уже есть в кэше результатов, не пересчитываются.
+    Возвращает (список результатов, время в секундах, сколько взято из кэша).
+    """
+    store = ensure_store(data_path)  # Дальше все процессы читают .bin
+    broker = broker or BROKER
+    started = time.perf_counter()
+    results, points = [], param_grid(grid)
+    if cache:
+        from result_cache import ResultCache
+        results_cache, left = ResultCache(), []
+        for params in points:
+            cached = results_cache.lookup(make_cerebro(store, params, fromdate, todate, broker))
+            if cached is not None:
+                results.append(dict(params, **cached.analyzers.stats.get_analysis()._asdict()))
+            else:
+                left.append(params)
+        points = left
+    cached = len(results)
+
+    if points:
+        workers = min(workers or os.cpu_count() or 1, len(points))
+        initargs = (store.path, fromdate, todate, broker, cache)
+        with Pool(workers, initializer=init_worker, initargs=initargs) as pool:
+            results.extend(pool.imap_unordered(run_one, points))
+    return results, time.perf_counter() - started, cached
+
+
+def print_table(results, sort_by="value"):
+    """Сводная таблица результатов, лучшие сверху"""
+    results = sorted(results, key=lambda r: r[sort_by] if r[sort_by] is not None else float("-inf"),
+                     reverse=True)
+    print(f"{'imbalance':>9} {'profit':>7} {'SL':>5} {'TP':>5} | {'Капитал':>10} {'Sharpe':>7} "
+          f"{'MaxDD%':>7} {'Сделок':>6} {'Приб.':>5} {'Убыт.':>5}")
+    for r in results:
+        sharpe = f"{r['sharpe']:.2f}" if r['sharpe'] is not None else "N/A"
+        print(f"{r['imbalance']:>9} {r['profit']:>7} {r['stop_loss']:>5} {r['take_profit']:>5} | "
+              f"{r['value']:>10.2f} {sharpe:>7} {r['max_drawdown']:>7.2f} "
+              f"{r['trades']:>6} {r['won']:>5} {r['lost']:>5}")
+
+
+def write_csv(results, path):
+    """Результаты в CSV для дальнейшего анализа"""
+    columns = list(results[0])
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(",".join(columns) + "\n")
+        for r in results:
+            file.write(",".join("" if r[c] is None else str(r[c]) for c in columns) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перебор параметров ImbalanceStrategy")
+    parser.add_argument("--data", default="./data/BTCUSDT_15.csv", help="CSV из TickerGrub или .bin")
+    parser.add_argument("--fromdate", default="2022-01-01")
+    parser.add_argument("--todate", default="2025-10-01")
+    parser.add_argument("--workers", type=int, default=None, help="Процессов (по умолчанию все ядра)")
+    parser.add_argument("--sort", default="value", help="Колонка сортировки таблицы")
+    parser.add_argument("--out", default=None, help="Сохранить таблицу в CSV")
+    parser.add_argument("--no-cache", action="store_true", help="Считать все точки заново, без кэша результатов")
+    for name, values in GRID.items():
+        parser.add_argument("--" + name.replace("_", "-"), dest=name, type=float, nargs="+", default=values)
+    args = parser.parse_args()
+
+    grid = {name: getattr(args, name) for name in GRID}
+    results, elapsed, cached = run_sweep(abspath(args.data), grid,
+                                         fromdate=datetime.fromisoformat(args.fromdate),
+                                         todate=datetime.fromisoformat(args.todate),
+                                         workers=args.workers, cache=not args.no_cache)
+
+    print_table(results, args.sort)
+    print(f"\n⚡ {len(results)} бэктестов за {elapsed:.1f} c: {len(results) / elapsed:.2f} бэктестов/с"
+          + (f" (из кэша: {cached})" if cached else ""))
+    if args.out:
+        write_csv(results, args.out)
+        print(f"✅ Результаты сохранены в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
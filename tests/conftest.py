@@ -0,0 +1,19 @@
+import sys
+from os.path import abspath, dirname
+
+import pytest
+
+# Модули проекта лежат в корне репозитория, а не в пакете
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def make_candles(tmp_path_factory):
+    """Синтетический CSV в формате TickerGrub: make_candles(bars, minutes=15, seed=0, ...) -> путь"""
+    from bench_memory import make_minutes
+
+    def make(bars, minutes=15, seed=0, **kwargs):
+        path = str(tmp_path_factory.mktemp("candles") / f"SYN_{minutes}.csv")
+        make_minutes(path, 0, seed=seed, minutes=minutes, bars=bars, **kwargs)
+        return path
+    return make
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from batch_eval import grid_arrays, run_batch
+from candle_store import ensure_store
+from kernel import run_imbalance, store_arrays
+from run_setup import BROKER
+
+# Один проход по барам для многих наборов (batch_eval.run_batch) против
+# kernel.run_imbalance по одному набору: итог и сделки должны совпасть
+# точно. В сетках есть наборы без единого сигнала: пороги быстрого
+# пропуска баров (bounds) считаются по наборам без позиции, и такие
+# наборы не должны прятать сигналы остальных.
+
+GRIDS = {
+    "mixed": {"imbalance": [0.1, 0.3, 5.0], "profit": [0.1, 0.3, 5.0],
+              "stop_loss": [1.0, 2.0], "take_profit": [0.5, 1.5]},
+    "no_signals": {"imbalance": [5.0, 8.0], "profit": [5.0], "stop_loss": [2.0], "take_profit": [1.5]},
+    "one_signalling": {"imbalance": [9.0, 0.2], "profit": [9.0, 0.2], "stop_loss": [1.0], "take_profit": [1.0]},
+}
+
+
+@pytest.fixture(scope="module")
+def store(make_candles):
+    return ensure_store(make_candles(6000, seed=5, price=100.0))
+
+
+def expected(arrays, params, broker):
+    """Итоги набора по kernel.run_imbalance в тех же полях, что у run_batch"""
+    single = run_imbalance(*arrays, cash=broker["cash"], stake=broker["stake"],
+                           commission=broker["commission"], **params)
+    pnl = single["trades"]["pnlcomm"]
+    won = pnl > 0
+    return {
+        "value": single["value"],
+        "trades": len(pnl),
+        "won": int(won.sum()),
+        "lost": int((~won).sum()),
+        "gross_profit": float(pnl[won].sum()),
+        "gross_loss": float(pnl[~won].sum()),
+        "best": float(pnl.max()) if len(pnl) else 0.0,
+        "worst": float(pnl.min()) if len(pnl) else 0.0,
+    }
+
+
+def check(arrays, grid, broker=BROKER):
+    params = grid_arrays(grid)
+    results = run_batch(*arrays, cash=broker["cash"], stake=broker["stake"],
+                        commission=broker["commission"], **params)
+    traded = 0
+    for j in range(len(params["imbalance"])):
+        point = {name: column[j].item() for name, column in params.items()}
+        want = expected(arrays, point, broker)
+        got = {name: results[name][j].item() for name in want}
+        assert got["value"] == want["value"], point
+        assert got["trades"] == want["trades"] and got["won"] == want["won"] and got["lost"] == want["lost"], point
+        assert np.isclose(got["gross_profit"], want["gross_profit"], rtol=1e-12, atol=1e-9), point
+        assert np.isclose(got["gross_loss"], want["gross_loss"], rtol=1e-12, atol=1e-9), point
+        assert got["best"] == want["best"] and got["worst"] == want["worst"], point
+        traded += want["trades"] > 0
+    return traded
+
+
+@pytest.mark.parametrize("name", GRIDS)
+def test_batch_matches_kernel(store, name):
+    traded = check(store_arrays(store), GRIDS[name])
+    assert (traded == 0) == (name == "no_signals")
+
+
+def test_batch_matches_kernel_on_period(store):
+    arrays = store_arrays(store, datetime(2022, 1, 10), datetime(2022, 2, 10))
+    assert check(arrays, GRIDS["mixed"])
+
+
+def test_batch_matches_kernel_per_bar_fills(store):
+    # datetime=None: ордер исполняется на следующем баре, а не в следующие сутки
+    arrays = store_arrays(store)[:4] + (None,)
+    assert check(arrays, GRIDS["mixed"])
+
+
+def test_batch_margin_rejections(store):
+    # Комиссия больше выручки шорта: ни один вход не проходит, как в Book.can_open
+    broker = dict(BROKER, cash=1, stake=1, commission=1.5)
+    assert check(store_arrays(store), GRIDS["mixed"], broker) == 0
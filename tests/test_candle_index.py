@@ -0,0 +1,181 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from backtrader import Cerebro, Strategy, TimeFrame
+
+from data.candle_index import build_index
+from main import MyCSVData
+from store_feed import indexed_csv_class
+
+# Индекс CSV (data/candle_index.py) на маленьких файлах: время, смещения,
+# пропуски, повторы, нулевой объём, испорченные строки, CRLF и файл без
+# перевода строки в конце. Фид, сдвинутый по индексу на fromdate, должен
+# дать те же бары, что и полный разбор GenericCSVData.
+
+HEADER = "datetime,open,high,low,close,volume"
+START = datetime(2024, 3, 1)
+STEP = timedelta(minutes=15)
+ROWS = 4 * 96  # Четверо суток: запас в сутки у row_at виден
+
+
+def row(when, volume="10.5"):
+    price = 100 + when.hour
+    return f"{when:%Y-%m-%d %H:%M:%S},{price},{price + 2},{price - 1},{price + 1},{volume}"
+
+
+def candle_times():
+    """Время свечей: пропуски через полночь и внутри суток, два повтора"""
+    times = [START + i * STEP for i in range(ROWS)]
+    missing = set(range(90, 100)) | {200, 201, 202}
+    times = [t for i, t in enumerate(times) if i not in missing]
+    times.insert(150, times[149])  # Повтор
+    times.insert(300, times[299])
+    return times
+
+
+def lines(zero_volume=()):
+    volumes = {i: v for i, v in zip(zero_volume, ["0", "0.0", "0.00000000", "000"])}
+    return [row(t, volumes.get(i, "10.5")) for i, t in enumerate(candle_times())]
+
+
+def write_csv(path, rows, newline="\n", trailing=True):
+    text = newline.join([HEADER] + rows) + (newline if trailing else "")
+    path.write_bytes(text.encode("ascii"))
+    return str(path)
+
+
+def as_epoch(text):
+    return int(datetime.strptime(text[:19], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp())
+
+
+class Recorder(Strategy):
+    def start(self):
+        self.bars = []
+
+    def next(self):
+        data = self.data
+        bar = (data.datetime[0], data.open[0], data.high[0], data.low[0], data.close[0], data.volume[0])
+        self.bars.append(bar + ((data.gap[0],) if hasattr(data.lines, "gap") else ()))
+
+
+def run_bars(feed):
+    cerebro = Cerebro(stdstats=False)
+    cerebro.adddata(feed)
+    cerebro.addstrategy(Recorder)
+    return cerebro.run()[0].bars
+
+
+def feeds(path, index, **kwargs):
+    """Бары полного разбора и бары фида, сдвинутого по индексу (без линии gap)"""
+    full = run_bars(MyCSVData(dataname=path, **kwargs))
+    indexed = run_bars(indexed_csv_class(MyCSVData)(dataname=path, index=index, **kwargs))
+    return full, [bar[:-1] for bar in indexed]
+
+
+def fromdates():
+    times = candle_times()
+    return [
+        None,
+        START - timedelta(days=3),  # До начала файла
+        START + timedelta(hours=5, minutes=7),  # Между барами
+        times[150],  # На повторе
+        START + 95 * STEP,  # Внутри пропуска
+        START + timedelta(days=2),  # Ровно на полночи
+        times[-1],  # Последний бар
+        times[-1] + timedelta(days=2),  # После конца файла
+    ]
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+@pytest.mark.parametrize("trailing", [True, False])
+def test_index_rows(tmp_path, newline, trailing):
+    rows = lines(zero_volume=[3, 150, 151, 400])
+    path = write_csv(tmp_path / "X_15.csv", rows, newline, trailing)
+    index = build_index(path)
+    data = open(path, "rb").read()
+
+    indexed = rows if trailing else rows[:-1]  # Недописанная строка в индекс не входит
+    assert len(index) == len(indexed)
+    assert index.epochs.tolist() == [as_epoch(line) for line in indexed]
+    assert index.step == 900
+    # Смещение - начало своей строки, сразу после перевода строки
+    for line, offset in zip(indexed, index.offsets.tolist()):
+        assert data[offset - 1:offset] == b"\n"
+        assert data[offset:offset + len(line)] == line.encode("ascii")
+
+    assert index.gaps.tolist() == [90, 191]
+    assert index.missing.tolist() == [10, 3]
+    assert index.duplicates.tolist() == [150, 300]
+    assert index.zero_volume.tolist() == [i for i in [3, 150, 151, 400] if i < len(indexed)]
+    assert len(index.bad) == 0
+
+
+def test_zero_volume_formats(tmp_path):
+    volumes = ["0", "0.0", "0.00000000", "000", "10", "0.001", "100000.0", "1e-05", "0.10000000000000000000001"]
+    rows = [row(START + i * STEP, volume) for i, volume in enumerate(volumes)]
+    index = build_index(write_csv(tmp_path / "X_15.csv", rows))
+    assert index.zero_volume.tolist() == [0, 1, 2, 3]
+
+
+def test_malformed_rows(tmp_path):
+    rows = lines()
+    rows[10] = rows[10].replace("2024-03-01", "2024-03-O1")  # Буква вместо цифры
+    rows[20] = rows[20][:11] + "1x" + rows[20][13:]
+    rows.insert(30, "2024-03-01 07")  # Обрывок строки: в индекс не входит
+    rows.insert(31, "")  # Пустая строка
+    path = write_csv(tmp_path / "X_15.csv", rows)
+    index = build_index(path)
+
+    assert index.bad.tolist() == [10, 20]
+    assert len(index) == len(rows) - 2
+    data = open(path, "rb").read()
+    assert data[index.offsets[30]:].startswith(rows[32].encode("ascii"))
+    # Испорченная строка - как пропавшая свеча, соседние пропуски и повторы на месте
+    assert index.gaps.tolist() == [11, 21, 90, 191]
+    assert index.missing.tolist() == [1, 1, 10, 3]
+    assert index.duplicates.tolist() == [150, 300]
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+@pytest.mark.parametrize("trailing", [True, False])
+@pytest.mark.parametrize("timeframe", [TimeFrame.Minutes, TimeFrame.Days])
+def test_seek_matches_full_parse(tmp_path, newline, trailing, timeframe):
+    rows = lines(zero_volume=[3, 150])
+    path = write_csv(tmp_path / "X_15.csv", rows, newline, trailing)
+    index = build_index(path)
+
+    for fromdate in fromdates():
+        kwargs = dict(timeframe=timeframe, compression=15 if timeframe == TimeFrame.Minutes else 1)
+        if fromdate:
+            kwargs["fromdate"] = fromdate
+        full, indexed = feeds(path, index, **kwargs)
+        assert indexed == full, fromdate
+
+
+def test_seek_skips_malformed_rows(tmp_path):
+    rows = lines()
+    dirty = rows[:]
+    dirty[10] = dirty[10].replace("2024-03-01", "2024-03-O1")
+    clean_path = write_csv(tmp_path / "clean_15.csv", rows)
+    dirty_path = write_csv(tmp_path / "dirty_15.csv", dirty)
+    index = build_index(dirty_path)
+
+    # Испорченная строка до fromdate - 1 сутки: фид по индексу её не читает
+    fromdate = START + timedelta(days=2)
+    kwargs = dict(timeframe=TimeFrame.Minutes, compression=15, fromdate=fromdate)
+    indexed = run_bars(indexed_csv_class(MyCSVData)(dataname=dirty_path, index=index, **kwargs))
+    full = run_bars(MyCSVData(dataname=clean_path, **kwargs))
+    assert [bar[:-1] for bar in indexed] == full
+
+
+def test_gap_line_follows_index(tmp_path):
+    rows = lines()
+    path = write_csv(tmp_path / "X_15.csv", rows)
+    index = build_index(path)
+    flags = index.flags()
+
+    for fromdate in fromdates()[1:6]:
+        bars = run_bars(indexed_csv_class(MyCSVData)(
+            dataname=path, index=index, timeframe=TimeFrame.Minutes, compression=15, fromdate=fromdate))
+        first = index.row_at(int(fromdate.replace(tzinfo=timezone.utc).timestamp()))
+        assert [bar[-1] for bar in bars] == flags[first:first + len(bars)].astype(float).tolist()
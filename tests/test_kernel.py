@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+
+from candle_store import ensure_store
+from kernel import validate
+from run_setup import BROKER
+
+# NumPy-ядро (kernel.py) против Cerebro сделка в сделку: исполнения,
+# pnlcomm сделок, капитал по барам и итог (kernel.validate). Свечи
+# синтетические, таймфрейм дневной, как у StoreData в скриптах.
+
+CASES = [
+    ("imbalance", {"imbalance": 0.3, "profit": 0.3}),
+    ("imbalance", {"imbalance": 0.1, "profit": 0.2, "stop_loss": 1.0, "take_profit": 0.5}),
+    ("imbalance", {"imbalance": 5.0, "profit": 5.0}),  # Сигналов нет
+    ("candles", {"ExitCandles": 5}),
+    ("candles", {"ExitCandles": 1}),
+]
+
+
+@pytest.fixture(scope="module")
+def store(make_candles):
+    return ensure_store(make_candles(6000, seed=11, price=100.0))
+
+
+@pytest.mark.parametrize("strategy, params", CASES)
+def test_kernel_matches_cerebro(store, strategy, params):
+    assert validate(store, strategy, params) == []
+
+
+@pytest.mark.parametrize("strategy, params", CASES[:1] + CASES[3:4])
+def test_kernel_matches_cerebro_on_period(store, strategy, params):
+    assert validate(store, strategy, params, fromdate=datetime(2022, 1, 10), todate=datetime(2022, 2, 10)) == []
+
+
+@pytest.mark.parametrize("strategy, params, broker", [
+    # Комиссия больше выручки шорта: BackBroker отклоняет ордер (Margin)
+    ("imbalance", {"imbalance": 0.3, "profit": 0.3}, dict(BROKER, cash=1, stake=1, commission=1.5)),
+    # На покупку хватает не всегда: часть ордеров отклоняется
+    ("candles", {"ExitCandles": 5}, dict(BROKER, cash=250, stake=2.5)),
+])
+def test_margin_rejections_match(store, strategy, params, broker):
+    assert validate(store, strategy, params, broker=broker) == []
@@ -0,0 +1,82 @@
+from collections import UserDict
+
+import pytest
+from backtrader import Cerebro, TimeFrame
+from backtrader.brokers import BackBroker
+
+import low_memory
+from candle_store import ensure_store
+from events import quiet, silent_recorder
+from low_memory import ForgetFinished, low_memory_cerebro
+from main import CandlesOnly
+from run_setup import setup_broker
+from store_feed import StoreData
+from strategy_imbalance import ImbalanceStrategy
+from streaming_stats import StreamingStats
+
+# Профиль low_memory_cerebro() на синтетических минутках: итоги те же, что
+# у обычного Cerebro() без preload, а ForgetFinished действительно чистит
+# внутренние списки Backtrader - и не трогает их, если они устроены иначе.
+# С preload итоги CandlesOnly чуть другие: close[-1] и close[-2] на первых
+# барах берутся с конца ряда (см. kernel.run_candles).
+
+STRATEGIES = [
+    (CandlesOnly, {"ExitCandles": 5}),
+    (ImbalanceStrategy, {"imbalance": 0.05, "profit": 0.05, "stop_loss": 0.2, "take_profit": 0.2}),
+]
+
+
+def plain_cerebro():
+    return Cerebro(stdstats=False, preload=False)
+
+
+@pytest.fixture(scope="module")
+def store(make_candles):
+    return ensure_store(make_candles(20000, minutes=1, seed=9, price=100.0))
+
+
+def run(cerebro, store, strategy, params):
+    cerebro.adddata(StoreData(dataname=store, timeframe=TimeFrame.Minutes, compression=1))
+    cerebro.addstrategy(strategy, debug=False, recorder=silent_recorder(), **params)
+    setup_broker(cerebro)
+    cerebro.addanalyzer(StreamingStats, _name="stats")
+    with quiet():
+        return cerebro.run()[0]
+
+
+@pytest.mark.parametrize("strategy, params", STRATEGIES)
+def test_same_results_as_cerebro(store, strategy, params):
+    plain = run(plain_cerebro(), store, strategy, params)
+    low = run(low_memory_cerebro(), store, strategy, params)
+
+    expected = plain.analyzers.stats.get_analysis()
+    assert expected.trades > 50, "в синтетике должны быть сделки"
+    assert low.analyzers.stats.get_analysis() == expected
+    assert low.broker.getvalue() == plain.broker.getvalue()
+
+    # Истории ордеров и сделок не растут с числом баров
+    keep = ForgetFinished.params.keep
+    assert len(plain.broker.orders) > 2 * keep
+    assert len(low.broker.orders) < keep and len(low._orders) < keep
+    assert len(low.broker._ocos) < keep
+    assert all(len(history) < keep for trades in low._trades.values() for history in trades.values())
+
+
+def test_guard_leaves_unknown_state_alone(store, monkeypatch):
+    # Брокер с другим устройством _ocos: ForgetFinished выключается с
+    # предупреждением, итоги не меняются
+    init = BackBroker.init
+
+    def init_userdict(self):
+        init(self)
+        self._ocos = UserDict()
+
+    monkeypatch.setattr(BackBroker, "init", init_userdict)
+    strategy, params = STRATEGIES[0]
+    plain = run(plain_cerebro(), store, strategy, params)
+    low = run(low_memory_cerebro(), store, strategy, params)
+
+    assert not low_memory.private_state_ok(low)
+    assert not low.analyzers.forgetfinished.active
+    assert low.analyzers.stats.get_analysis() == plain.analyzers.stats.get_analysis()
+    assert len(low.broker.orders) == len(plain.broker.orders) > 2 * ForgetFinished.params.keep
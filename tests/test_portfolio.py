@@ -0,0 +1,41 @@
+import pytest
+from backtrader import Cerebro
+
+from portfolio import run_portfolio
+
+# Портфель (portfolio.py) на фидах, которые начинаются и кончаются в разное
+# время: общая шкала SharedClock продвигает только фиды с баром на шаге,
+# поэтому сделки каждого фида должны быть те же, что в отдельном прогоне
+# обычного Cerebro на этом фиде.
+
+FEEDS = [
+    dict(bars=4000, seed=11, start="2022-01-01"),
+    dict(bars=3000, seed=12, start="2022-01-20 07:45:00"),  # Позже и не с полуночи
+    dict(bars=2500, seed=13, start="2022-02-10", price=2000.0),  # Кончается раньше первого
+]
+STRATEGIES = [
+    ("imbalance", {"imbalance": 0.3, "profit": 0.3}),
+    ("candles", {}),
+]
+
+
+@pytest.fixture(scope="module")
+def paths(make_candles):
+    return [make_candles(**feed) for feed in FEEDS]
+
+
+@pytest.mark.parametrize("strategy, params", STRATEGIES)
+def test_staggered_feeds_match_single_runs(paths, strategy, params):
+    report = run_portfolio(paths, strategy, params)
+    single = [run_portfolio([path], strategy, params, cerebro_class=Cerebro)["feeds"][0] for path in paths]
+
+    assert [feed["bars"] for feed in report["feeds"]] == [feed["bars"] for feed in FEEDS]
+    assert all(feed["trades"] > 5 for feed in report["feeds"]), "в синтетике должны быть сделки"
+    assert report["feeds"] == single
+    assert report["summary"].closed == sum(feed["trades"] for feed in single)
+
+    # Шагов общей шкалы - по числу разных времён, фиды пересекаются
+    assert max(feed["bars"] for feed in FEEDS) < report["steps"] < report["bars"]
+
+    # Тот же портфель в обычном Cerebro (опрос всех фидов на каждом шаге)
+    assert run_portfolio(paths, strategy, params, cerebro_class=Cerebro)["feeds"] == report["feeds"]
@@ -0,0 +1,54 @@
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from data.candle_index import INTERVAL_SECONDS, local_to_utc, utc_to_local
+from resample import WEEK_ORIGIN, aggregate
+
+# Границы старших баров - по UTC, как у Bybit, в любом часовом поясе
+# и в сутки перевода часов. Время баров - местное, как в CSV.
+
+START = int(datetime(2022, 3, 1, tzinfo=timezone.utc).timestamp())
+END = int(datetime(2022, 11, 20, tzinfo=timezone.utc).timestamp())
+STEP = 900
+
+
+@pytest.fixture(params=["UTC", "Europe/Moscow", "America/New_York", "Asia/Kolkata", "Australia/Lord_Howe"])
+def zone(request, monkeypatch):
+    monkeypatch.setenv("TZ", request.param)
+    time.tzset()
+    yield request.param
+    monkeypatch.undo()
+    time.tzset()
+
+
+def local_naive(unix_times):
+    """Как TickerGrub пишет время в CSV: datetime.fromtimestamp, прочитанный как UTC"""
+    return np.array([int(datetime.fromtimestamp(t).replace(tzinfo=timezone.utc).timestamp())
+                     for t in unix_times.tolist()], dtype=np.int64)
+
+
+def test_local_utc_roundtrip(zone):
+    unix_times = np.arange(START, END, STEP, dtype=np.int64)
+    local = utc_to_local(unix_times)
+    assert (local == local_naive(unix_times)).all()
+    assert (local_to_utc(local) == unix_times).all()
+
+
+@pytest.mark.parametrize("interval", ["60", "120", "240", "D", "W"])
+def test_buckets_are_utc_aligned(zone, interval):
+    unix_times = np.arange(START, END, STEP, dtype=np.int64)
+    ohlcv = np.ones((5, len(unix_times)))
+    epochs, result = aggregate(utc_to_local(unix_times), ohlcv, interval)
+
+    seconds = INTERVAL_SECONDS[interval]
+    origin = WEEK_ORIGIN if interval == "W" else 0
+    buckets = (unix_times - origin) // seconds
+    expected = np.unique(buckets) * seconds + origin
+    assert (epochs == local_naive(expected)).all()
+    # Полные бары одинаковой длины, в том числе в сутки перевода часов
+    counts = np.bincount(buckets - buckets[0])
+    assert (result[4] == counts[counts > 0]).all()
+    assert (counts[1:-1] == seconds // STEP).all()
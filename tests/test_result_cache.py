@@ -0,0 +1,145 @@
+import os
+import textwrap
+from datetime import datetime
+
+import numpy as np
+import pytest
+from backtrader import Cerebro, TimeFrame
+
+import result_cache
+from candle_store import CandleStore, ensure_store, to_epoch, write_store
+from events import quiet, silent_recorder
+from result_cache import CachedResult, ResultCache, run_spec
+from run_setup import setup_broker
+from store_feed import StoreData
+from strategy_imbalance import ImbalanceStrategy
+from streaming_stats import StreamingStats
+
+# Кэш итогов (result_cache.py): попадание повторяет итоги прогона, а всё,
+# от чего зависит результат, - параметры, свечи периода, исходный код
+# модулей проекта - меняет ключ. Ошибка здесь не падает, а тихо отдаёт
+# старый результат.
+
+BARS = 4000
+FROMDATE = datetime(2022, 1, 5)
+TODATE = datetime(2022, 2, 5)
+PARAMS = dict(imbalance=0.3, profit=0.3)
+
+
+@pytest.fixture(scope="module")
+def store_path(make_candles):
+    return ensure_store(make_candles(BARS, seed=3)).path
+
+
+def make_cerebro(store_path, strategy=ImbalanceStrategy, **params):
+    cerebro = Cerebro(stdstats=False)
+    cerebro.adddata(StoreData(dataname=store_path, timeframe=TimeFrame.Minutes, compression=15,
+                              fromdate=FROMDATE, todate=TODATE))
+    cerebro.addstrategy(strategy, debug=False, recorder=silent_recorder(), **dict(PARAMS, **params))
+    setup_broker(cerebro)
+    cerebro.addanalyzer(StreamingStats, _name="stats")
+    return cerebro
+
+
+def run(cache, cerebro):
+    with quiet():
+        return cache.run(cerebro)[0]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(cache_dir=str(tmp_path / "results"))
+
+
+def test_hit_reproduces_run(store_path, cache):
+    strat = run(cache, make_cerebro(store_path, vectorized=True))
+    assert not isinstance(strat, CachedResult) and cache.misses == 1
+    trades = strat.analyzers.closed_trades.get_analysis()
+    assert trades, "в синтетике должны быть сделки"
+
+    cached = run(cache, make_cerebro(store_path, vectorized=True))
+    assert isinstance(cached, CachedResult) and cache.hits == 1
+    assert cached.value == strat.broker.getvalue()
+    assert cached.cash == strat.broker.getcash()
+    assert cached.trades == trades
+    assert cached.analyzers.stats.get_analysis() == strat.analyzers.stats.get_analysis()
+    assert cached.state == strat.report_state()
+
+    # vectorized на результат не влияет: прогон по барам берётся из той же записи
+    assert isinstance(run(cache, make_cerebro(store_path, vectorized=False)), CachedResult)
+
+
+def test_params_change_key(store_path, cache):
+    run(cache, make_cerebro(store_path))
+    assert cache.lookup(make_cerebro(store_path)) is not None
+    assert cache.lookup(make_cerebro(store_path, profit=0.31)) is None
+    assert cache.lookup(make_cerebro(store_path, skip_gaps=True)) is None
+    cerebro = make_cerebro(store_path)
+    cerebro.broker.setcommission(commission=0.001)
+    assert cache.lookup(cerebro) is None
+
+
+def test_candles_change_key(make_candles, cache):
+    path = ensure_store(make_candles(BARS, seed=4)).path
+    run(cache, make_cerebro(path))
+
+    store = CandleStore(path)
+    epochs, ohlcv = np.array(store.datetime), np.array(store.ohlcv)
+    del store
+    # Свеча далеко за периодом (с запасом в сутки): ключ тот же
+    after = np.flatnonzero(epochs > to_epoch(TODATE) + 3 * 86400)[0]
+    ohlcv[3, after] += 1
+    write_store(path, epochs, ohlcv)
+    assert cache.lookup(make_cerebro(path)) is not None
+
+    # Свеча внутри периода: ключ другой
+    inside = np.flatnonzero(epochs > to_epoch(FROMDATE))[10]
+    ohlcv[3, inside] += 1
+    write_store(path, epochs, ohlcv)
+    assert cache.lookup(make_cerebro(path)) is None
+
+
+def test_source_change_key(store_path, cache, tmp_path, monkeypatch):
+    # Стратегия в модуле, который импортирует помощника, а тот - ещё один
+    # модуль: правка на втором уровне импорта тоже меняет ключ
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "cached_strategy.py").write_text(textwrap.dedent("""
+        from cached_helper import SCALE
+        from strategy_imbalance import ImbalanceStrategy
+
+
+        class ScaledImbalance(ImbalanceStrategy):
+            def start(self):
+                super().start()
+                self.scale = SCALE
+    """))
+    (project / "cached_helper.py").write_text("from cached_deep import SCALE\n")
+    (project / "cached_deep.py").write_text("SCALE = 1\n")
+    monkeypatch.syspath_prepend(str(project))
+    monkeypatch.setattr(result_cache, "PROJECT_DIR", str(project))
+    from cached_strategy import ScaledImbalance
+
+    before = run_spec(make_cerebro(store_path, strategy=ScaledImbalance))
+    (project / "cached_deep.py").write_text("SCALE = 10\n")
+    after = run_spec(make_cerebro(store_path, strategy=ScaledImbalance))
+    assert before["source"] != after["source"]
+    assert {k: v for k, v in before.items() if k != "source"} == {k: v for k, v in after.items() if k != "source"}
+
+
+def test_evict_lru_keeps_new_entry(tmp_path):
+    cache = ResultCache(cache_dir=str(tmp_path / "results"), max_bytes=3000)
+    record = {"payload": "x" * 900}
+    for number in range(5):
+        cache.put(f"old{number}", record)
+        os.utime(cache.path(f"old{number}"), (1000 + number, 1000 + number))
+    cache.put("new", record)
+
+    names = sorted(os.listdir(cache.cache_dir))
+    assert "new.json" in names
+    assert sum(os.path.getsize(cache.path(name[:-5])) for name in names) <= cache.max_bytes
+    assert names == ["new.json", "old3.json", "old4.json"]  # Удалены самые старые
+
+    # Запись больше всего кэша: остальные удаляются, она остаётся
+    cache.put("huge", {"payload": "x" * 5000})
+    assert os.listdir(cache.cache_dir) == ["huge.json"]
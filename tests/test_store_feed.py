@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from backtrader import date2num
+
+from candle_store import EPOCH
+from store_feed import bt_datetimes
+
+# bt_datetimes считает время баров всем массивом сразу, но должно совпасть
+# с date2num бит в бит: от этого зависят фильтр fromdate/todate, границы
+# сессий и сверка с Cerebro на CSV.
+
+
+def expected(epochs):
+    return np.array([date2num(EPOCH + timedelta(seconds=epoch)) for epoch in epochs.tolist()])
+
+
+def test_random_epochs_match_date2num():
+    rng = np.random.default_rng(0)
+    epochs = rng.integers(-2 ** 31, 2 ** 33, 200000)
+    assert bt_datetimes(epochs).tobytes() == expected(epochs).tobytes()
+
+
+def test_candle_grids_match_date2num():
+    start = int((datetime(2022, 1, 1) - EPOCH).total_seconds())
+    for step in (1, 60, 900, 3600, 86400):
+        epochs = start + step * np.arange(50000, dtype=np.int64)
+        assert bt_datetimes(epochs).tobytes() == expected(epochs).tobytes(), step
+
+
+def test_edges():
+    day = 86400
+    epochs = np.array([0, -1, day - 1, day, -day, 1, 59, 3599, 3600], dtype=np.int64)
+    assert bt_datetimes(epochs).tobytes() == expected(epochs).tobytes()
+    assert len(bt_datetimes(np.array([], dtype=np.int64))) == 0
@@ -0,0 +1,85 @@
+import pytest
+from backtrader import Analyzer, Cerebro, TimeFrame, analyzers
+
+from candle_store import ensure_store
+from events import quiet, silent_recorder
+from main import CandlesOnly
+from run_setup import setup_broker
+from store_feed import StoreData
+from strategy_imbalance import ImbalanceStrategy
+from streaming_stats import StreamingStats, TradeStats
+
+# StreamingStats и TradeStats против стандартных SharpeRatio, DrawDown и
+# TradeAnalyzer в одном и том же прогоне: числа должны совпасть точно.
+# Три года 4-часовых свечей: Sharpe считается по нескольким годовым доходностям.
+
+
+class PnlList(Analyzer):
+    """pnlcomm закрытых сделок списком, как раньше копили стратегии"""
+
+    def start(self):
+        self.pnl = []
+
+    def notify_trade(self, trade):
+        if trade.isclosed:
+            self.pnl.append(trade.pnlcomm)
+
+    def get_analysis(self):
+        return self.pnl
+
+
+@pytest.fixture(scope="module")
+def store(make_candles):
+    return ensure_store(make_candles(3 * 365 * 6, minutes=240, seed=7, price=100.0))
+
+
+@pytest.mark.parametrize("strategy, params", [
+    (CandlesOnly, {"ExitCandles": 5}),
+    (ImbalanceStrategy, {"imbalance": 0.3, "profit": 0.3, "vectorized": True}),
+])
+def test_matches_stock_analyzers(store, strategy, params):
+    cerebro = Cerebro(stdstats=False)
+    cerebro.adddata(StoreData(dataname=store, timeframe=TimeFrame.Minutes, compression=240))
+    cerebro.addstrategy(strategy, debug=False, recorder=silent_recorder(), **params)
+    setup_broker(cerebro)
+    cerebro.addanalyzer(StreamingStats, _name="stats")
+    cerebro.addanalyzer(analyzers.SharpeRatio, _name="sharpe")
+    cerebro.addanalyzer(analyzers.DrawDown, _name="drawdown")
+    cerebro.addanalyzer(analyzers.TradeAnalyzer, _name="trades")
+    cerebro.addanalyzer(PnlList, _name="pnl")
+    with quiet():
+        strat = cerebro.run()[0]
+
+    stats = strat.analyzers.stats.get_analysis()
+    trades = strat.analyzers.trades.get_analysis()
+    pnl = strat.analyzers.pnl.get_analysis()
+    assert len(pnl) > 10, "в синтетике должны быть сделки"
+
+    assert stats.sharpe is not None
+    assert stats.sharpe == strat.analyzers.sharpe.get_analysis()["sharperatio"]
+    assert stats.max_drawdown == strat.analyzers.drawdown.get_analysis().max.drawdown
+    assert stats.trades == trades.total.total
+    assert stats.closed == trades.total.closed
+    assert stats.won == trades.won.total
+    assert stats.lost == trades.lost.total
+    assert stats.max_win == trades.won.pnl.max
+    assert stats.max_loss == trades.lost.pnl.max
+
+    # TradeStats стратегии - как прежние списки прибыльных и убыточных сделок
+    wins = [value for value in pnl if value > 0]
+    losses = [value for value in pnl if value <= 0]
+    stats = strat.trade_stats
+    assert (stats.wins, stats.losses) == (len(wins), len(losses))
+    assert stats.total_profit == sum(wins) and stats.total_loss == sum(losses)
+    assert stats.max_win == max(wins) and stats.max_loss == min(losses)
+    assert stats.min_loss == max(losses)
+
+
+def test_trade_stats_breakeven():
+    # pnlcomm == 0: у стратегий убыток, у TradeAnalyzer - выигрыш
+    stats = TradeStats()
+    for pnlcomm in (5.0, -2.0, 0.0, -7.0, 3.0):
+        stats.add(pnlcomm)
+    assert (stats.wins, stats.losses, stats.breakeven) == (2, 3, 1)
+    assert (stats.max_win, stats.max_loss, stats.min_loss) == (5.0, -7.0, 0.0)
+    assert stats.profit_factor == 8.0 / 9.0
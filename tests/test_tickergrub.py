@@ -0,0 +1,152 @@
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from data import TickerGrub
+from data.bybit_fake import FakeHTTP
+
+# Скачивание TickerGrub с офлайн-биржей: пропуски, перекрытия страниц,
+# перемешанный порядок и докачка. Файл сверяется с тем, что должно в нём
+# оказаться по FakeHTTP.expected_candles().
+
+INTERVAL = "15"
+STEP = TickerGrub.INTERVAL_SECONDS[INTERVAL]
+START = int(TickerGrub.HISTORY_START.timestamp())
+END = START + 3500 * STEP - 1  # 4 окна, последнее неполное
+GAPS = [
+    ((START + 990 * STEP) * 1000, (START + 1010 * STEP) * 1000),  # Через границу окон
+    ((START + 2000 * STEP) * 1000, (START + 2004 * STEP) * 1000),  # В начале окна
+    ((START + 3450 * STEP) * 1000, (START + 3499 * STEP) * 1000),  # Хвост истории
+]
+
+CLIENTS = {
+    "plain": {},
+    "gaps": {"gaps": GAPS},
+    "overlap": {"overlap": 3},
+    "shuffle": {"shuffle": True},
+    "oldest_first": {"oldest_first": True},
+    "all": {"gaps": GAPS, "overlap": 3, "shuffle": True, "oldest_first": True},
+}
+
+
+def make_client(name):
+    return FakeHTTP(STEP * 1000, **CLIENTS[name])
+
+
+def expected_csv(client, end=END):
+    candles = client.expected_candles(START * 1000, end * 1000 + 999)
+    return TickerGrub.CSV_HEADER + "\n" + TickerGrub.format_rows(candles)
+
+
+def read_csv(ticker, interval=INTERVAL):
+    with open(TickerGrub.csv_file_for(ticker, interval), encoding="utf-8") as file:
+        return file.read()
+
+
+def grub(client, end=END, workers=4):
+    return TickerGrub.start_grub(client, "SYNUSDT", INTERVAL, workers=workers, rate=0, end_time=end)
+
+
+@pytest.fixture(autouse=True)
+def in_tmp(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # start_grub пишет CSV в текущую папку
+
+
+@pytest.mark.parametrize("name", CLIENTS)
+def test_fresh_download(name):
+    client = make_client(name)
+    written = grub(client)
+
+    expected = expected_csv(client)
+    assert read_csv("SYNUSDT") == expected
+    assert written == expected.count("\n") - 1
+
+
+@pytest.mark.parametrize("name", CLIENTS)
+def test_resume_is_noop(name):
+    client = make_client(name)
+    grub(client)
+    before = read_csv("SYNUSDT")
+
+    assert grub(client) == 0
+    assert read_csv("SYNUSDT") == before
+
+
+@pytest.mark.parametrize("name", CLIENTS)
+@pytest.mark.parametrize("saved", [1, 999, 1000, 1700])
+def test_resume_after_partial_csv(name, saved):
+    client = make_client(name)
+    candles = client.expected_candles(START * 1000, END * 1000 + 999)
+    with open(TickerGrub.csv_file_for("SYNUSDT", INTERVAL), "w", encoding="utf-8") as file:
+        file.write(TickerGrub.CSV_HEADER + "\n" + TickerGrub.format_rows(candles[:saved]))
+
+    written = grub(client)
+
+    assert read_csv("SYNUSDT") == expected_csv(client)
+    assert written == len(candles) - saved
+
+
+def test_resume_picks_up_new_candles():
+    client = make_client("all")
+    grub(client, end=END - 1200 * STEP)
+    grub(client)
+    assert read_csv("SYNUSDT") == expected_csv(client)
+
+
+@pytest.mark.parametrize("name", CLIENTS)
+def test_batch_download(name):
+    client = make_client(name)
+    jobs = TickerGrub.grub_batch(["AUSDT", "BUSDT"], [INTERVAL], client=client, workers=3, rate=0, end_time=END)
+
+    expected = expected_csv(client)
+    for job in jobs:
+        assert read_csv(job.ticker) == expected
+        assert job.written == expected.count("\n") - 1
+
+    # Повторный запуск ничего не дописывает
+    jobs = TickerGrub.grub_batch(["AUSDT", "BUSDT"], [INTERVAL], client=client, rate=0, end_time=END)
+    assert [job.written for job in jobs] == [0, 0]
+    assert read_csv("AUSDT") == expected
+
+
+def test_full_window_costs_one_request():
+    client = make_client("plain")
+    windows = TickerGrub.split_windows(START, END, INTERVAL)
+    for window in windows:
+        TickerGrub.fetch_window(client, "SYNUSDT", INTERVAL, window)
+    assert client.calls == len(windows)
+
+
+def test_unaligned_window_costs_one_request():
+    # Окно после докачки начинается через секунду после последней свечи
+    client = make_client("plain")
+    window = (START + 1, START + 1000 * STEP)
+    candles = TickerGrub.fetch_window(client, "SYNUSDT", INTERVAL, window)
+    assert len(candles) == 1000
+    assert client.calls == 1
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+# 2022-11-06 02:00 EDT -> 01:00 EST: в CSV время 01:00-01:45 идёт дважды
+FALL_BACK = int(datetime(2022, 11, 6, 6, tzinfo=timezone.utc).timestamp())
+
+
+@pytest.mark.parametrize("last", [-4, -1, 0, 3, 4])
+def test_last_saved_time_fall_back(new_york, last):
+    # Хвост длиннее 4 КБ: последняя свеча на первом или втором проходе часа
+    unix_times = range(FALL_BACK - 300 * STEP, FALL_BACK + (last + 1) * STEP, STEP)
+    candles = [[str(t * 1000), "1.0", "2.0", "0.5", "1.5", "10.0"] for t in unix_times]
+    path = TickerGrub.csv_file_for("SYNUSDT", INTERVAL)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(TickerGrub.CSV_HEADER + "\n" + TickerGrub.format_rows(candles))
+
+    assert TickerGrub.last_saved_time(path) == FALL_BACK + last * STEP
@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+from backtrader import Cerebro, Strategy, TimeFrame
+
+from candle_store import ensure_store, to_epoch
+from store_feed import StoreData
+from walkforward import make_folds
+
+# Окна walk-forward (make_folds и StoreData window): бар попадает ровно в
+# одно окно test и никогда одновременно в train и test своего окна - и при
+# дневном timeframe (время бара - конец сессии), и при внутридневном, где
+# свеча 00:00 лежит ровно на границе окон.
+
+START = datetime(2022, 1, 1)
+DAYS = 20
+
+
+class Recorder(Strategy):
+    def start(self):
+        self.bars = []
+
+    def next(self):
+        data = self.data
+        self.bars.append((data.open[0], data.high[0], data.low[0], data.close[0], data.volume[0]))
+
+
+@pytest.fixture(scope="module")
+def store(make_candles):
+    return ensure_store(make_candles(DAYS * 96, seed=21))
+
+
+def window_bars(store, fromdate, todate, **kwargs):
+    cerebro = Cerebro(stdstats=False)
+    cerebro.adddata(StoreData(dataname=store, window=(to_epoch(fromdate), to_epoch(todate)), **kwargs))
+    cerebro.addstrategy(Recorder)
+    return cerebro.run()[0].bars
+
+
+@pytest.mark.parametrize("kwargs", [
+    dict(timeframe=TimeFrame.Minutes, compression=15),
+    dict(timeframe=TimeFrame.Days, compression=1),
+])
+def test_windows_do_not_overlap(store, kwargs):
+    epochs = store.datetime[:].tolist()
+    folds = make_folds(START, datetime(2022, 1, DAYS + 1), train_days=5, test_days=3)
+    assert len(folds) == 5
+
+    tested = []
+    for train_from, train_to, test_from, test_to in folds:
+        train = window_bars(store, train_from, train_to, **kwargs)
+        test = window_bars(store, test_from, test_to, **kwargs)
+        assert not set(train) & set(test)
+        # Бары окна - ровно свечи с временем в [from, to)
+        for bars, lo, hi in ((train, train_from, train_to), (test, test_from, test_to)):
+            assert len(bars) == sum(to_epoch(lo) <= epoch < to_epoch(hi) for epoch in epochs)
+        tested += test
+
+    # Окна test идут подряд: каждый бар после первого train - ровно в одном
+    everything = window_bars(store, folds[0][2], folds[-1][3], **kwargs)
+    assert len(set(everything)) == len(everything)
+    assert tested == everything
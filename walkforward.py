@@ -0,0 +1,251 @@
+import argparse
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from multiprocessing import Pool
+from os.path import abspath
+
+from backtrader import Cerebro
+from candle_store import CandleStore, ensure_store, to_epoch
+from events import quiet, silent_recorder
+from run_setup import BROKER, STRATEGIES, load_strategy, setup_broker
+from store_feed import StoreData
+from streaming_stats import EquityCurve, StreamingStats
+from sweep import param_grid
+
+# Walk-forward: параметры подбираются на скользящем окне train и
+# проверяются на следующем за ним окне test. Все окна - срезы одного
+# бинарного файла candle_store (np.memmap), CSV читается один раз.
+# Кривые капитала окон test склеиваются в одну out-of-sample кривую.
+# python walkforward.py --strategy imbalance --train-days 365 --test-days 90
+
+_worker = {}  # Состояние процесса-исполнителя: хранилище и настройки прогона
+
+
+def make_folds(fromdate, todate, train_days, test_days):
+    """Окна [(train_from, train_to, test_from, test_to)], концы не включаются
+
+    Окна test идут подряд без пропусков, последнее обрезается по todate.
+    Бар попадает в окно по времени своей свечи (StoreData window).
+    """
+    folds = []
+    train_from = fromdate
+    while True:
+        test_from = train_from + timedelta(days=train_days)
+        if test_from >= todate:
+            break
+        test_to = min(test_from + timedelta(days=test_days), todate)
+        folds.append((train_from, test_from, test_from, test_to))
+        train_from += timedelta(days=test_days)
+    return folds
+
+
+def init_worker(store_path, strategy, broker):
+    """Инициализация процесса: открываем хранилище один раз"""
+    _worker["store"] = CandleStore(store_path)
+    _worker["strategy"] = strategy
+    _worker["broker"] = broker
+
+
+def run_window(task):
+    """Бэктест на окне [fromdate, todate) с параметрами params
+
+    task - (номер окна, fromdate, todate, params, нужна ли кривая капитала).
+    """
+    fold, fromdate, todate, params, equity = task
+    _, _, fixed = STRATEGIES[_worker["strategy"]]
+
+    cerebro = Cerebro(stdstats=False)
+    cerebro.adddata(StoreData(dataname=_worker["store"], window=(to_epoch(fromdate), to_epoch(todate))))
+    cerebro.addstrategy(load_strategy(_worker["strategy"]), debug=False, recorder=silent_recorder(), **fixed, **params)
+    setup_broker(cerebro, _worker["broker"])
+    cerebro.addanalyzer(StreamingStats, _name='stats')
+    if equity:
+        cerebro.addanalyzer(EquityCurve, _name='equity')
+
+    with quiet():  # Итоги stop() не нужны в переборе
+        strat = cerebro.run()[0]
+
+    stats = strat.analyzers.stats.get_analysis()
+    result = dict(
+        fold=fold,
+        params=params,
+        value=stats.value,
+        trades=stats.trades,
+        won=stats.won,
+        lost=stats.lost,
+    )
+    if equity:
+        result["equity"] = strat.analyzers.equity.get_analysis()
+    return result
+
+
+def stitch_equity(test_results, cash):
+    """Склейка кривых капитала окон test: каждое окно продолжает предыдущее
+
+    Доходность внутри окна сохраняется, капитал на входе в окно -
+    капитал на выходе из предыдущего.
+    """
+    datetimes, values = [], []
+    capital = cash
+    for result in sorted(test_results, key=lambda r: r["fold"]):
+        curve = result["equity"]
+        scale = capital / cash
+        datetimes.extend(curve["datetime"])
+        values.extend(value * scale for value in curve["value"])
+        if values:
+            capital = values[-1]
+    return datetimes, values
+
+
+def equity_metrics(datetimes, values, cash):
+    """Доходность, максимальная просадка и Sharpe (по дневным значениям, год = 365 дней)"""
+    if not values:
+        return {"return_pct": 0.0, "max_drawdown": 0.0, "sharpe": None}
+
+    peak, max_drawdown = cash, 0.0
+    for value in values:
+        peak = max(peak, value)
+        max_drawdown = max(max_drawdown, (peak - value) / peak * 100)
+
+    daily = {}  # День (число Backtrader без дробной части) -> капитал на конец дня
+    for dtnum, value in zip(datetimes, values):
+        daily[int(dtnum)] = value
+    closes = [cash] + list(daily.values())
+    returns = [b / a - 1 for a, b in zip(closes, closes[1:])]
+    sharpe = None
+    if len(returns) > 1:
+        mean = sum(returns) / len(returns)
+        std = math.sqrt(sum((r - mean) ** 2 for r in returns) / (len(returns) - 1))
+        if std:
+            sharpe = mean / std * math.sqrt(365)
+
+    return {"return_pct": (values[-1] / cash - 1) * 100, "max_drawdown": max_drawdown, "sharpe": sharpe}
+
+
+def walk_forward(data_path, strategy="imbalance", grid=None, fromdate=None, todate=None,
+                 train_days=365, test_days=90, workers=None, broker=None):
+    """Полный walk-forward в пуле процессов
+
+    Сначала все окна train со всеми параметрами сетки, затем окна test
+    с лучшими параметрами своего окна. Возвращает словарь с результатами
+    окон, склеенной кривой и итоговыми метриками.
+    """
+    broker = broker or BROKER
+    store = ensure_store(data_path)  # Дальше все процессы читают .bin
+    first, last = (datetime.fromtimestamp(int(t), timezone.utc).replace(tzinfo=None)
+                   for t in (store.datetime[0], store.datetime[-1]))
+    # Окна только там, где есть свечи, иначе последние окна test пустые
+    first = datetime.combine(first.date(), datetime.min.time())
+    last = datetime.combine(last.date() + timedelta(days=1), datetime.min.time())
+    fromdate = max(fromdate, first) if fromdate else first
+    todate = min(todate, last) if todate else last
+    folds = make_folds(fromdate, todate, train_days, test_days)
+    if not folds:
+        raise ValueError(f"Период {fromdate:%Y-%m-%d} - {todate:%Y-%m-%d} короче окна train ({train_days} дн.)")
+
+    points = param_grid(grid or STRATEGIES[strategy][1])
+    train_tasks = [(fold, train_from, train_to, params, False)
+                   for fold, (train_from, train_to, _, _) in enumerate(folds) for params in points]
+
+    started = time.perf_counter()
+    workers = min(workers or os.cpu_count() or 1, len(train_tasks))
+    with Pool(workers, initializer=init_worker, initargs=(store.path, strategy, broker)) as pool:
+        best = {}
+        for result in pool.imap(run_window, train_tasks):  # По порядку: при равенстве побеждает первая точка сетки
+            fold = result["fold"]
+            if fold not in best or result["value"] > best[fold]["value"]:
+                best[fold] = result
+
+        test_tasks = [(fold, test_from, test_to, best[fold]["params"], True)
+                      for fold, (_, _, test_from, test_to) in enumerate(folds)]
+        tests = sorted(pool.imap_unordered(run_window, test_tasks), key=lambda r: r["fold"])
+    elapsed = time.perf_counter() - started
+
+    datetimes, values = stitch_equity(tests, broker["cash"])
+    summary = equity_metrics(datetimes, values, broker["cash"])
+    summary.update(
+        trades=sum(r["trades"] for r in tests),
+        won=sum(r["won"] for r in tests),
+        lost=sum(r["lost"] for r in tests),
+        profitable_folds=sum(r["value"] > broker["cash"] for r in tests),
+        folds=len(folds),
+        backtests=len(train_tasks) + len(test_tasks),
+        elapsed=elapsed,
+    )
+
+    fold_rows = []
+    for fold, (train_from, _, test_from, test_to) in enumerate(folds):
+        test = tests[fold]
+        fold_rows.append(dict(
+            fold=fold,
+            train_from=train_from,
+            test_from=test_from,
+            test_to=test_to,
+            params=test["params"],
+            train_return_pct=(best[fold]["value"] / broker["cash"] - 1) * 100,
+            test_return_pct=(test["value"] / broker["cash"] - 1) * 100,
+            trades=test["trades"],
+        ))
+    return {"folds": fold_rows, "equity": (datetimes, values), "summary": summary}
+
+
+def print_report(report):
+    """Таблица окон и итог out-of-sample"""
+    print(f"{'#':>3} {'train c':>10} {'test c':>10} {'test по':>10} | {'Параметры':<32} "
+          f"{'Train%':>7} {'Test%':>7} {'Сделок':>6}")
+    for row in report["folds"]:
+        params = ", ".join(f"{name}={value}" for name, value in row["params"].items())
+        print(f"{row['fold']:>3} {row['train_from']:%Y-%m-%d} {row['test_from']:%Y-%m-%d} "
+              f"{row['test_to']:%Y-%m-%d} | {params:<32} {row['train_return_pct']:>7.2f} "
+              f"{row['test_return_pct']:>7.2f} {row['trades']:>6}")
+
+    s = report["summary"]
+    sharpe = f"{s['sharpe']:.2f}" if s["sharpe"] is not None else "N/A"
+    print(f"\n📈 OUT-OF-SAMPLE ({s['folds']} окон):")
+    print(f"Доходность: {s['return_pct']:.2f}%")
+    print(f"Макс. просадка: {s['max_drawdown']:.2f}%")
+    print(f"Sharpe (дневной, годовой): {sharpe}")
+    print(f"Сделок: {s['trades']} (прибыльных {s['won']}, убыточных {s['lost']})")
+    print(f"Прибыльных окон: {s['profitable_folds']} из {s['folds']}")
+    print(f"\n⚡ {s['backtests']} бэктестов за {s['elapsed']:.1f} c")
+
+
+def write_equity(equity, path):
+    """Склеенная кривая капитала в CSV: время, капитал"""
+    from backtrader import num2date
+
+    datetimes, values = equity
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("datetime,value\n")
+        for dtnum, value in zip(datetimes, values):
+            file.write(f"{num2date(dtnum):%Y-%m-%d %H:%M:%S},{value}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward оптимизация стратегий")
+    parser.add_argument("--strategy", choices=list(STRATEGIES), default="imbalance")
+    parser.add_argument("--data", default=None, help="CSV из TickerGrub или .bin")
+    parser.add_argument("--fromdate", default="2022-01-01")
+    parser.add_argument("--todate", default="2025-10-01")
+    parser.add_argument("--train-days", type=int, default=365)
+    parser.add_argument("--test-days", type=int, default=90)
+    parser.add_argument("--workers", type=int, default=None, help="Процессов (по умолчанию все ядра)")
+    parser.add_argument("--out", default=None, help="Сохранить out-of-sample кривую в CSV")
+    args = parser.parse_args()
+
+    data = args.data or ("./data/BTCUSDT_15.csv" if args.strategy == "imbalance" else "./data/BTCUSDT_60.csv")
+    report = walk_forward(abspath(data), args.strategy,
+                          fromdate=datetime.fromisoformat(args.fromdate),
+                          todate=datetime.fromisoformat(args.todate),
+                          train_days=args.train_days, test_days=args.test_days,
+                          workers=args.workers)
+    print_report(report)
+    if args.out:
+        write_equity(report["equity"], args.out)
+        print(f"✅ Кривая капитала сохранена в {args.out}")
+
+
+if __name__ == "__main__":
+    main()